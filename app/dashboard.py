@@ -0,0 +1,153 @@
+"""
+Dashboard of the notebook analyses: index vs macro overlays, S&P 500 breadth and correlations.
+
+    streamlit run app/dashboard.py
+
+Every session of the server shares one DashboardCache: the series are fetched into the time-series store once,
+    kept up to date by a background thread, and the aligned frames and figures are computed once per data version.
+"""
+import plotly.graph_objects as go
+import plotly.io as pio
+import streamlit as st
+from utils.streamlit_utils import DashboardCache
+from utils.visualization import plot_data
+from utils.breadth import ConstituentIndex, compute_breadth
+from utils.correlation import corr_matrix, rolling_corr_with
+
+REFRESH_SECONDS = 15 * 60
+
+INDEX_ALIAS = 'sp500'
+
+MACRO_CONFIG = [
+    {'source': 'yf',
+     'config': [
+         {'symbol': '^GSPC', 'call_type': 'index', 'interval': 'daily', 'currency': 'USD', 'alias': INDEX_ALIAS},
+     ]},
+    {'source': 'fred',
+     'config': [
+         {'symbol': 'DGS10', 'call_type': 'index', 'interval': 'daily', 'alias': 'ir_10y'},
+         {'symbol': 'T10Y2Y', 'call_type': 'index', 'interval': 'daily', 'alias': 'spread_10y_2y'},
+         {'symbol': 'FEDFUNDS', 'call_type': 'index', 'interval': 'monthly', 'alias': 'fed_funds',
+          'release_lag': '1D'},
+         {'symbol': 'UNRATE', 'call_type': 'index', 'interval': 'monthly', 'alias': 'unemployment',
+          'release_lag': '7D'},
+         {'symbol': 'CPIAUCSL', 'call_type': 'index', 'interval': 'monthly', 'alias': 'cpi',
+          'release_lag': '15D'},
+     ]},
+]
+
+
+@st.experimental_singleton
+def get_dashboard_cache():
+    cache = DashboardCache()
+    cache.start(REFRESH_SECONDS)
+    return cache
+
+
+@st.experimental_singleton
+def get_constituents():
+    try:
+        return ConstituentIndex.load()
+    except FileNotFoundError:
+        index = ConstituentIndex.from_wikipedia()
+        index.save()
+        return index
+
+
+def show(figure_json):
+    st.plotly_chart(pio.from_json(figure_json), use_container_width=True)
+
+
+def macro_page(cache, interval, start_date):
+    config = {'interval': interval, 'start_date': start_date, 'data_fetch_config': MACRO_CONFIG}
+    with st.spinner('Loading series...'):
+        key = cache.register(config)
+    master = cache.master(key)
+
+    index_column = 'v_' + INDEX_ALIAS
+    macro_columns = [c for c in master.columns if c not in ['Date', index_column]]
+    selected = st.multiselect('Macro series', macro_columns, default=macro_columns[:2])
+
+    def build():
+        settings = [['line', master, 'Date', index_column, INDEX_ALIAS, False]]
+        settings += [['line', master, 'Date', c, c[2:], True] for c in selected]
+        return plot_data(settings)
+
+    show(cache.figure_json(key, 'macro:' + ','.join(selected), build))
+    st.caption('Macro series are shown once published (release lag), on the {} NYSE calendar.'.format(interval))
+
+
+def breadth_page(cache, start_date, windows=(50, 200)):
+    index = get_constituents()
+    # yahoo writes class shares with a dash, e.g. BRK-B
+    tickers = {ticker.replace('.', '-'): ticker for ticker in index.tickers}
+    config = {'interval': 'daily', 'start_date': start_date,
+              'data_fetch_config': [{'source': 'yf', 'config': [
+                  {'symbol': symbol, 'call_type': 'stock', 'interval': 'daily', 'currency': 'USD', 'alias': symbol}
+                  for symbol in sorted(tickers)]}]}
+    with st.spinner('Loading the prices of {} past and present constituents...'.format(len(tickers))):
+        key = cache.register(config)
+
+    def breadth():
+        df = cache.store.read('yf', list(tickers), 'daily', start=start_date, columns=['Date', 'symbol', 'Close'])
+        df['symbol'] = df['symbol'].map(tickers)
+        return compute_breadth(df, index, windows=windows)
+
+    def build():
+        df = cache.cached_value(key, 'breadth', breadth)
+        settings = [['line', df, 'Date', 'pct_above_{}'.format(w), '% above {} DMA'.format(w), False]
+                    for w in windows]
+        return plot_data(settings, show_y_axis=True)
+
+    show(cache.figure_json(key, 'breadth', build))
+    st.caption('Members are taken point-in-time, so delisted constituents count while they were in the index.')
+
+
+def correlation_page(cache, interval, start_date):
+    config = {'interval': interval, 'start_date': start_date, 'data_fetch_config': MACRO_CONFIG}
+    with st.spinner('Loading series...'):
+        key = cache.register(config)
+    master = cache.master(key)
+    window = st.slider('Rolling window (periods)', min_value=6, max_value=120, value=36)
+
+    def changes():
+        df = master.set_index('Date')
+        # returns for the index, changes for the rates and levels
+        df['v_' + INDEX_ALIAS] = df['v_' + INDEX_ALIAS].pct_change()
+        other = [c for c in df.columns if c != 'v_' + INDEX_ALIAS]
+        df[other] = df[other].diff()
+        return df.dropna(how='all')
+
+    def heatmap():
+        corr = corr_matrix(cache.cached_value(key, 'changes', changes))
+        return go.Figure(go.Heatmap(z=corr.values, x=corr.columns, y=corr.index, zmin=-1, zmax=1,
+                                    colorscale='RdBu'))
+
+    def rolling():
+        corr = rolling_corr_with(cache.cached_value(key, 'changes', changes), 'v_' + INDEX_ALIAS, window).reset_index()
+        columns = [c for c in corr.columns if c not in ['Date', 'v_' + INDEX_ALIAS]]
+        return plot_data([['line', corr, 'Date', c, c[2:], False] for c in columns], show_y_axis=True)
+
+    show(cache.figure_json(key, 'corr', heatmap))
+    st.subheader('Rolling correlation with the S&P 500 ({} periods)'.format(window))
+    show(cache.figure_json(key, 'rolling_corr:{}'.format(window), rolling))
+
+
+PAGES = {
+    'Index vs macro': macro_page,
+    'Breadth': breadth_page,
+    'Correlations': correlation_page,
+}
+
+st.set_page_config(page_title='platform', layout='wide')
+cache = get_dashboard_cache()
+
+page = st.sidebar.radio('Page', list(PAGES))
+interval = st.sidebar.selectbox('Interval', ['monthly', 'weekly', 'daily'])
+start_date = '{}-01-01'.format(st.sidebar.number_input('From year', min_value=1970, max_value=2030, value=2000))
+
+st.title(page)
+if page == 'Breadth':
+    breadth_page(cache, start_date)
+else:
+    PAGES[page](cache, interval, start_date)
@@ -1,30 +1,36 @@
 import os
-import pandas as pd
-import investpy
-from fredapi import Fred
-import json
-from matplotlib import pyplot as plt
-import quandl
-from datetime import date
-from datetime import datetime
-from apscheduler.schedulers.blocking import BlockingScheduler
-from utils.fetch_data import *
-from utils.visualization import *
+import argparse
+from utils.scheduler import RefreshService, load_watchlist
+from utils.metrics import get_registry
 
-print("Currently working at {}".format(os.getcwd()))
+# used when no watchlist is given, in the data_fetch_config format of master_df
+DEFAULT_WATCHLIST = [
+    {
+        'source': 'investing',
+        'config': [
+            {'symbol': 'MSFT', 'call_type': 'stock', 'interval': 'daily', 'currency': 'USD', 'calendar': 'NYSE'},
+        ]
+    },
+]
 
-sched = BlockingScheduler()
+parser = argparse.ArgumentParser(description="Keep the stored history of a watchlist up to date.")
+parser.add_argument('--watchlist', default=None,
+                    help="json file in the data_fetch_config format. Each config may set a 'calendar', default 'NYSE'.")
+parser.add_argument('--seconds', type=int, default=60, help="refresh interval of every symbol")
+parser.add_argument('--workers', type=int, default=8, help="number of worker threads")
+parser.add_argument('--metrics-port', type=int, default=None, help="serve fetch metrics on this port at /metrics")
 
-@sched.scheduled_job('interval', seconds=10, id='test_1')
-def call_data():
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print("Currently working at {}".format(os.getcwd()))
 
-    now = datetime.now()
-    current_time = now.strftime("%H:%M:%S")
-    print("Current Time =", current_time)
+    watchlist = load_watchlist(args.watchlist) if args.watchlist else DEFAULT_WATCHLIST
+    if args.metrics_port:
+        get_registry().serve(port=args.metrics_port)
 
-    today = date.today().strftime("%d/%m/%Y")
-    d = investing_api('stock', 'MSFT', '13/05/2022', today)
-    print(d)
-
-sched.start()
+    service = RefreshService(watchlist, seconds=args.seconds, max_workers=args.workers)
 
+    try:
+        service.start()
+    except (KeyboardInterrupt, SystemExit):
+        pass
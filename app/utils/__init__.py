@@ -1,4 +1,29 @@
+import importlib
 from .log import get_logger
-from .fetch_data import fred_fred, investing_api, alpha_vantage_api, yf_api, FMP, alpha_vantage_api_financial_statements
-from .visualization import plot_data
-# from .data_prep import
\ No newline at end of file
+
+# public names and the submodule defining them. Submodules are imported on first access,
+# so `from app.utils import get_logger` or `import app.utils.db_connection` do not load the data sources.
+_LAZY_ATTRIBUTES = {
+    'fred_fred': 'fetch_data',
+    'investing_api': 'fetch_data',
+    'alpha_vantage_api': 'fetch_data',
+    'yf_api': 'fetch_data',
+    'FMP': 'fetch_data',
+    'alpha_vantage_api_financial_statements': 'fetch_data',
+    'plot_data': 'visualization',
+}
+
+__all__ = ['get_logger'] + list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module('.' + _LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+# from .data_prep import
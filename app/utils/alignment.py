@@ -0,0 +1,220 @@
+import numpy as np
+import pandas as pd
+import pandas_market_calendars as mcal
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# how the observations that fall into one period of the target calendar are combined
+DEFAULT_AGG = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Adj Close': 'last',
+    'Volume': 'sum',
+    'v': 'last',
+}
+
+# length of one period of the target interval, used to bound the first period of the calendar
+_PERIOD = {
+    'daily': pd.DateOffset(days=1),
+    'weekly': pd.DateOffset(weeks=1),
+    'monthly': pd.DateOffset(months=1),
+}
+
+# length of one observation of a series, by its interval: the observation dated at the start of its period is known
+# once the period ends. A daily value is known on its date.
+_OBSERVATION_PERIOD = {
+    'daily': None,
+    'weekly': pd.DateOffset(weeks=1),
+    'monthly': pd.DateOffset(months=1),
+    'quarterly': pd.DateOffset(months=3),
+    'annual': pd.DateOffset(years=1),
+}
+
+# smallest median spacing of the dates, in days, of each interval, for series without an 'interval' column
+_MIN_SPACING = [('annual', 360), ('quarterly', 85), ('monthly', 28), ('weekly', 7)]
+
+
+def trading_calendar(start_date, end_date, interval='daily', calendar='NYSE'):
+    """
+    Dates of the target calendar: every trading session, or the last session of every week or month.
+
+    Args:
+        start_date (str): 'YYYY-MM-DD' format date
+        end_date (str): 'YYYY-MM-DD' format date
+        interval (str): daily, weekly or monthly
+        calendar (str): name of the pandas_market_calendars calendar
+
+    Returns:
+        dates (pd.DatetimeIndex): dates of the calendar, without time zone
+    """
+    sessions = mcal.get_calendar(calendar).valid_days(start_date=start_date, end_date=end_date)
+    sessions = pd.DatetimeIndex(sessions).tz_localize(None)
+
+    if interval == 'daily':
+        return sessions
+    elif interval == 'weekly':
+        periods = sessions.to_period('W-FRI')
+    elif interval == 'monthly':
+        periods = sessions.to_period('M')
+    else:
+        assert False, "Not supported interval."
+
+    last_sessions = pd.Series(sessions, index=sessions).groupby(periods).max()
+    return pd.DatetimeIndex(last_sessions.values)
+
+
+def _value_columns(df, columns):
+    if columns is not None:
+        return list(columns)
+    if 'v' in df.columns:
+        return ['v']
+    if 'Close' in df.columns:
+        return ['Close']
+    return []
+
+
+def series_interval(df):
+    """
+    Interval of the observations of a standardized series: its 'interval' column (e.g. 'monthly', or the FRED
+        frequency 'weekly, ending friday'), or else the median spacing of its dates.
+
+    Returns:
+        interval (str): daily, weekly, monthly, quarterly or annual
+    """
+    if 'interval' in df.columns and df.shape[0] > 0:
+        name = str(df['interval'].iloc[0]).lower()
+        for interval in _OBSERVATION_PERIOD:
+            if name.startswith(interval):
+                return interval
+
+    observed = pd.DatetimeIndex(df['Date']).sort_values()
+    if len(observed) > 1:
+        spacing = np.median(np.diff(observed.values)) / np.timedelta64(1, 'D')
+        for interval, min_days in _MIN_SPACING:
+            if spacing >= min_days:
+                return interval
+    return 'daily'
+
+
+def available_dates(df, release_lag=None):
+    """
+    Date on which every observation of a series became available: the end of its period
+        (a monthly value dated 2022-01-01 is known from 2022-02-01, a daily value on its date),
+        plus the publication delay `release_lag`.
+
+    Args:
+        df (pd.DataFrame): standardized dataframe with a 'Date' column
+        release_lag (Union[str, pd.Timedelta, None]): delay between the end of a period and its publication
+
+    Returns:
+        available (pd.DatetimeIndex): without time zone
+    """
+    observed = pd.DatetimeIndex(df['Date'])
+    if observed.tz is not None:
+        observed = observed.tz_localize(None)
+    period = _OBSERVATION_PERIOD[series_interval(df)]
+    if period is not None:
+        observed = observed + period
+    if release_lag is not None:
+        observed = observed + pd.Timedelta(release_lag)
+    return observed
+
+
+def align_series(df, dates, interval='daily', columns=None, agg=None, release_lag=None):
+    """
+    Put one standardized series on the target calendar.
+    Every observation goes to the first calendar date on or after the date it became available
+        (the end of its period plus `release_lag`, see `available_dates`), the observations of one period are
+        combined with the aggregation rules, and periods without observations carry the last known value forward.
+        A value is therefore never visible before it was available, and coarser series (e.g. monthly macro data)
+        are forward-filled point-in-time.
+    Columns aggregated with 'sum' are not carried forward, and are 0 in periods without observations.
+
+    Args:
+        df (pd.DataFrame): standardized dataframe with a 'Date' column
+        dates (pd.DatetimeIndex): target calendar, see `trading_calendar`
+        interval (str): interval of the target calendar. daily, weekly or monthly
+        columns (Union[list, None]): columns to align. Defaults to 'v' for FRED and 'Close' otherwise.
+        agg (Union[dict, None]): {column: aggregation} overriding DEFAULT_AGG
+        release_lag (Union[str, pd.Timedelta, None]): delay between the end of the period of an observation and
+                                                     its publication, e.g. '15D' for CPI
+
+    Returns:
+        aligned (pd.DataFrame): one row per calendar date, one column per aligned column
+    """
+    columns = _value_columns(df, columns)
+    rules = dict(DEFAULT_AGG, **(agg or {}))
+
+    observed = available_dates(df, release_lag=release_lag)
+
+    # bucket 0 holds everything known before the first period, and only seeds the forward fill
+    edges = np.concatenate([[(dates[0] - _PERIOD[interval]).to_datetime64()], dates.values])
+    buckets = np.searchsorted(edges, observed.values, side='left')
+    in_range = buckets <= len(dates)
+
+    values = df.loc[in_range, columns].reset_index(drop=True)
+    values['_bucket'] = buckets[in_range]
+    values['_order'] = observed.values[in_range]
+    values = values.sort_values(['_bucket', '_order'])
+
+    aggregated = values.groupby('_bucket').agg({c: rules.get(c, 'last') for c in columns})
+    aggregated = aggregated.reindex(np.arange(len(dates) + 1))
+
+    fill = [c for c in columns if rules.get(c, 'last') != 'sum']
+    aggregated[fill] = aggregated[fill].ffill()
+    flows = [c for c in columns if c not in fill]
+    aggregated[flows] = aggregated[flows].fillna(0)
+
+    aggregated = aggregated.iloc[1:]
+    aggregated.index = dates
+    return aggregated
+
+
+def align_frames(frames, start_date, end_date, interval='daily', calendar='NYSE', settings=None):
+    """
+    Build one wide frame from many standardized series, aligned on a common trading calendar.
+    Each series is aligned once and the columns are assembled in a single step, instead of merging the series one by one.
+    Columns are named 'v_<alias>' when one column of the series is aligned, '<alias>_<column>' otherwise.
+
+    Args:
+        frames (dict): {alias: standardized dataframe}
+        start_date (str): 'YYYY-MM-DD' format date
+        end_date (str): 'YYYY-MM-DD' format date
+        interval (str): target interval. daily, weekly or monthly
+        calendar (Union[str, pd.DatetimeIndex]): name of the market calendar, or the target dates themselves
+        settings (Union[dict, None]): {alias: {'columns': [...], 'agg': {...}, 'release_lag': '15D'}}
+
+    Returns:
+        df (pd.DataFrame): wide frame with a 'Date' column and one column per aligned series column
+    """
+    settings = settings or dict()
+    if isinstance(calendar, str):
+        dates = trading_calendar(start_date, end_date, interval=interval, calendar=calendar)
+    else:
+        dates = pd.DatetimeIndex(calendar)
+
+    aligned = dict()
+    for alias, df in frames.items():
+        setting = settings.get(alias, dict())
+
+        if 'Date' not in df.columns or len(_value_columns(df, setting.get('columns'))) == 0:
+            logger.info("Skipped {}: declare the columns to align in its settings.".format(alias))
+            continue
+
+        series = align_series(df, dates, interval=interval,
+                              columns=setting.get('columns'),
+                              agg=setting.get('agg'),
+                              release_lag=setting.get('release_lag'))
+
+        if series.shape[1] == 1:
+            aligned['v_' + alias] = series.iloc[:, 0].values
+        else:
+            for column in series.columns:
+                aligned[alias + '_' + column] = series[column].values
+
+    df = pd.DataFrame(aligned, index=dates)
+    df.index.name = 'Date'
+    return df.reset_index()
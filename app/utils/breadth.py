@@ -0,0 +1,350 @@
+import io
+import os
+import pickle
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from .features import to_panel, rolling_mean
+from .indicators import RollingMean
+from .log import get_logger
+from .transport import get_transport
+
+logger = get_logger(__name__)
+
+basepath = Path(__file__).parent.parent
+
+_INDEX_PATH = basepath / 'data_storage' / 'sp500_constituents.pkl'
+_ENGINE_PATH = basepath / 'data_storage' / 'breadth_engine.pkl'
+
+WIKIPEDIA_SP500 = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+
+
+class ConstituentIndex:
+    """
+    Point-in-time membership of an index, e.g. the S&P 500.
+    Each ticker has a list of membership intervals [start, end): start None means member since before the
+        known history, end None means still a member.
+    """
+
+    def __init__(self, intervals=None):
+        """
+        Args:
+            intervals (dict): {ticker: [(start, end), ...]} with pd.Timestamp or None bounds
+        """
+        self.intervals = intervals or dict()
+
+    @staticmethod
+    def from_changes(current, changes, renames=None):
+        """
+        Rebuild the membership history from the current constituents and the table of changes,
+            walking the changes backwards from today.
+
+        Args:
+            current (list): tickers in the index today
+            changes (pd.DataFrame): columns 'date', 'added', 'removed'. One row per change, NaN when no ticker.
+            renames (dict): {old ticker: new ticker}, applied to the changes so they match the current tickers
+
+        Returns:
+            index (ConstituentIndex)
+        """
+        renames = renames or dict()
+        changes = changes.copy()
+        changes['date'] = pd.to_datetime(changes['date'])
+        for column in ['added', 'removed']:
+            changes[column] = changes[column].replace(renames)
+        changes = changes.sort_values('date', ascending=False)
+
+        intervals = dict()
+        # ticker -> end of the membership interval being traced backwards
+        open_end = {ticker: None for ticker in current}
+
+        for d, added, removed in zip(changes['date'], changes['added'], changes['removed']):
+            if not pd.isna(added):
+                if added in open_end:
+                    intervals.setdefault(added, []).append((d, open_end.pop(added)))
+                else:
+                    logger.info("{} added on {} is not a member afterwards. Skipped.".format(added, d.date()))
+            if not pd.isna(removed):
+                open_end[removed] = d
+
+        for ticker, end in open_end.items():
+            intervals.setdefault(ticker, []).append((None, end))
+
+        for ticker in intervals:
+            intervals[ticker].sort(key=lambda i: pd.Timestamp.min if i[0] is None else i[0])
+
+        return ConstituentIndex(intervals)
+
+    @staticmethod
+    def from_wikipedia(url=WIKIPEDIA_SP500, renames=None):
+        """
+        Scrape the current constituents and the changes table of the wikipedia page of the S&P 500.
+
+        Args:
+            url (str): url of the wikipedia page
+            renames (dict): {old ticker: new ticker} for tickers that changed since they were added or removed
+
+        Returns:
+            index (ConstituentIndex)
+        """
+        html = get_transport().get_bytes(url, source='wikipedia').decode('utf-8')
+        constituents = pd.read_html(io.StringIO(html), attrs={'id': 'constituents'})[0]
+        changes = pd.read_html(io.StringIO(html), attrs={'id': 'changes'})[0]
+        # concat the multi-headers into single header
+        changes.columns = ['_'.join(c) for c in changes.columns]
+
+        changes = pd.DataFrame({'date': pd.to_datetime(changes['Date_Date'], format="%B %d, %Y"),
+                                'added': changes['Added_Ticker'],
+                                'removed': changes['Removed_Ticker']})
+
+        return ConstituentIndex.from_changes(constituents['Symbol'].tolist(), changes, renames=renames)
+
+    @property
+    def tickers(self):
+        return sorted(self.intervals)
+
+    def members(self, date):
+        """
+        Tickers in the index on a date.
+
+        Args:
+            date (Union[str, pd.Timestamp]): date
+
+        Returns:
+            members (set): tickers
+        """
+        date = pd.Timestamp(date)
+        return {ticker for ticker, spans in self.intervals.items()
+                if any(((s is None) or (s <= date)) and ((e is None) or (date < e)) for s, e in spans)}
+
+    def membership_matrix(self, dates, symbols):
+        """
+        Membership of every symbol on every date, built from the intervals without a loop over dates.
+
+        Args:
+            dates (pd.DatetimeIndex): sorted dates, the rows
+            symbols (list): symbols, the columns
+
+        Returns:
+            members (np.ndarray): boolean array of shape (len(dates), len(symbols))
+        """
+        dates = pd.DatetimeIndex(dates)
+        starts, ends, columns = [], [], []
+        for j, symbol in enumerate(symbols):
+            for s, e in self.intervals.get(symbol, []):
+                starts.append(0 if s is None else dates.searchsorted(s, side='left'))
+                ends.append(len(dates) if e is None else dates.searchsorted(e, side='left'))
+                columns.append(j)
+
+        # +1 where an interval starts and -1 where it ends, then a running sum along the dates
+        steps = np.zeros((len(dates) + 1, len(symbols)), dtype='int16')
+        np.add.at(steps, (np.array(starts, dtype=int), np.array(columns, dtype=int)), 1)
+        np.add.at(steps, (np.array(ends, dtype=int), np.array(columns, dtype=int)), -1)
+        return np.cumsum(steps, axis=0)[:-1] > 0
+
+    def save(self, path=_INDEX_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(str(tmp_path), 'wb') as f:
+            pickle.dump(self.intervals, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(str(tmp_path), str(path))
+
+    @staticmethod
+    def load(path=_INDEX_PATH):
+        with open(str(path), 'rb') as f:
+            return ConstituentIndex(pickle.load(f))
+
+
+def percent_above_dma(close, members, window):
+    """
+    Percentage of the members whose close is above their `window`-day moving average, for every date at once.
+    Members without a full window of prices are left out of the count.
+
+    Args:
+        close (np.ndarray): close prices of shape (dates, symbols)
+        members (np.ndarray): boolean membership of the same shape
+        window (int): window of the moving average
+
+    Returns:
+        pct (np.ndarray): percentage for every date, NaN when no member can be counted
+    """
+    moving_average = rolling_mean(close, window)
+    counted = members & ~np.isnan(moving_average) & ~np.isnan(close)
+    above = counted & (np.where(counted, close, 0) > np.where(counted, moving_average, 0))
+
+    n_counted = counted.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n_counted > 0, 100 * above.sum(axis=1) / n_counted, np.nan)
+
+
+def _naive(dates):
+    # membership intervals are naive dates, while yf dates are tz-aware
+    dates = pd.to_datetime(dates)
+    return dates.dt.tz_localize(None) if dates.dt.tz is not None else dates
+
+
+def compute_breadth(df, index, windows=(50, 200)):
+    """
+    Market breadth of an index from the price history of its (past and present) constituents.
+
+    Args:
+        df (pd.DataFrame): long frame with 'Date', 'symbol' and 'Close' columns. Dates may be tz-aware, as in yf.
+        index (ConstituentIndex): point-in-time constituents
+        windows (tuple): windows of the moving averages
+
+    Returns:
+        breadth (pd.DataFrame): 'Date' (naive), 'n_members' (members of the index on the date, with or without
+            prices), and 'pct_above_<window>' for each window
+    """
+    dates, symbols, arrays = to_panel(df.assign(Date=_naive(df['Date'])), columns=['Close'])
+    members = index.membership_matrix(dates, symbols)
+
+    n_members = index.membership_matrix(dates, index.tickers).sum(axis=1)
+    breadth = pd.DataFrame({'Date': dates, 'n_members': n_members})
+    for window in windows:
+        breadth['pct_above_{}'.format(window)] = percent_above_dma(arrays['Close'], members, window)
+    return breadth
+
+
+class BreadthEngine:
+    """
+    Market breadth updated one day at a time, with O(1) work per symbol and window.
+    Gives the same values as compute_breadth on the same prices, fed day by day.
+    The moving averages are saved with `snapshot`, so a restart restores them and only reads the days stored since,
+        see `catch_up`.
+    """
+
+    def __init__(self, index, windows=(50, 200)):
+        """
+        Args:
+            index (ConstituentIndex): point-in-time constituents
+            windows (tuple): windows of the moving averages
+        """
+        self.index = index
+        self.windows = windows
+        self.moving_averages = dict()
+        self.last_date = None
+
+    def update(self, date, closes):
+        """
+        Add the closes of one day.
+
+        Args:
+            date (Union[str, pd.Timestamp]): date of the closes
+            closes (dict): {symbol: close} for every symbol with a price on that day
+
+        Returns:
+            row (dict): 'Date', 'n_members' and 'pct_above_<window>' for each window, or None if the day was seen
+        """
+        date = pd.Timestamp(date)
+        if date.tzinfo is not None:
+            date = date.tz_localize(None)
+        if (self.last_date is not None) and (date <= self.last_date):
+            return None
+        self.last_date = date
+
+        members = self.index.members(date)
+        row = {'Date': date, 'n_members': len(members)}
+        counted = {w: 0 for w in self.windows}
+        above = {w: 0 for w in self.windows}
+
+        # symbols without a price today get a gap in their window, as in the batch computation
+        closes = dict({symbol: np.nan for symbol in self.moving_averages}, **closes)
+
+        for symbol, close in closes.items():
+            if symbol not in self.moving_averages:
+                self.moving_averages[symbol] = {w: RollingMean(w) for w in self.windows}
+            for window, moving_average in self.moving_averages[symbol].items():
+                value = moving_average.update(close)
+                if (symbol in members) and (value == value) and (close == close):
+                    counted[window] += 1
+                    above[window] += close > value
+
+        for window in self.windows:
+            row['pct_above_{}'.format(window)] = 100 * above[window] / counted[window] if counted[window] else np.nan
+        return row
+
+    def warm_up(self, df, date_column='Date', symbol_column='symbol', price_column='Close'):
+        """
+        Feed the closes of a long frame, day by day. Days up to the last one seen are skipped.
+
+        Args:
+            df (pd.DataFrame): long frame with date, symbol and close columns
+
+        Returns:
+            breadth (pd.DataFrame): rows of the new days, as in compute_breadth
+        """
+        columns = ['Date', 'n_members'] + ['pct_above_{}'.format(w) for w in self.windows]
+        df = pd.DataFrame({'Date': _naive(df[date_column]), 'symbol': df[symbol_column].astype(str),
+                           'Close': df[price_column].astype('float64')})
+
+        rows = []
+        for date, day in df.groupby('Date', sort=True):
+            row = self.update(date, dict(zip(day['symbol'], day['Close'])))
+            if row is not None:
+                rows.append(row)
+        return pd.DataFrame(rows, columns=columns)
+
+    def catch_up(self, store, source='yf', interval='daily', symbols=None):
+        """
+        Bring the engine up to date from the time-series store, reading only the days after the last one seen,
+            or the whole stored history on the first run.
+
+        Args:
+            store (TimeSeriesStore): store of the prices
+            source (str): source of the stored prices
+            interval (str): interval of the stored prices
+            symbols (Union[dict, None]): {stored symbol: ticker of the index}, e.g. {'BRK-B': 'BRK.B'}.
+                Defaults to the tickers of the index.
+
+        Returns:
+            breadth (pd.DataFrame): rows of the new days
+        """
+        symbols = symbols or {ticker: ticker for ticker in self.index.tickers}
+        start = None if self.last_date is None else (self.last_date + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+        df = store.read(source, list(symbols), interval, start=start, columns=['Date', 'symbol', 'Close'])
+        df['symbol'] = df['symbol'].astype(str).map(symbols)
+        return self.warm_up(df)
+
+    def snapshot(self, path=_ENGINE_PATH):
+        """
+        Save the moving averages and the last date to disk. The constituents are not saved.
+
+        Args:
+            path (Union[str, Path]): file to write
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        state = {'windows': tuple(self.windows), 'moving_averages': self.moving_averages, 'last_date': self.last_date}
+        with open(str(tmp_path), 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(str(tmp_path), str(path))
+        logger.info("Saved breadth state of {} symbols to {}".format(len(self.moving_averages), path))
+
+    @staticmethod
+    def restore(index, path=_ENGINE_PATH, windows=(50, 200)):
+        """
+        Load the state saved by `snapshot`, or start an empty engine if there is no snapshot.
+
+        Args:
+            index (ConstituentIndex): point-in-time constituents, e.g. ConstituentIndex.load()
+            path (Union[str, Path]): file to read
+            windows (tuple): windows of the moving averages. A snapshot must have been saved with the same windows.
+
+        Returns:
+            engine (BreadthEngine)
+        """
+        engine = BreadthEngine(index, windows=windows)
+        path = Path(path)
+        if not path.exists():
+            return engine
+        with open(str(path), 'rb') as f:
+            state = pickle.load(f)
+
+        assert state['windows'] == tuple(windows), \
+            "Breadth state at {} was saved with other windows: {}".format(path, state['windows'])
+        engine.moving_averages = state['moving_averages']
+        engine.last_date = state['last_date']
+        return engine
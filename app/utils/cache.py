@@ -0,0 +1,365 @@
+import os
+import json
+import time
+import atexit
+import pickle
+import hashlib
+import inspect
+import threading
+import functools
+from contextlib import contextmanager
+from pathlib import Path
+from .log import get_logger
+from .metrics import get_registry
+
+logger = get_logger(__name__)
+
+basepath = Path(__file__).parent.parent
+
+_CACHE_DIR = basepath / 'data_storage' / 'cache'
+_INDEX_FILE = 'index.json'
+
+# part of every cache key. Bump it when a fetcher changes what it returns (columns, dtypes),
+# so entries in the previous format are not served.
+CACHE_VERSION = 2
+
+# the access times of cache hits are written to the index at most this often, in seconds
+_FLUSH_SECONDS = 60
+# a response file that is not in the index for this long was left by an interrupted writer, and is deleted
+_ORPHAN_SECONDS = 60 * 60
+
+# time to live of a cached response, in seconds.
+# fundamentals barely move, daily bars are refreshed once a day.
+DEFAULT_TTL = {
+    'fred': 60 * 60 * 24,
+    'investing': 60 * 60 * 12,
+    'yf': 60 * 60 * 12,
+    'alpha_vantage': 60 * 60 * 24,
+    'alpha_vantage_financial_statements': 60 * 60 * 24 * 7,
+    'fmp': 60 * 60 * 24,
+    'finviz': 60 * 60 * 12,
+}
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# arguments that never change the response, so they are left out of the cache key
+_IGNORED_ARGS = ('self', 'key')
+
+
+@contextmanager
+def _file_lock(path):
+    """
+    Exclusive lock on a file, held between processes.
+    """
+    with open(str(path), 'a+') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache for API responses.
+    Each response is pickled into its own file named after the hash of the request.
+    An index file keeps the creation time, last access time and size of every entry,
+        which is used for expiry (TTL per source) and LRU eviction when the size cap is reached.
+    Several processes can share the directory: the index is re-read and merged with the changes of this process
+        under a file lock before it is written. Access times of hits are kept in memory and written with the next
+        change, at most every _FLUSH_SECONDS, or at exit.
+    """
+
+    def __init__(self, cache_dir=_CACHE_DIR, ttl=None, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir (Union[str, Path]): directory to store the cached responses
+            ttl (dict): time to live in seconds for each source. Overrides DEFAULT_TTL.
+            max_bytes (int): size cap of the cache directory. Least recently used entries are evicted over the cap.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self.max_bytes = max_bytes
+        self.enabled = os.environ.get('PLATFORM_CACHE', '1') != '0'
+
+        self._lock = threading.RLock()
+        self._index = None
+        # changes not written to the index yet: {key: entry, or None if removed} and {key: access time}
+        self._changes = dict()
+        self._touched = dict()
+        self._flushed = time.monotonic()
+        self._swept = False
+        atexit.register(self.flush)
+
+    @staticmethod
+    def make_key(source, **params):
+        """
+        Hash the request into a cache key.
+
+        Args:
+            source (str): source of data. 'fred', 'investing', 'yf', ...
+            **params: parameters of the request, e.g. symbol, call_type, interval, from_date, to_date
+
+        Returns:
+            key (str): sha256 hex digest of the request
+        """
+        payload = json.dumps({'version': CACHE_VERSION, 'source': source, 'params': params}, sort_keys=True,
+                             default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / (key + '.pkl')
+
+    def _read_index(self):
+        index_path = self.cache_dir / _INDEX_FILE
+        if not index_path.exists():
+            return dict()
+        try:
+            with open(str(index_path), 'r') as f:
+                return json.load(f)
+        except ValueError as e:
+            logger.info("Starting a new cache index, {} is unreadable: {}".format(index_path, e))
+            return dict()
+
+    def _load_index(self):
+        if self._index is None:
+            self._index = self._read_index()
+        return self._index
+
+    def _save_index(self):
+        """
+        Merge the changes of this process into the index on disk and write it, under a file lock,
+            so that processes sharing the directory keep each other's entries.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with _file_lock(self.cache_dir / (_INDEX_FILE + '.lock')):
+            index = self._read_index()
+            for key, entry in self._changes.items():
+                if entry is None:
+                    index.pop(key, None)
+                else:
+                    index[key] = entry
+            for key, accessed in self._touched.items():
+                if key in index:
+                    index[key]['accessed'] = max(index[key]['accessed'], accessed)
+            self._index = index
+
+            self._expire()
+            self._evict()
+            if not self._swept:
+                self._remove_orphans()
+
+            tmp_path = self.cache_dir / (_INDEX_FILE + '.tmp')
+            with open(str(tmp_path), 'w') as f:
+                json.dump(self._index, f)
+            os.replace(str(tmp_path), str(self.cache_dir / _INDEX_FILE))
+
+        self._changes = dict()
+        self._touched = dict()
+        self._flushed = time.monotonic()
+
+    def flush(self):
+        """
+        Write the pending access times and changes to the index.
+        """
+        with self._lock:
+            if self._changes or self._touched:
+                self._save_index()
+
+    def _drop(self, key):
+        index = self._load_index()
+        index.pop(key, None)
+        self._changes[key] = None
+        self._touched.pop(key, None)
+        path = self._path(key)
+        if path.exists():
+            path.unlink()
+
+    def get(self, source, key):
+        """
+        Look up a cached response.
+
+        Args:
+            source (str): source of data. Used to find the TTL of the entry.
+            key (str): cache key created by `make_key`
+
+        Returns:
+            Cached object, or None if there is no valid entry.
+        """
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(key)
+            if (entry is None) and self._path(key).exists():
+                # stored by another process since the index was read
+                self._save_index()
+                entry = self._index.get(key)
+            if entry is None:
+                return None
+
+            ttl = self.ttl.get(source)
+            if (ttl is not None) and (time.time() - entry['created'] > ttl):
+                logger.debug("Cache entry expired: {} {}".format(source, key))
+                self._drop(key)
+                self._save_index()
+                return None
+
+            try:
+                with open(str(self._path(key)), 'rb') as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError) as e:
+                logger.info("Dropping unreadable cache entry {}: {}".format(key, e))
+                self._drop(key)
+                self._save_index()
+                return None
+
+            entry['accessed'] = time.time()
+            self._touched[key] = entry['accessed']
+            if time.monotonic() - self._flushed > _FLUSH_SECONDS:
+                self._save_index()
+            return value
+
+    def set(self, source, key, value):
+        """
+        Store a response and evict the least recently used entries if the size cap is exceeded.
+
+        Args:
+            source (str): source of data
+            key (str): cache key created by `make_key`
+            value: picklable object, usually a pd.DataFrame
+        """
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            tmp_path = self.cache_dir / (key + '.tmp')
+            with open(str(tmp_path), 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(str(tmp_path), str(path))
+
+            now = time.time()
+            index = self._load_index()
+            index[key] = {'source': source, 'created': now, 'accessed': now, 'size': path.stat().st_size}
+            self._changes[key] = index[key]
+            self._touched.pop(key, None)
+            self._save_index()
+
+    def _expire(self):
+        now = time.time()
+        index = self._load_index()
+        for key in [k for k, e in index.items()
+                    if (self.ttl.get(e['source']) is not None) and (now - e['created'] > self.ttl[e['source']])]:
+            self._drop(key)
+
+    def _remove_orphans(self):
+        """
+        Delete the response files that are not in the index, e.g. left by a process that stopped between writing
+            a response and the index. Recent files are kept, since their entry may be on its way.
+        """
+        index = self._load_index()
+        now = time.time()
+        for path in self.cache_dir.glob('*.pkl'):
+            try:
+                if (path.stem not in index) and (now - path.stat().st_mtime > _ORPHAN_SECONDS):
+                    path.unlink()
+            except OSError:
+                pass
+        self._swept = True
+
+    def _evict(self):
+        index = self._load_index()
+        total = sum(e['size'] for e in index.values())
+        if total <= self.max_bytes:
+            return
+
+        for key in sorted(index, key=lambda k: index[k]['accessed']):
+            if total <= self.max_bytes:
+                break
+            total -= index[key]['size']
+            logger.debug("Evicting cache entry {}".format(key))
+            self._drop(key)
+
+    def clear(self, source=None):
+        """
+        Remove cached entries.
+
+        Args:
+            source (Union[str, None]): remove only the entries of this source. If None, removes everything.
+        """
+        with self._lock:
+            # read the entries of the other processes first
+            self._save_index()
+            index = self._load_index()
+            for key in [k for k, e in index.items() if (source is None) or (e['source'] == source)]:
+                self._drop(key)
+            self._swept = False
+            self._save_index()
+
+
+_default_cache = None
+
+
+def get_cache():
+    """
+    Return the process-wide response cache, creating it on first use.
+
+    Returns:
+        cache (ResponseCache): shared cache
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
+
+
+def cached(source):
+    """
+    Decorator that serves a fetcher from the response cache.
+    The cache key is built from the source and every argument of the call, except the api key.
+    The decorated function accepts two extra keyword arguments:
+        use_cache (bool): if False, bypass the cache entirely. Default True.
+        refresh (bool): if True, ignore the cached entry, call the api and overwrite the entry. Default False.
+
+    Args:
+        source (str): source of data. Used for the cache key and the TTL.
+
+    Returns:
+        decorator
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, use_cache=True, refresh=False, **kwargs):
+            cache = get_cache()
+            if not (use_cache and cache.enabled):
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = {k: v for k, v in bound.arguments.items() if k not in _IGNORED_ARGS}
+            key = cache.make_key(source, function=func.__qualname__, **params)
+
+            if not refresh:
+                value = cache.get(source, key)
+                if value is not None:
+                    logger.info("Cache hit for {}: {}".format(source, params))
+                    get_registry().inc('cache_hits_total', source=source)
+                    return value
+
+            get_registry().inc('cache_misses_total', source=source)
+            value = func(*args, **kwargs)
+            cache.set(source, key, value)
+            return value
+
+        return wrapper
+
+    return decorator
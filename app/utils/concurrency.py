@@ -0,0 +1,209 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .log import get_logger
+from .metrics import get_registry, record_throttle_wait
+
+logger = get_logger(__name__)
+
+# concurrency: maximum number of requests in flight to the source
+# calls / period: maximum number of requests per `period` seconds. None means no rate limit.
+SOURCE_LIMITS = {
+    'fred': {'concurrency': 4, 'calls': 120, 'period': 60},
+    'investing': {'concurrency': 2, 'calls': 30, 'period': 60},
+    'yf': {'concurrency': 8, 'calls': None, 'period': None},
+    'alpha_vantage': {'concurrency': 1, 'calls': 5, 'period': 60},
+    'fmp': {'concurrency': 4, 'calls': 250, 'period': 60},
+    'finviz': {'concurrency': 4, 'calls': 240, 'period': 60},
+}
+_DEFAULT_LIMIT = {'concurrency': 4, 'calls': None, 'period': None}
+
+# sources that share the quota of another source, because they use the same api key
+_QUOTA_GROUP = {
+    'alpha_vantage_financial_statements': 'alpha_vantage',
+}
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter, shared between threads.
+    Allows a burst of `calls` requests, then one request every `period / calls` seconds.
+    """
+
+    def __init__(self, calls, period):
+        """
+        Args:
+            calls (int): number of calls allowed per period
+            period (float): length of the period in seconds
+        """
+        self.capacity = calls
+        self.rate = calls / period
+        self.tokens = float(calls)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a call is allowed.
+
+        Returns:
+            waited (float): seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+_limiters = dict()
+_semaphores = dict()
+_registry_lock = threading.Lock()
+
+
+def _group(source):
+    return _QUOTA_GROUP.get(source, source)
+
+
+def get_limiter(source):
+    """
+    Return the shared rate limiter of a source.
+
+    Args:
+        source (str): source of data
+
+    Returns:
+        limiter (Union[RateLimiter, None]): None if the source has no rate limit
+    """
+    group = _group(source)
+    with _registry_lock:
+        if group not in _limiters:
+            limit = SOURCE_LIMITS.get(group, _DEFAULT_LIMIT)
+            _limiters[group] = RateLimiter(limit['calls'], limit['period']) if limit['calls'] else None
+        return _limiters[group]
+
+
+def get_semaphore(source):
+    """
+    Return the shared semaphore that caps the number of requests in flight to a source.
+
+    Args:
+        source (str): source of data
+
+    Returns:
+        semaphore (threading.BoundedSemaphore)
+    """
+    group = _group(source)
+    with _registry_lock:
+        if group not in _semaphores:
+            limit = SOURCE_LIMITS.get(group, _DEFAULT_LIMIT)
+            _semaphores[group] = threading.BoundedSemaphore(limit['concurrency'])
+        return _semaphores[group]
+
+
+def throttle(source):
+    """
+    Wait until the rate limit of the source allows one more request.
+    Call it right before every network request, so that cache hits do not use up the quota.
+    The wait is recorded in 'throttle_wait_seconds' and left out of the latency of the instrumented fetcher.
+
+    Args:
+        source (str): source of data
+    """
+    limiter = get_limiter(source)
+    if limiter is not None:
+        waited = limiter.acquire()
+        record_throttle_wait(source, waited)
+        if waited > 0:
+            logger.debug("Throttled {} for {:.2f} sec.".format(source, waited))
+
+
+def retry_call(func, args=(), kwargs=None, retries=3, backoff=1.0, name=None, source=None):
+    """
+    Call a function and retry with exponential backoff and jitter when it raises.
+    AssertionError is raised immediately, since it marks an unsupported request rather than a transient failure.
+
+    Args:
+        func (callable): function to call
+        args (tuple): positional arguments
+        kwargs (dict): keyword arguments
+        retries (int): number of retries after the first attempt
+        backoff (float): base waiting time in seconds. Doubles on every retry.
+        name (str): name of the call, used for logging
+        source (str): source of data, used to label the retry count
+
+    Raises:
+        Exception: the last exception, if every attempt failed
+
+    Returns:
+        result of the function
+    """
+    kwargs = kwargs or dict()
+    name = name or getattr(func, '__name__', str(func))
+
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except AssertionError:
+            raise
+        except Exception as e:
+            if attempt == retries:
+                raise
+            wait = backoff * (2 ** attempt) + random.uniform(0, backoff)
+            get_registry().inc('retries_total', source=source, task=name)
+            logger.info("{} failed ({}: {}). Retry {}/{} in {:.1f} sec.".format(name, e.__class__.__name__, e,
+                                                                             attempt + 1, retries, wait))
+            time.sleep(wait)
+
+
+def run_tasks(tasks, max_workers=8, retries=3, backoff=1.0):
+    """
+    Run fetch tasks on a thread pool.
+    The number of requests in flight to each source is capped by SOURCE_LIMITS,
+        and failed tasks are retried with backoff. A failing task does not stop the others,
+        and does not hold a slot of its source while it waits to retry.
+
+    Args:
+        tasks (list): [(name, source, func, kwargs), (name, source, func, kwargs), ...]
+        max_workers (int): number of threads
+        retries (int): number of retries for each task
+        backoff (float): base waiting time between retries in seconds
+
+    Returns:
+        results (dict): {name: result} of the successful tasks
+        errors (dict): {name: exception} of the failed tasks
+    """
+    def run(name, source, func, kwargs):
+        # the slot of the source is taken per attempt, and released during the backoff sleeps,
+        # so a failing task does not block the others of its source while it waits to retry
+        def attempt(**kwargs):
+            with get_semaphore(source):
+                return func(**kwargs)
+
+        return retry_call(attempt, kwargs=kwargs, retries=retries, backoff=backoff, name=name, source=source)
+
+    results = dict()
+    errors = dict()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run, name, source, func, kwargs): name for name, source, func, kwargs in tasks}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error("Failed to fetch {}: {}: {}".format(name, e.__class__.__name__, e))
+                errors[name] = e
+
+    if len(errors) > 0:
+        logger.info("Fetched {} of {} tasks. Failed: {}".format(len(results), len(tasks), ', '.join(errors)))
+
+    return results, errors
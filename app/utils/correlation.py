@@ -0,0 +1,305 @@
+import numpy as np
+import pandas as pd
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+
+# rolling windows that end within the same segment of this many rows (or of the window, if longer) share their
+# running totals, so no total covers more than two segments of history
+_SEGMENT_ROWS = 256
+
+
+def _demean(x):
+    """
+    Subtract the mean of every column, ignoring NaN. Correlations do not change when a series is shifted, and the
+        sums of squares of values close to zero keep their precision, while those of price levels cancel out.
+
+    Returns:
+        x (np.ndarray): shifted values, NaN kept
+        mean (np.ndarray): mean of every column, 0 for a column without values
+    """
+    present = ~np.isnan(x)
+    count = present.sum(axis=0)
+    mean = np.where(present, x, 0).sum(axis=0) / np.maximum(count, 1)
+    return x - mean, mean
+
+
+def _pairwise_moments(x, y=None):
+    """
+    Sums over the rows where both series of a pair are present, for every pair at once, with matrix products.
+    Values should be shifted close to zero first, see _demean.
+
+    Returns:
+        n, sum_x, sum_y, sum_xx, sum_yy, sum_xy (np.ndarray): each of shape (x columns, y columns)
+    """
+    if y is None:
+        y = x
+    mask_x = (~np.isnan(x)).astype('float64')
+    mask_y = (~np.isnan(y)).astype('float64')
+    x0 = np.where(mask_x > 0, x, 0)
+    y0 = np.where(mask_y > 0, y, 0)
+
+    n = mask_x.T @ mask_y
+    sum_x = x0.T @ mask_y
+    sum_y = mask_x.T @ y0
+    sum_xx = (x0 * x0).T @ mask_y
+    sum_yy = mask_x.T @ (y0 * y0)
+    sum_xy = x0.T @ y0
+    return n, sum_x, sum_y, sum_xx, sum_yy, sum_xy
+
+
+def _centred_moments(n, sum_x, sum_y, sum_xx, sum_yy, sum_xy):
+    """
+    Sums of squared and crossed deviations from the pairwise means, from the sums of shifted values.
+
+    Returns:
+        m2_x, m2_y, c_xy (np.ndarray)
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        m2_x = sum_xx - sum_x * sum_x / n
+        m2_y = sum_yy - sum_y * sum_y / n
+        c_xy = sum_xy - sum_x * sum_y / n
+    return m2_x, m2_y, c_xy
+
+
+def _correlation(n, m2_x, m2_y, c_xy, min_periods):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = c_xy / np.sqrt(m2_x * m2_y)
+    # only trims rounding errors: the moments are centred
+    corr = np.clip(corr, -1, 1)
+    return np.where(n >= max(min_periods, 2), corr, np.nan)
+
+
+def _block_moments(x):
+    """
+    Pairwise counts, means and centred moments of a block of rows, for merging with _merge_moments.
+
+    Returns:
+        moments (tuple): n, mean_x, mean_y, m2_x, m2_y, c_xy
+    """
+    x, mean = _demean(x)
+    n, sum_x, sum_y, sum_xx, sum_yy, sum_xy = _pairwise_moments(x)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = sum_x / n + mean[:, np.newaxis]
+        mean_y = sum_y / n + mean[np.newaxis, :]
+    return (n, mean_x, mean_y) + _centred_moments(n, sum_x, sum_y, sum_xx, sum_yy, sum_xy)
+
+
+def _merge_moments(a, b):
+    """
+    Moments of the union of two blocks of rows, from the moments of each (Chan et al.), without sums over the whole
+        history.
+    """
+    n_a, mean_x_a, mean_y_a, m2_x_a, m2_y_a, c_xy_a = a
+    n_b, mean_x_b, mean_y_b, m2_x_b, m2_y_b, c_xy_b = b
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta_x = mean_x_b - mean_x_a
+        delta_y = mean_y_b - mean_y_a
+        weight = n_a * n_b / n
+        merged = (n,
+                  mean_x_a + delta_x * n_b / n,
+                  mean_y_a + delta_y * n_b / n,
+                  m2_x_a + m2_x_b + delta_x * delta_x * weight,
+                  m2_y_a + m2_y_b + delta_y * delta_y * weight,
+                  c_xy_a + c_xy_b + delta_x * delta_y * weight)
+    # a pair without rows in one of the blocks keeps the moments of the other
+    return tuple(np.where(n_a == 0, value_b, np.where(n_b == 0, value_a, value))
+                 for value, value_a, value_b in zip(merged, a, b))
+
+
+def corr_matrix(df, other=None, min_periods=2):
+    """
+    Pairwise correlation matrix, using for each pair the rows where both series are present (like DataFrame.corr()).
+    Computed with a handful of matrix products instead of a loop over pairs.
+
+    Args:
+        df (pd.DataFrame): one column per series
+        other (Union[pd.DataFrame, None]): correlate the columns of df with the columns of other. Defaults to df.
+        min_periods (int): minimum number of common rows for a pair
+
+    Returns:
+        corr (pd.DataFrame): df columns x other columns
+    """
+    other_columns = df.columns if other is None else other.columns
+    x, _ = _demean(df.to_numpy(dtype='float64', na_value=np.nan))
+    y = None if other is None else _demean(other.to_numpy(dtype='float64', na_value=np.nan))[0]
+    n, sum_x, sum_y, sum_xx, sum_yy, sum_xy = _pairwise_moments(x, y)
+    corr = _correlation(n, *_centred_moments(n, sum_x, sum_y, sum_xx, sum_yy, sum_xy), min_periods=min_periods)
+    return pd.DataFrame(corr, index=df.columns, columns=other_columns)
+
+
+def _window_moments(x, ends, window):
+    """
+    Sums over the windows [end - window, end) of every pair of columns, for sorted ends.
+    The pairwise sums are kept as running totals over the rows: between two boundaries of a window, the rows in
+        between are added with one matrix product, and the window sums are differences of two running totals.
+
+    Returns:
+        moments (dict): {end: (n, m2_x, m2_y, c_xy)}
+    """
+    mask = (~np.isnan(x)).astype('float64')
+    x0 = np.where(mask > 0, x, 0)
+    k = x.shape[1]
+    starts = {e - window for e in ends if e - window > 0}
+
+    # running totals over rows [0, boundary): n, sum_x, sum_xx, sum_xy
+    totals = [np.zeros((k, k)) for _ in range(4)]
+    kept = {0: [t.copy() for t in totals]}
+    previous = 0
+
+    result = dict()
+    for boundary in sorted(set(ends) | starts):
+        block = slice(previous, boundary)
+        totals[0] += mask[block].T @ mask[block]
+        totals[1] += x0[block].T @ mask[block]
+        totals[2] += (x0[block] * x0[block]).T @ mask[block]
+        totals[3] += x0[block].T @ x0[block]
+        previous = boundary
+
+        if boundary in starts:
+            kept[boundary] = [t.copy() for t in totals]
+
+        if boundary in ends:
+            start = max(boundary - window, 0)
+            n, sum_x, sum_xx, sum_xy = [t - s for t, s in zip(totals, kept[start])]
+            if start > 0:
+                del kept[start]
+            result[boundary] = (n,) + _centred_moments(n, sum_x, sum_x.T, sum_xx, sum_xx.T, sum_xy)
+    return result
+
+
+def rolling_corr(df, window, step=1, min_periods=None, expanding=False):
+    """
+    Rolling (or expanding) correlation matrices of every pair of columns.
+    Matrices are computed every `step` rows, e.g. step=21 for roughly monthly matrices of daily data,
+        and every row is added with one matrix product per block of rows between two dates of interest.
+    Rolling windows are differences of running totals, restarted every segment of rows on values shifted by the
+        segment means, and expanding windows merge the centred moments of each block, so price levels keep the
+        precision of DataFrame.rolling().corr().
+
+    Args:
+        df (pd.DataFrame): one column per series, indexed by date, rows in date order
+        window (int): number of rows in the window. Ignored if expanding.
+        step (int): compute the matrix of every `step`-th row, and of the last row
+        min_periods (Union[int, None]): minimum number of common rows for a pair. Defaults to the window.
+        expanding (bool): use every row up to the date instead of a rolling window
+
+    Returns:
+        corr (dict): {date: pd.DataFrame correlation matrix}
+    """
+    x = df.to_numpy(dtype='float64', na_value=np.nan)
+    if min_periods is None:
+        min_periods = 2 if expanding else window
+
+    n_rows = x.shape[0]
+    ends = sorted(set(range(step, n_rows + 1, step)) | {n_rows})
+
+    moments = dict()
+    if expanding:
+        history, previous = None, 0
+        for end in ends:
+            block = _block_moments(x[previous:end])
+            history = block if history is None else _merge_moments(history, block)
+            moments[end] = (history[0],) + history[3:]
+            previous = end
+    else:
+        length = max(window, _SEGMENT_ROWS)
+        segments = dict()
+        for end in ends:
+            segments.setdefault((end - 1) // length, []).append(end)
+        for segment_ends in segments.values():
+            first = max(segment_ends[0] - window, 0)
+            shifted, _ = _demean(x[first:segment_ends[-1]])
+            for end, value in _window_moments(shifted, [e - first for e in segment_ends], window).items():
+                moments[end + first] = value
+
+    return {df.index[end - 1]: pd.DataFrame(_correlation(*moments[end], min_periods=min_periods),
+                                            index=df.columns, columns=df.columns)
+            for end in ends}
+
+
+def rolling_corr_with(df, target, window, min_periods=None):
+    """
+    Rolling correlation of every column with one target column, for every date, as a frame (like
+        DataFrame.rolling(window, min_periods).corr(df[target])).
+    Uses rolling sums from cumulative sums, so the whole history is computed without a loop over dates.
+        The cumulative sums restart every segment of rows, on values shifted by the segment means,
+        so price levels do not lose precision.
+
+    Args:
+        df (pd.DataFrame): one column per series, rows in date order
+        target (str): column to correlate the others with
+        window (int): number of rows in the window
+        min_periods (Union[int, None]): minimum number of common rows. Defaults to the window.
+
+    Returns:
+        corr (pd.DataFrame): same index and columns as df
+    """
+    min_periods = window if min_periods is None else min_periods
+    x = df.to_numpy(dtype='float64', na_value=np.nan)
+    y = df[target].to_numpy(dtype='float64', na_value=np.nan)[:, np.newaxis]
+    both = ~np.isnan(x) & ~np.isnan(y)
+    x = np.where(both, x, np.nan)
+    y = np.where(both, y, np.nan)
+
+    n_rows = x.shape[0]
+    length = max(window, _SEGMENT_ROWS)
+    corr = np.full(x.shape, np.nan)
+    for first in range(0, n_rows, length):
+        # windows ending on rows [first, last) start on or after row first - window + 1
+        last = min(first + length, n_rows)
+        rows = slice(max(first - window + 1, 0), last)
+        x0, _ = _demean(x[rows])
+        y0, _ = _demean(y[rows])
+        present = both[rows].astype('float64')
+        x0, y0 = np.nan_to_num(x0), np.nan_to_num(y0)
+
+        end = np.arange(first, last) - rows.start + 1
+        start = np.maximum(end - window, 0)
+
+        def rolling_sum(a):
+            cumsum = np.concatenate([np.zeros((1, a.shape[1])), np.cumsum(a, axis=0)])
+            return cumsum[end] - cumsum[start]
+
+        n = rolling_sum(present)
+        moments = _centred_moments(n, rolling_sum(x0), rolling_sum(y0), rolling_sum(x0 * x0), rolling_sum(y0 * y0),
+                                   rolling_sum(x0 * y0))
+        corr[first:last] = _correlation(n, *moments, min_periods=min_periods)
+    return pd.DataFrame(corr, index=df.index, columns=df.columns)
+
+
+def regime_corr(df, regimes, min_periods=2):
+    """
+    Correlation matrix within each regime, e.g. per year or per phase of the economic cycle.
+
+    Args:
+        df (pd.DataFrame): one column per series
+        regimes (Union[pd.Series, np.ndarray]): regime label of every row, e.g. df.index.year
+        min_periods (int): minimum number of common rows for a pair
+
+    Returns:
+        corr (dict): {regime: pd.DataFrame correlation matrix}
+    """
+    regimes = np.asarray(regimes)
+    return {regime: corr_matrix(df.loc[regimes == regime], min_periods=min_periods)
+            for regime in pd.unique(regimes)}
+
+
+def lagged_corr(df, other, lags, min_periods=2):
+    """
+    Cross-correlation of every column of df with every column of other shifted by each lag,
+        e.g. a macro series today against index returns `lag` rows later.
+
+    Args:
+        df (pd.DataFrame): leading series, one column per series
+        other (pd.DataFrame): lagging series, same index as df
+        lags (Iterable[int]): lags in rows. A positive lag pairs df at t with other at t + lag.
+        min_periods (int): minimum number of common rows for a pair
+
+    Returns:
+        corr (pd.DataFrame): MultiIndex (lag, df column) x other columns
+    """
+    frames = {lag: corr_matrix(df, other.shift(-lag), min_periods=min_periods) for lag in lags}
+    return pd.concat(frames, names=['lag'])
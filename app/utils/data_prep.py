@@ -1,29 +1,36 @@
 import pandas_market_calendars as mcal
 import itertools
+from .fetch_data import fred_fred, investing_api, alpha_vantage_api, yf_api, alpha_vantage_api_financial_statements
+from .concurrency import run_tasks
+from .alignment import align_frames
+from .features import price_ratio_features
+from .log import get_logger, output_performance
 
-
+logger = get_logger(__name__)
 
 
 def create_price_features(df):
     """
-    Feature engineering
+    Feature engineering.
+    See features.create_universe_features for many tickers at once, with rolling features.
     """
-    df['upper_shadow'] = df['High'] / df[['Close', 'Open']].max(axis=1)
-    df['lower_shadow'] = df[['Close', 'Open']].min(axis=1) / df['Low']
-    df['open2close'] = df['Close'] / df['Open']
-    df['high2low'] = df['High'] / df['Low']
-    mean_price = df[['Open', 'High', 'Low', 'Close']].mean(axis=1)
-    median_price = df[['Open', 'High', 'Low', 'Close']].median(axis=1)
-    df['high2mean'] = df['High'] / mean_price
-    df['low2mean'] = df['Low'] / mean_price
-    df['high2median'] = df['High'] / median_price
-    df['low2median'] = df['Low'] / median_price
+    ratios = price_ratio_features(df['Open'].to_numpy(dtype='float64'), df['High'].to_numpy(dtype='float64'),
+                                  df['Low'].to_numpy(dtype='float64'), df['Close'].to_numpy(dtype='float64'))
+    for name, values in ratios.items():
+        df[name] = values
     return df
 
 
 class master_df:
-    # TODO: need to finish this class.
-    
+    """
+    Fetch every series of data_fetch_config and align them into one wide frame.
+
+    Usage:
+        df = master_df('monthly', start_date, today, data_fetch_config)
+        df.fetch_data()
+        df.align()
+    """
+
     def __init__(self, interval, start_date, end_date, data_fetch_config):
         self.interval = interval
         self.start_date = start_date
@@ -41,57 +48,125 @@ class master_df:
         
         if len(intervals_choices) > 1:
             print("Caution: There are multiple choices of intervals : {}.\
-                  \nKeep in mind that it might cause problems in the future".format(intervals_choices))
+                  \nThey are aligned to the {} calendar by master_df.align".format(intervals_choices, self.interval))
             self.mixed_intervals = True
         else:
             self.mixed_intervals = False
         
         
-    def fetch_data(self):
-        data_dict_format = dict()
-        
+    def _fetch_tasks(self):
+        """
+        Translate data_fetch_config into fetch tasks.
+
+        Returns:
+            tasks (list): [(alias, source, func, kwargs), ...]
+        """
+        tasks = []
+
         for data_config in self.data_fetch_config:
-            if data_config['source'] == 'fred':
-                for config in data_config['config']:
-                    data_dict_format[config['alias']] = fred_fred(config['symbol'] , 
-                                                                  observation_start = self.start_date, 
-                                                                  observation_end = self.end_date)
-                    
-            elif data_config['source'] == 'investing':
-                for config in data_config['config']:
-                    data_dict_format[config['alias']] = investing_api(call_type = config['call_type'],
-                                                                      symbol = config['symbol'],
-                                                                      from_date = self.start_date, 
-                                                                      to_date = self.end_date, 
-                                                                      interval = config['interval'])
-                    
-            elif data_config['source'] == 'alpha_vantage':
-                for config in data_config['config']:
-                    data_dict_format[config['alias']] = alpha_vantage_api(call_type = config['call_type'],
-                                                                          symbol = config['symbol'], 
-                                                                          from_date = self.start_date,
-                                                                          to_date = self.end_date, 
-                                                                          interval = config['interval'],
-                                                                          currency = config['currency'])
-                    
-            elif data_config['source'] == 'alpha_vantage_financial_statements':
-                for config in data_config['config']:
-                    data_dict_format[config['alias']] = alpha_vantage_api_financial_statements(call_type = config['call_type'],
-                                                                                               symbol = config['symbol'])
-                    
-            elif data_config['source'] == 'yf':
-                for config in data_config['config']:
-                    data_dict_format[config['alias']] = yf_api(call_type = config['call_type'], 
-                                                               symbol = config['symbol'], 
-                                                               from_date = self.start_date, 
-                                                               to_date = self.end_date, 
-                                                               interval = config['interval'], 
-                                                               currency = config['currency'])
-                    
-            else:
-                assert False, "Source not supported."
-            
-        self.data_dict_format = data_dict_format
+            source = data_config['source']
+
+            for config in data_config['config']:
+                if source == 'fred':
+                    func = fred_fred
+                    kwargs = dict(symbol=config['symbol'],
+                                  observation_start=self.start_date,
+                                  observation_end=self.end_date)
+
+                elif source == 'investing':
+                    func = investing_api
+                    kwargs = dict(call_type=config['call_type'],
+                                  symbol=config['symbol'],
+                                  from_date=self.start_date,
+                                  to_date=self.end_date,
+                                  interval=config['interval'])
+
+                elif source == 'alpha_vantage':
+                    func = alpha_vantage_api
+                    kwargs = dict(call_type=config['call_type'],
+                                  symbol=config['symbol'],
+                                  from_date=self.start_date,
+                                  to_date=self.end_date,
+                                  interval=config['interval'],
+                                  currency=config['currency'])
+
+                elif source == 'alpha_vantage_financial_statements':
+                    func = alpha_vantage_api_financial_statements
+                    kwargs = dict(call_type=config['call_type'],
+                                  symbol=config['symbol'])
+
+                elif source == 'yf':
+                    func = yf_api
+                    kwargs = dict(call_type=config['call_type'],
+                                  symbol=config['symbol'],
+                                  from_date=self.start_date,
+                                  to_date=self.end_date,
+                                  interval=config['interval'],
+                                  currency=config['currency'])
+
+                else:
+                    assert False, "Source not supported."
+
+                tasks.append((config['alias'], source, func, kwargs))
+
+        return tasks
+
+    def fetch_data(self, max_workers=8, retries=3, backoff=1.0):
+        """
+        Fetch every series in data_fetch_config concurrently.
+        Requests in flight and requests per minute are capped per source (see concurrency.SOURCE_LIMITS).
+        Series that still fail after the retries are reported in `failed_dict_format`,
+            and the successful ones are kept in `data_dict_format`.
+
+        Args:
+            max_workers (int): number of threads. 1 fetches the series one at a time.
+            retries (int): number of retries for each series
+            backoff (float): base waiting time between retries in seconds
+
+        Returns:
+            data_dict_format (dict): {alias: standardized dataframe}
+        """
+        tasks = self._fetch_tasks()
+
+        with output_performance(logger, 'fetching {} series'.format(len(tasks))):
+            data_dict_format, failed_dict_format = run_tasks(tasks, max_workers=max_workers,
+                                                             retries=retries, backoff=backoff)
+
+        # keep the order of the config
+        self.data_dict_format = {alias: data_dict_format[alias] for alias, _, _, _ in tasks
+                                 if alias in data_dict_format}
+        self.failed_dict_format = failed_dict_format
+
+        return self.data_dict_format
+
+    def align(self, calendar='NYSE'):
+        """
+        Align the fetched series on the trading calendar of `self.interval`, in one pass.
+        Finer series are aggregated into each period, and coarser ones are forward-filled point-in-time.
+        A config entry can declare how its series is aligned:
+            'columns': columns to keep, e.g. ['Close', 'Volume']. Defaults to 'v' for FRED and 'Close' otherwise.
+            'agg': {column: aggregation}, e.g. {'Close': 'mean'}. Defaults to alignment.DEFAULT_AGG.
+            'release_lag': publication delay after the end of the period, e.g. '15D', so a value is used only once
+                it was published. A value is never used before the end of its period, e.g. a monthly value of
+                January from February on.
+
+        Args:
+            calendar (Union[str, pd.DatetimeIndex]): name of the market calendar, or the target dates themselves
+
+        Returns:
+            master (pd.DataFrame): wide frame with a 'Date' column and one column per series
+        """
+        if not hasattr(self, 'data_dict_format'):
+            self.fetch_data()
+
+        settings = {c['alias']: {k: c[k] for k in ['columns', 'agg', 'release_lag'] if k in c}
+                    for c in self.config_flat_list}
+
+        with output_performance(logger, 'aligning {} series'.format(len(self.data_dict_format))):
+            self.master = align_frames(self.data_dict_format, self.start_date, self.end_date,
+                                       interval=self.interval, calendar=calendar, settings=settings)
+
+        return self.master
 
 # Input format for the master_df class
 # data_fetch_config = [
@@ -117,7 +192,8 @@ class master_df:
 #           'call_type':'index',
 #           'interval':'monthly',
 #           'currency':'usd',
-#           'alias':'ir_10y'},
+#           'alias':'ir_10y',
+#           'release_lag':'30D'},
          
 #          {'symbol':'REAINTRATREARAT1YE',
 #           'call_type':'index',
@@ -128,4 +204,6 @@ class master_df:
     
 # ]
 
-# df = master_df('monthly', start_date, today, data_fetch_config)
\ No newline at end of file
+# df = master_df('monthly', start_date, today, data_fetch_config)
+# df.fetch_data()
+# master = df.align()
\ No newline at end of file
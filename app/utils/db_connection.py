@@ -1,9 +1,145 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
 import mysql.connector
+import mysql.connector.pooling
 from mysql.connector import Error
 from .log import get_logger
 
 logger = get_logger(__name__)
 
+# placeholders per statement of write_frame: SQLITE_MAX_VARIABLE_NUMBER of SQLite before 3.32, and for MySQL
+# a count that keeps a statement of numbers and short strings far below the default max_allowed_packet (4 MB)
+MAX_PLACEHOLDERS = {'sqlite': 999, 'mysql': 16384}
+
+
+class ConnectionPool:
+    """
+    Pool of MySQL connections shared by the helpers of this module.
+    Pass it wherever a connection is expected: the helpers borrow a connection for the duration of the call.
+    Borrowing blocks while every connection is in use, and a borrowed connection is pinged
+        (and reconnected if needed) before it is handed out.
+    """
+
+    def __init__(self, host_name, user_name, user_password, db_name=None, pool_size=5, pool_name='platform',
+                 health_check=True, timeout=30, **kwargs):
+        """
+        Args:
+            host_name (str):
+            user_name (str):
+            user_password (str):
+            db_name (Union[str, None]): database to use
+            pool_size (int): number of connections in the pool
+            pool_name (str): name of the pool. Must be unique in the process.
+            health_check (bool): ping borrowed connections and reconnect the broken ones
+            timeout (float): seconds to wait for a free connection
+            **kwargs: other arguments of mysql.connector.connect
+        """
+        self.pool_size = pool_size
+        self.health_check = health_check
+        self.timeout = timeout
+        self._available = threading.BoundedSemaphore(pool_size)
+        self._pool = mysql.connector.pooling.MySQLConnectionPool(pool_name=pool_name,
+                                                                 pool_size=pool_size,
+                                                                 host=host_name,
+                                                                 user=user_name,
+                                                                 passwd=user_password,
+                                                                 database=db_name,
+                                                                 **kwargs)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool. It goes back to the pool when the `with` block exits.
+
+        Raises:
+            mysql.connector.errors.PoolError: If no connection is freed within the timeout
+
+        Returns:
+            connection
+        """
+        if not self._available.acquire(timeout=self.timeout):
+            raise mysql.connector.errors.PoolError("No connection available in {} sec.".format(self.timeout))
+        try:
+            connection = self._pool.get_connection()
+            try:
+                if self.health_check:
+                    connection.ping(reconnect=True, attempts=3, delay=1)
+                yield connection
+            finally:
+                # closing a pooled connection returns it to the pool
+                connection.close()
+        finally:
+            self._available.release()
+
+
+def create_connection_pool(host_name, user_name, user_password, db_name=None, pool_size=5, **kwargs):
+    """
+    Create a pool of database connections
+
+    Args:
+        host_name (str):
+        user_name (str):
+        user_password (str):
+        db_name (Union[str, None]): database to use
+        pool_size (int): number of connections in the pool
+        **kwargs: other arguments of ConnectionPool
+
+    Returns:
+        pool (ConnectionPool)
+    """
+    pool = None
+    try:
+        pool = ConnectionPool(host_name, user_name, user_password, db_name=db_name, pool_size=pool_size, **kwargs)
+        logger.info("MySQL connection pool of size {} created".format(pool_size))
+    except Error as err:
+        logger.info(f"Error: '{err}'")
+
+    return pool
+
+
+@contextmanager
+def borrow(connection):
+    """
+    Use a connection, or borrow one if a ConnectionPool is given.
+
+    Args:
+        connection (Union[ConnectionPool, connection]): pool or connection
+
+    Returns:
+        connection
+    """
+    if isinstance(connection, ConnectionPool):
+        with connection.connection() as pooled:
+            yield pooled
+    else:
+        yield connection
+
+
+@contextmanager
+def open_cursor(connection, **kwargs):
+    """
+    Open a cursor that is closed when the `with` block exits.
+    A ConnectionPool can be given instead of a connection.
+
+    Args:
+        connection (Union[ConnectionPool, connection]): pool or connection
+        **kwargs: arguments of connection.cursor
+
+    Returns:
+        cursor
+    """
+    with borrow(connection) as conn:
+        cursor = conn.cursor(**kwargs)
+        try:
+            yield conn, cursor
+        finally:
+            cursor.close()
+
 
 def create_server_connection(host_name, user_name, user_password):
     """
@@ -31,21 +167,22 @@ def create_server_connection(host_name, user_name, user_password):
     return connection
 
 def create_database(connection, query):
-    cursor = connection.cursor()
-    try:
-        cursor.execute(query)
-        logger.info("Database created successfully")
-    except Error as err:
-        logger.info(f"Error: '{err}'")
+    with open_cursor(connection) as (_, cursor):
+        try:
+            cursor.execute(query)
+            logger.info("Database created successfully")
+        except Error as err:
+            logger.info(f"Error: '{err}'")
 
-def create_db_connection(host_name, user_name, user_password, db_name=None):
+def create_db_connection(host_name, user_name, user_password, db_name=None, allow_local_infile=False):
     connection = None
     try:
         connection = mysql.connector.connect(
             host=host_name,
             user=user_name,
             passwd=user_password,
-            database=db_name
+            database=db_name,
+            allow_local_infile=allow_local_infile
         )
         logger.info("MySQL Database connection successful")
     except Error as err:
@@ -54,20 +191,229 @@ def create_db_connection(host_name, user_name, user_password, db_name=None):
     return connection
 
 def execute_query(connection, query):
-    cursor = connection.cursor(buffered=True)
-    try:
-        cursor.execute(query)
-        connection.commit()
-        logger.info("Query successful")
-    except Error as err:
-        logger.info(f"Error: '{err}'")
+    with open_cursor(connection, buffered=True) as (conn, cursor):
+        try:
+            cursor.execute(query)
+            conn.commit()
+            logger.info("Query successful")
+        except Error as err:
+            logger.info(f"Error: '{err}'")
 
 def read_query(connection, query):
-    cursor = connection.cursor()
-    result = None
+    with open_cursor(connection) as (_, cursor):
+        result = None
+        try:
+            cursor.execute(query)
+            result = cursor.fetchall()
+            return result
+        except Error as err:
+            logger.info(f"Error: '{err}'")
+
+
+def stream_query(connection, query, chunk_size=10000, params=None):
+    """
+    Run a query and yield the result in chunks of rows, instead of fetching every row at once.
+    MySQL connections use an unbuffered cursor, so rows are read from the server as the chunks are consumed.
+    The connection (or the connection borrowed from a pool) is busy until the generator is exhausted or closed.
+
+    Args:
+        connection (Union[ConnectionPool, connection]): pool or connection
+        query (str): query to run
+        chunk_size (int): number of rows per chunk
+        params (Union[tuple, dict, None]): parameters of the query
+
+    Returns:
+        generator of (columns, rows): column names and a list of row tuples
+    """
+    kwargs = dict() if isinstance(connection, sqlite3.Connection) else dict(buffered=False)
+
+    with open_cursor(connection, **kwargs) as (conn, cursor):
+        try:
+            cursor.execute(query, params or ())
+            columns = [d[0] for d in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if len(rows) == 0:
+                    break
+                yield columns, rows
+        finally:
+            # drop the rest of an unbuffered result, if the consumer stopped early
+            if getattr(conn, 'unread_result', False):
+                conn.consume_results()
+
+
+def stream_query_frames(connection, query, chunk_size=10000, params=None, dtypes=None):
+    """
+    Run a query and yield the result as dataframes of `chunk_size` rows.
+
+    Args:
+        connection (Union[ConnectionPool, connection]): pool or connection
+        query (str): query to run
+        chunk_size (int): number of rows per dataframe
+        params (Union[tuple, dict, None]): parameters of the query
+        dtypes (Union[dict, None]): {column: dtype} of the columns to convert
+
+    Returns:
+        generator of pd.DataFrame
+    """
+    for columns, rows in stream_query(connection, query, chunk_size=chunk_size, params=params):
+        yield pd.DataFrame(_typed_columns(columns, rows, dtypes), columns=columns)
+
+
+def _typed_columns(columns, rows, dtypes=None):
+    """
+    Transpose a chunk of row tuples into one numpy array per column.
+    Columns listed in `dtypes` are converted to that dtype (None becomes NaN/NaT), the others are inferred.
+    """
+    dtypes = dtypes or dict()
+    arrays = dict()
+    for column, values in zip(columns, zip(*rows)):
+        if column in dtypes:
+            arrays[column] = np.array(values, dtype=dtypes[column])
+        else:
+            arrays[column] = np.array(values)
+    return arrays
+
+
+def read_query_frame(connection, query, chunk_size=10000, params=None, dtypes=None):
+    """
+    Run a query and build a dataframe column by column, streaming the rows in chunks.
+    Only one chunk of python row tuples is alive at a time; the rest of the result is held in typed numpy arrays.
+    Pass `dtypes` for compact columns, e.g. {'Close': 'float32', 'Date': 'datetime64[ns]'}.
+
+    Args:
+        connection (Union[ConnectionPool, connection]): pool or connection
+        query (str): query to run
+        chunk_size (int): number of rows fetched at a time
+        params (Union[tuple, dict, None]): parameters of the query
+        dtypes (Union[dict, None]): {column: dtype} of the columns to convert
+
+    Returns:
+        df (pd.DataFrame): result of the query
+    """
+    columns = None
+    chunks = []
+    for columns, rows in stream_query(connection, query, chunk_size=chunk_size, params=params):
+        chunks.append(_typed_columns(columns, rows, dtypes))
+
+    if columns is None:
+        return pd.DataFrame()
+
+    return pd.DataFrame({c: np.concatenate([chunk[c] for chunk in chunks]) for c in columns}, columns=columns)
+
+
+def _format_dates(df):
+    df = df.copy()
+    for column in df.columns:
+        if str(df[column].dtype).startswith('datetime'):
+            df[column] = df[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df
+
+
+def _frame_rows(df):
+    """
+    Convert a dataframe into a list of tuples that any DB-API driver accepts.
+    Dates become 'YYYY-MM-DD HH:MM:SS' strings and missing values become None.
+    """
+    df = _format_dates(df)
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+
+def _upsert_statement(table, columns, key, n_rows, is_sqlite):
+    placeholder = '?' if is_sqlite else '%s'
+    row = '(' + ', '.join([placeholder] * len(columns)) + ')'
+    column_list = ', '.join('`{}`'.format(c) for c in columns)
+    query = 'INSERT INTO `{}` ({}) VALUES {}'.format(table, column_list, ', '.join([row] * n_rows))
+
+    updates = [c for c in columns if c != key]
+    if is_sqlite:
+        query += ' ON CONFLICT(`{}`) DO UPDATE SET '.format(key)
+        query += ', '.join('`{0}`=excluded.`{0}`'.format(c) for c in updates)
+    else:
+        query += ' ON DUPLICATE KEY UPDATE '
+        query += ', '.join('`{0}`=VALUES(`{0}`)'.format(c) for c in updates)
+    return query
+
+
+def _load_data_infile(cursor, df, table):
+    """
+    Write a batch to a temporary csv file and load it with LOAD DATA LOCAL INFILE.
+    REPLACE makes rows with an existing key overwrite the stored ones.
+    """
+    df = _format_dates(df)
+
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
     try:
+        df.to_csv(path, index=False, header=False, na_rep='\\N')
+        column_list = ', '.join('`{}`'.format(c) for c in df.columns)
+        query = ("LOAD DATA LOCAL INFILE '{}' REPLACE INTO TABLE `{}` "
+                 "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                 "LINES TERMINATED BY '\\n' ({})").format(path.replace('\\', '/'), table, column_list)
         cursor.execute(query)
-        result = cursor.fetchall()
-        return result
-    except Error as err:
-        logger.info(f"Error: '{err}'")
\ No newline at end of file
+    finally:
+        os.remove(path)
+
+
+def write_frame(connection, df, table, key='p_key', batch_size=1000, method='multi_row', max_placeholders=None):
+    """
+    Bulk upsert a standardized dataframe into a table, on its unique key.
+    Every batch is written in its own transaction. If a batch fails, it is rolled back and the error is raised:
+        the batches before it stay written.
+    Works with mysql.connector connections, connection pools and, for testing, sqlite3 connections.
+
+    Args:
+        connection (Union[ConnectionPool, connection]): pool, mysql.connector or sqlite3 connection
+        df (pd.DataFrame): dataframe to write. Column names must match the table.
+        table (str): name of the table
+        key (str): unique key of the table. Rows with an existing key are updated.
+        batch_size (int): number of rows per transaction
+        method (str): 'multi_row' for INSERT ... ON DUPLICATE KEY UPDATE statements with many rows each,
+                      'executemany' for one prepared row statement executed for the batch,
+                      'infile' for LOAD DATA LOCAL INFILE from a temporary file (MySQL only,
+                      the connection needs allow_local_infile=True)
+        max_placeholders (Union[int, None]): maximum number of values per multi_row statement. A batch of a wide
+            frame is split into several statements. Defaults to MAX_PLACEHOLDERS of the database.
+
+    Raises:
+        mysql.connector.Error, sqlite3.Error: the error of the failed batch, after its rollback
+
+    Returns:
+        n_rows (int): number of rows written
+    """
+    assert method in ['multi_row', 'executemany', 'infile']
+    is_sqlite = isinstance(connection, sqlite3.Connection)
+    assert not (is_sqlite and method == 'infile'), "LOAD DATA LOCAL INFILE is only supported by MySQL"
+
+    columns = list(df.columns)
+    if max_placeholders is None:
+        max_placeholders = MAX_PLACEHOLDERS['sqlite' if is_sqlite else 'mysql']
+    rows_per_statement = max(1, min(batch_size, max_placeholders // max(len(columns), 1)))
+    queries = dict()
+    n_rows = 0
+
+    with open_cursor(connection) as (conn, cursor):
+        for start in range(0, df.shape[0], batch_size):
+            batch = df.iloc[start:start + batch_size]
+            try:
+                if method == 'infile':
+                    _load_data_infile(cursor, batch, table)
+                elif method == 'executemany':
+                    cursor.executemany(_upsert_statement(table, columns, key, 1, is_sqlite), _frame_rows(batch))
+                else:
+                    rows = _frame_rows(batch)
+                    for first in range(0, len(rows), rows_per_statement):
+                        chunk = rows[first:first + rows_per_statement]
+                        if len(chunk) not in queries:
+                            queries[len(chunk)] = _upsert_statement(table, columns, key, len(chunk), is_sqlite)
+                        cursor.execute(queries[len(chunk)], [value for row in chunk for value in row])
+                conn.commit()
+                n_rows += batch.shape[0]
+            except (Error, sqlite3.Error) as err:
+                conn.rollback()
+                logger.error(f"Error: '{err}'. Stopped writing {table} after {n_rows} of {df.shape[0]} rows.")
+                raise
+
+    logger.info("Wrote {} rows to {}".format(n_rows, table))
+    return n_rows
@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def to_panel(df, columns=PRICE_COLUMNS, date_column='Date', symbol_column='symbol'):
+    """
+    Turn a long frame of many symbols (e.g. concatenated standardized frames) into dense (date x symbol) arrays.
+    Missing (date, symbol) pairs are NaN.
+
+    Args:
+        df (pd.DataFrame): long frame with date, symbol and price columns
+        columns (list): columns to put into arrays
+        date_column (str): name of the date column
+        symbol_column (str): name of the symbol column
+
+    Returns:
+        dates (pd.DatetimeIndex): sorted dates, the rows of the arrays
+        symbols (pd.Index): sorted symbols, the columns of the arrays
+        arrays (dict): {column: np.ndarray of shape (len(dates), len(symbols))}
+    """
+    date_codes, dates = pd.factorize(df[date_column], sort=True)
+    symbol_codes, symbols = pd.factorize(df[symbol_column].astype(str), sort=True)
+
+    arrays = dict()
+    for column in columns:
+        if column not in df.columns:
+            continue
+        array = np.full((len(dates), len(symbols)), np.nan)
+        array[date_codes, symbol_codes] = df[column].to_numpy(dtype='float64', na_value=np.nan)
+        arrays[column] = array
+
+    return pd.DatetimeIndex(dates), pd.Index(symbols), arrays
+
+
+def price_ratio_features(open_, high, low, close):
+    """
+    Candle ratios of create_price_features, on arrays of any shape.
+    The mean and median of (Open, High, Low, Close) skip missing prices, like pandas does.
+
+    Args:
+        open_ (np.ndarray): open prices
+        high (np.ndarray): high prices
+        low (np.ndarray): low prices
+        close (np.ndarray): close prices
+
+    Returns:
+        features (dict): {feature name: np.ndarray}
+    """
+    prices = np.stack([open_, high, low, close]).astype('float64')
+    valid = ~np.isnan(prices)
+    n_valid = valid.sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_price = np.where(valid, prices, 0).sum(axis=0) / n_valid
+
+        # median of up to 4 values: missing values sort last, so average the two middle valid ones
+        ordered = np.sort(prices, axis=0)
+        lower = np.take_along_axis(ordered, np.maximum((n_valid - 1) // 2, 0)[np.newaxis], axis=0)[0]
+        upper = np.take_along_axis(ordered, np.minimum(n_valid // 2, 3)[np.newaxis], axis=0)[0]
+        median_price = np.where(n_valid > 0, (lower + upper) / 2, np.nan)
+
+        return {
+            'upper_shadow': high / np.fmax(close, open_),
+            'lower_shadow': np.fmin(close, open_) / low,
+            'open2close': close / open_,
+            'high2low': high / low,
+            'high2mean': high / mean_price,
+            'low2mean': low / mean_price,
+            'high2median': high / median_price,
+            'low2median': low / median_price,
+        }
+
+
+def shift(x, periods):
+    """
+    Shift an array along the first axis, filling with NaN.
+    """
+    shifted = np.full_like(x, np.nan, dtype='float64')
+    if periods < x.shape[0]:
+        shifted[periods:] = x[:x.shape[0] - periods]
+    return shifted
+
+
+def pct_change(x, periods=1):
+    """
+    Relative change over `periods` rows along the first axis. Missing prices are not filled.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return x / shift(x, periods) - 1
+
+
+def _cumulative_sums(x):
+    """
+    Cumulative sums along the first axis, as a high part (np.cumsum) and a low part that accumulates the rounding
+        error of every addition (TwoSum). The difference of two cumulative sums then keeps the precision of the rows
+        in between, however long the history. indicators.RollingSum makes the same additions one value at a time.
+    """
+    high = np.cumsum(x, axis=0)
+    previous = np.concatenate([np.zeros((1,) + x.shape[1:]), high[:-1]])
+    added = high - previous
+    low = np.cumsum((previous - (high - added)) + (x - added), axis=0)
+    return high, low
+
+
+def _cumulative(x):
+    """
+    Cumulative sums (high and low parts) and counts of the finite values along the first axis, with a leading row of
+        zeros, for _window_sums.
+    """
+    valid = np.isfinite(x)
+    padding = np.zeros((1,) + x.shape[1:])
+    high, low = _cumulative_sums(np.where(valid, x, 0))
+    return (np.concatenate([padding, high]), np.concatenate([padding, low]),
+            np.concatenate([padding, np.cumsum(valid, axis=0)]))
+
+
+def _window_sums(cumulative, window):
+    """
+    Rolling sum and count of finite values over `window` rows, from the output of _cumulative.
+    """
+    high, low, cumcount = cumulative
+    sums = (high[window:] - high[:-window]) + (low[window:] - low[:-window])
+    counts = cumcount[window:] - cumcount[:-window]
+
+    head = np.full((min(window - 1, high.shape[0] - 1),) + high.shape[1:], np.nan)
+    return np.concatenate([head, sums]), np.concatenate([head, counts])
+
+
+def _rolling_sums(x, window):
+    """
+    Rolling sum and count of finite values over `window` rows along the first axis, from cumulative sums.
+    """
+    return _window_sums(_cumulative(x), window)
+
+
+def rolling_mean(x, window, cumulative=None):
+    """
+    Rolling mean over `window` rows along the first axis.
+    NaN unless every value of the window is present and finite, like pandas' rolling(window).mean().
+
+    Args:
+        x (np.ndarray): values
+        window (int): number of rows
+        cumulative (Union[tuple, None]): _cumulative(x), to share it between several windows
+    """
+    sums, counts = _window_sums(_cumulative(x) if cumulative is None else cumulative, window)
+    return np.where(counts == window, sums / window, np.nan)
+
+
+def rolling_std(x, window):
+    """
+    Rolling sample standard deviation over `window` rows along the first axis.
+    NaN unless every value of the window is present and finite, like pandas' rolling(window).std().
+    """
+    sums, counts = _rolling_sums(x, window)
+    squares, _ = _rolling_sums(x * x, window)
+    with np.errstate(invalid='ignore'):
+        variance = (squares - sums * sums / window) / (window - 1)
+    return np.where(counts == window, np.sqrt(np.maximum(variance, 0)), np.nan)
+
+
+def compute_features(arrays, ma_windows=(20, 50, 200), return_periods=(1, 5, 20), vol_window=20):
+    """
+    Compute price features for a whole universe at once, on (date x symbol) arrays.
+    There is no loop over symbols; every feature is one vectorized kernel over the full array.
+
+    Args:
+        arrays (dict): {'Open': array, 'High': array, 'Low': array, 'Close': array}, see `to_panel`
+        ma_windows (tuple): windows of the moving averages of Close, and of the distance to them (DMA distance)
+        return_periods (tuple): periods of the Close returns
+        vol_window (int): window of the volatility of the daily returns
+
+    Returns:
+        features (dict): {feature name: np.ndarray of shape (dates, symbols)}
+    """
+    close = arrays['Close']
+    features = price_ratio_features(arrays['Open'], arrays['High'], arrays['Low'], close)
+
+    for period in return_periods:
+        features['return_{}'.format(period)] = pct_change(close, period)
+
+    cumulative = _cumulative(close)
+    for window in ma_windows:
+        moving_average = rolling_mean(close, window, cumulative=cumulative)
+        features['ma_{}'.format(window)] = moving_average
+        with np.errstate(invalid='ignore', divide='ignore'):
+            features['dma_{}'.format(window)] = close / moving_average - 1
+
+    features['volatility_{}'.format(vol_window)] = rolling_std(pct_change(close, 1), vol_window)
+
+    return features
+
+
+def create_universe_features(df, ma_windows=(20, 50, 200), return_periods=(1, 5, 20), vol_window=20, output='long'):
+    """
+    Batched version of create_price_features, for the concatenated standardized frames of a universe of tickers.
+    Rolling features are computed along each symbol's own rows, on the dates of the whole universe.
+
+    Args:
+        df (pd.DataFrame): long frame with 'Date', 'symbol' and OHLC columns
+        ma_windows (tuple): windows of the moving averages and DMA distances
+        return_periods (tuple): periods of the returns
+        vol_window (int): window of the volatility of the daily returns
+        output (str): 'long' for one row per (Date, symbol) with a Close price,
+                      'panel' for a dict of (date x symbol) dataframes
+
+    Returns:
+        features (Union[pd.DataFrame, dict]): features in the requested layout
+    """
+    assert output in ['long', 'panel']
+
+    dates, symbols, arrays = to_panel(df)
+    features = compute_features(arrays, ma_windows=ma_windows, return_periods=return_periods, vol_window=vol_window)
+
+    if output == 'panel':
+        return {name: pd.DataFrame(values, index=dates, columns=symbols) for name, values in features.items()}
+
+    present = ~np.isnan(arrays['Close'])
+    date_index, symbol_index = np.nonzero(present)
+    long_df = pd.DataFrame({'Date': dates[date_index], 'symbol': symbols[symbol_index]})
+    for name, values in features.items():
+        long_df[name] = values[present]
+    return long_df
@@ -1,41 +1,294 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+import numpy as np
 import pandas as pd
-from fredapi import Fred
 import json
 from pathlib import Path
-import investpy
-import requests
-from urllib.request import urlopen
-import yfinance as yf
-from .log import get_logger
-
-# auth
+from .log import get_logger, output_performance
+from .cache import cached
+from .concurrency import throttle, run_tasks
+from .metrics import instrument
+from .transport import get_transport, base_url
+from .symbols import get_symbol_index
+
+# investpy, yfinance and fredapi are imported on first use, and the keys are read on first use,
+# so importing this module is cheap and does not need the keys file.
 basepath = Path(__file__).parent.parent
 
+_KEY_PATH = basepath / 'keys' / 'keys.json'
+
 logger = get_logger(__name__)
 
-with open(str(basepath) + '/keys/keys.json', 'r') as key_file:
-    keys = json.load(key_file)
+_keys = None
+_fred = None
+_client_lock = threading.Lock()
 
-fred = Fred(api_key=keys['fred'])
-alpha_vantage = keys['alpha_vantage']
-financial_modeling_prep = keys['financial_modeling_prep']
 
-def fundamental_metric(soup, metric):
-    return soup.find(text=metric).find_next(class_='snapshot-td2').text
+def get_key(name):
+    """
+    Api key from keys/keys.json. The file is read once, on first use.
 
+    Args:
+        name (str): name of the key, e.g. 'fred', 'alpha_vantage', 'financial_modeling_prep'
 
-def get_fundamental_data(df):
-    for symbol in df.index:
-        try:
-            url = ("http://finviz.com/quote.ashx?t=" + symbol.lower())
-            soup = bs(requests.get(url).content)
-            for m in df.columns:
-                df.loc[symbol, m] = fundamental_metric(soup, m)
-        except Exception as e:
-            print(symbol, 'not found')
+    Returns:
+        key (str): api key
+    """
+    global _keys
+    with _client_lock:
+        if _keys is None:
+            with open(str(_KEY_PATH), 'r') as key_file:
+                _keys = json.load(key_file)
+    return _keys[name]
+
+
+def get_fred():
+    """
+    Fred client, built on first use.
+
+    Returns:
+        fred (fredapi.Fred): client
+    """
+    global _fred
+    key = get_key('fred')
+    with _client_lock:
+        if _fred is None:
+            from fredapi import Fred
+            _fred = Fred(api_key=key)
+    return _fred
+
+
+_LAZY_CLIENTS = {
+    'fred': get_fred,
+    'alpha_vantage': lambda: get_key('alpha_vantage'),
+    'financial_modeling_prep': lambda: get_key('financial_modeling_prep'),
+}
+
+
+def __getattr__(name):
+    # module attributes of the former eager setup, e.g. `fetch_data.fred`, resolved on first access
+    if name in _LAZY_CLIENTS:
+        return _LAZY_CLIENTS[name]()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+# start tag of the snapshot table, e.g. <table width="100%" class="snapshot-table2 screener_snapshot-table-body">
+_SNAPSHOT_TABLE = re.compile(r'<table\b[^>]*\bclass\s*=\s*["\']?[^"\'>]*\bsnapshot-table2\b', re.IGNORECASE)
+
+# characters of the page fed to the parser at once, until the end of the table
+_SNAPSHOT_CHUNK = 16384
+
+
+class _SnapshotParser(HTMLParser):
+    """
+    Collects the text of the cells of the first html table fed to it, one string per <td>.
+    Cells of nested tables are kept, and `done` is set at the end of the table.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cells = []
+        self.done = False
+        self._depth = 0
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'table':
+            self._depth += 1
+        elif tag == 'td' and self._depth > 0:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if tag == 'td' and self._cell is not None:
+            self.cells.append(''.join(self._cell).strip())
+            self._cell = None
+        elif tag == 'table' and self._depth > 0:
+            self._depth -= 1
+            self.done = self._depth == 0
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def parse_finviz_snapshot(html):
+    """
+    Extract the snapshot table (P/E, EPS, Market Cap, ...) of a finviz quote page.
+    The parser starts at the <table> tag whose class is snapshot-table2, and stops at the end of that table,
+        so the rest of the page (including styles or scripts that name the class) is not parsed.
+
+    Args:
+        html (str): quote page
+
+    Returns:
+        snapshot (dict): {metric: value as shown on the page}
+    """
+    match = _SNAPSHOT_TABLE.search(html)
+    if match is None:
+        return dict()
+
+    parser = _SnapshotParser()
+    position = match.start()
+    while not parser.done and position < len(html):
+        parser.feed(html[position:position + _SNAPSHOT_CHUNK])
+        position += _SNAPSHOT_CHUNK
+    cells = parser.cells
+    # cells alternate between a metric and its value
+    return dict(zip(cells[0::2], cells[1::2]))
+
+
+_FINVIZ_SUFFIXES = {'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12}
+
+
+def _finviz_number(value):
+    if value in ('-', ''):
+        return np.nan
+    if value.endswith('%'):
+        return float(value[:-1].replace(',', '')) / 100
+    if value[-1] in _FINVIZ_SUFFIXES:
+        return float(value[:-1].replace(',', '')) * _FINVIZ_SUFFIXES[value[-1]]
+    return float(value.replace(',', ''))
+
+
+def _finviz_numeric(column):
+    """
+    Convert a column of finviz values ('2.41B', '12.30%', '-') to numbers, if every value is a number.
+    """
+    try:
+        return column.map(_finviz_number, na_action='ignore').astype('float64')
+    except (ValueError, TypeError):
+        return column
+
+
+@cached('finviz')
+def finviz_page(symbol):
+    """
+    Download the finviz quote page of a symbol. Pages are cached on disk (see cache.DEFAULT_TTL).
+
+    Args:
+        symbol (str): ticker
+
+    Returns:
+        html (str): quote page
+    """
+    throttle('finviz')
+    url = '{}/quote.ashx?t={}'.format(base_url('finviz'), symbol.lower())
+    # finviz refuses clients that do not look like a browser
+    content = get_transport().get_bytes(url, source='finviz', symbol=symbol, headers={'User-Agent': 'Mozilla/5.0'})
+    return content.decode('utf-8', errors='replace')
+
+
+def finviz_snapshot(symbols, metrics=None, numeric=True, max_workers=4, retries=2, backoff=2.0):
+    """
+    Snapshot table of finviz for many symbols, e.g. the S&P 500.
+    Pages are fetched concurrently under the per-host limits of concurrency.SOURCE_LIMITS['finviz'],
+        and only the parsed snapshot of each page is kept in memory.
+
+    Args:
+        symbols (list): tickers
+        metrics (list): metrics to keep, e.g. ['P/E', 'EPS (ttm)']. Defaults to every metric.
+        numeric (bool): convert the columns that only hold numbers, e.g. '2.41B' to 2.41e9 and '12.30%' to 0.123
+        max_workers (int): number of threads
+        retries (int): number of retries of each page
+        backoff (float): base waiting time between retries in seconds
+
+    Returns:
+        df (pd.DataFrame): one row per symbol found, one column per metric
+    """
+    def snapshot(symbol):
+        values = parse_finviz_snapshot(finviz_page(symbol))
+        if metrics is not None:
+            values = {m: values.get(m) for m in metrics}
+        return values
+
+    tasks = [(symbol, 'finviz', snapshot, dict(symbol=symbol)) for symbol in symbols]
+    with output_performance(logger, 'finviz snapshot of {} symbols'.format(len(symbols))):
+        results, _ = run_tasks(tasks, max_workers=max_workers, retries=retries, backoff=backoff)
+
+    df = pd.DataFrame.from_dict({symbol: results[symbol] for symbol in symbols if symbol in results}, orient='index')
+    if metrics is not None:
+        df = df.reindex(columns=metrics)
+    if numeric:
+        df = df.apply(_finviz_numeric)
     return df
 
 
+def get_fundamental_data(df):
+    """
+    Fill a frame indexed by symbol, with finviz metrics as columns, from the finviz snapshot table.
+
+    Args:
+        df (pd.DataFrame): index of symbols, columns of metrics
+
+    Returns:
+        df (pd.DataFrame): the metrics as shown on finviz. Symbols not found are left empty.
+    """
+    snapshot = finviz_snapshot(list(df.index), metrics=list(df.columns), numeric=False)
+    return snapshot.reindex(index=df.index, columns=df.columns)
+
+
+def _fred_series_info(symbol):
+    """
+    Search FRED for the frequency and units of a series.
+
+    Args:
+        symbol (str): code for the index
+
+    Returns:
+        info (tuple): (interval, unit)
+    """
+    throttle('fred')
+    fred_search_df = get_fred().search(symbol).reset_index()
+    return fred_search_df.frequency.values[0].lower(), fred_search_df.units.values[0].lower()
+
+
+def _investing_listing(call_type, country):
+    """
+    Download the investing.com listing of a product type and map every symbol to its name.
+
+    Args:
+        call_type (str): etf, index or fund
+        country (str): country of the listing
+
+    Returns:
+        names (dict): {symbol: name}. The first product wins when a symbol is listed more than once.
+    """
+    import investpy
+    throttle('investing')
+    if call_type == 'etf':
+        listing = investpy.etfs.get_etfs(country=country)
+    elif call_type == 'index':
+        listing = investpy.indices.get_indices(country)
+    elif call_type == 'fund':
+        listing = investpy.funds.get_funds(country)
+
+    listing = listing.drop_duplicates(subset='symbol', keep='first')
+    return dict(zip(listing.symbol, listing.name))
+
+
+def investing_name(call_type, symbol, country):
+    """
+    Resolve the investing.com name of a symbol from the symbol index.
+    The listing of each (call_type, country) is downloaded once and refreshed on the schedule of the index.
+
+    Args:
+        call_type (str): etf, index or fund
+        symbol (str): ticker name or index symbol
+        country (str): country the ticker belongs to
+
+    Returns:
+        name (str): name of the product on investing.com
+    """
+    return get_symbol_index().lookup((call_type, country), symbol,
+                                     loader=lambda: _investing_listing(call_type, country))
+
+
 def convert_date_format(date, format):
     """
     Change the date format so that it matches the required format for each type of API.
@@ -58,12 +311,29 @@ def convert_date_format(date, format):
     elif format == 'investing':
         return d + '/' + m + '/' + y
 
-def standardize_data(source, df, symbol, call_type=None, interval=None, currency=None):
+
+def _constant_column(value, n_rows, compact):
+    """
+    Column that holds the same value on every row.
+    In compact mode it is a categorical, which stores one byte per row instead of one object pointer.
+    """
+    if not compact:
+        return value
+    if value is None:
+        return pd.Categorical.from_codes(np.full(n_rows, -1, dtype='int8'), categories=[])
+    return pd.Categorical.from_codes(np.zeros(n_rows, dtype='int8'), categories=[value])
+
+
+def standardize_data(source, df, symbol, call_type=None, interval=None, currency=None, compact=False):
     """
     A core function that standardizes data from different sources.
     The standardization process requires creating a key column, date column, and an interval column
     The output of the dataset should have the same column name, regardless of the data source.
 
+    In compact mode, the constant columns (symbol, type, interval, unit, Currency) are categoricals,
+        and the string `p_key` is replaced by an int32 `date_key` (YYYYMMDD) that identifies a row together with `symbol`.
+        Call `derive_p_key` before writing a compact frame to a store or a database.
+
     Args:
         source (str): source of data. 'fred', 'investing', 'alpha_vantage', 'alpha_vantage_financial_statements', 'yf'
         df (pd.DataFrame): dataframe to work on
@@ -71,51 +341,87 @@ def standardize_data(source, df, symbol, call_type=None, interval=None, currency
         call_type (str): type of investment
         interval (str): daily, weekly or monthly
         currency (str): currency of the target
+        compact (bool): use categorical constant columns and an integer date key instead of `p_key`
 
     Returns:
         df (pd.DataFrame): standardized dataframe
     """
+    n_rows = df.shape[0]
 
     if source=='fred':
         df.columns = ['Date', 'v']
-        df.loc[:, 'symbol'] = symbol
-        df['type'] = call_type
-        df['interval'] = interval
-        df['unit'] = currency
-        df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
-        df.loc[:, 'p_key'] = df['Date'].astype(str).str.replace("-", "_") + "_" + df['symbol']
+        constants = [('symbol', symbol), ('type', call_type), ('interval', interval), ('unit', currency)]
+        date_column = 'Date'
 
     elif source=='investing':
-        df.loc[:, 'symbol'] = symbol
-        df.loc[:, 'type'] = call_type
-        df.loc[:, 'interval'] = interval
-        df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
-        df.loc[:, 'p_key'] = df['Date'].astype(str).str.replace("-", "_") + "_" + df['symbol']
+        constants = [('symbol', symbol), ('type', call_type), ('interval', interval)]
+        date_column = 'Date'
 
     elif source=='alpha_vantage':
-        df.loc[:, 'Currency'] = currency
-        df.loc[:, 'symbol'] = symbol
-        df.loc[:, 'type'] = call_type
-        df['interval'] = interval
-        df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
-        df.loc[:, 'p_key'] = df['Date'].astype(str).str.replace("-", "_") + "_" + df['symbol']
+        constants = [('Currency', currency), ('symbol', symbol), ('type', call_type), ('interval', interval)]
+        date_column = 'Date'
 
     elif source=='alpha_vantage_financial_statements':
-        df['fiscalDateEnding'] = pd.to_datetime(df['fiscalDateEnding'], format='%Y-%m-%d')
-        df['symbol'] = symbol
-        df.loc[:, 'p_key'] = df['fiscalDateEnding'].astype(str).str.replace("-", "_") + "_" + df['symbol']
+        constants = [('symbol', symbol)]
+        date_column = 'fiscalDateEnding'
 
     elif source=='yf':
-        df.loc[:, 'Currency'] = currency
-        df['symbol'] = symbol
-        df['type'] = call_type
-        df['interval'] = interval
-        df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
-        df.loc[:, 'p_key'] = df['Date'].astype(str).str.replace("-", "_") + "_" + df['symbol']
+        constants = [('Currency', currency), ('symbol', symbol), ('type', call_type), ('interval', interval)]
+        date_column = 'Date'
+
+    else:
+        # unknown sources are returned as they are
+        return df
+
+    for column, value in constants:
+        df[column] = _constant_column(value, n_rows, compact)
+    df[date_column] = pd.to_datetime(df[date_column], format='%Y-%m-%d')
+
+    if compact:
+        dates = df[date_column].dt
+        df['date_key'] = (dates.year * 10000 + dates.month * 100 + dates.day).astype('int32')
+    else:
+        df['p_key'] = make_p_key(df[date_column], symbol)
+
+    return df
+
+
+def make_p_key(dates, symbol):
+    """
+    Row key `YYYY_MM_DD_<symbol>` of the standardized frames, in every mode, so upserts on `p_key` match.
+    Dates are formatted in their own time zone, so the tz-aware Date of yf gives the same key as a naive one.
+
+    Args:
+        dates (pd.Series): datetime column
+        symbol (Union[str, pd.Series]): symbol, or a column of symbols
+
+    Returns:
+        p_key (pd.Series): string keys
+    """
+    if isinstance(symbol, pd.Series):
+        symbol = symbol.astype(str)
+    return dates.dt.strftime('%Y_%m_%d') + "_" + symbol
+
+
+def derive_p_key(df, date_column='Date'):
+    """
+    Add the string `p_key` to a frame standardized in compact mode, e.g. right before writing it.
+
+    Args:
+        df (pd.DataFrame): standardized dataframe with `date_key` and `symbol` columns
+        date_column (str): 'Date', or 'fiscalDateEnding' for financial statements
 
+    Returns:
+        df (pd.DataFrame): the same dataframe, with `p_key`
+    """
+    if 'p_key' not in df.columns:
+        df['p_key'] = make_p_key(df[date_column], df['symbol'])
     return df
 
-def fred_fred(symbol, observation_start=None, observation_end=None, call_type='index'):
+
+@cached('fred')
+@instrument('fred')
+def fred_fred(symbol, observation_start=None, observation_end=None, call_type='index', compact=False):
     """
     Fetch FRED data from the Fred API.
 
@@ -123,6 +429,7 @@ def fred_fred(symbol, observation_start=None, observation_end=None, call_type='i
         symbol (str): code for the index
         observation_start (Union[str, None]): 'YYYY-MM-DD' format date. If None, calls every possible date.
         observation_end (Union[str, None]): 'YYYY-MM-DD' format date. If None, calls every possible date.
+        compact (bool): standardize in compact mode. See `standardize_data`.
 
     Returns:
         df (pd.DataFrame): dataframe of the index data
@@ -132,19 +439,21 @@ def fred_fred(symbol, observation_start=None, observation_end=None, call_type='i
     observation_start = convert_date_format(observation_start, 'fred')
     observation_end = convert_date_format(observation_end, 'fred')
 
-    fred_search_df = fred.search(symbol).reset_index()
-    interval = fred_search_df.frequency.values[0].lower()
-    unit = fred_search_df.units.values[0].lower()
+    interval, unit = get_symbol_index().lookup_one('fred', symbol, loader=_fred_series_info)
 
-    df = fred.get_series(symbol, observation_start=observation_start, observation_end=observation_end)
+    throttle('fred')
+    df = get_fred().get_series(symbol, observation_start=observation_start, observation_end=observation_end)
     df = pd.DataFrame(df).reset_index()
 
-    df = standardize_data('fred', df, symbol=symbol, call_type=call_type, interval=interval, currency=unit)
+    df = standardize_data('fred', df, symbol=symbol, call_type=call_type, interval=interval, currency=unit,
+                          compact=compact)
 
     return df
 
 
-def investing_api(call_type, symbol, from_date, to_date, interval='daily', country='united states'):
+@cached('investing')
+@instrument('investing')
+def investing_api(call_type, symbol, from_date, to_date, interval='daily', country='united states', compact=False):
     """
     Fetch data from Investing.com
 
@@ -155,17 +464,19 @@ def investing_api(call_type, symbol, from_date, to_date, interval='daily', count
         to_date (str): End date of the data. 'YYYY-MM-DD' format date
         country (str): country the ticker belongs to
         interval (str): interval of the dat points. daily, weekly, monthly
+        compact (bool): standardize in compact mode. See `standardize_data`.
 
     Returns:
         df (pd.DataFrame): dataset from investing.com.
     """
+    import investpy
     from_date = convert_date_format(from_date, 'investing')
     to_date = convert_date_format(to_date, 'investing')
 
     if call_type == 'etf':
         # search name from ticker and return
-        etfs = investpy.etfs.get_etfs(country=country)
-        etf_name = etfs.loc[(etfs.symbol == symbol), 'name'].tolist()[0]
+        etf_name = investing_name(call_type, symbol, country)
+        throttle('investing')
         data = investpy.get_etf_historical_data(etf=etf_name, country=country,
                                                 from_date=from_date,
                                                 to_date=to_date,
@@ -173,6 +484,7 @@ def investing_api(call_type, symbol, from_date, to_date, interval='daily', count
         logger.info("Fetching {} etf from investing_api: {}, from {} to {}".format(interval, symbol, from_date, to_date))
         
     elif call_type == 'stock':
+        throttle('investing')
         data = investpy.stocks.get_stock_historical_data(stock=symbol, country=country,
                                                          from_date=from_date,
                                                          to_date=to_date,
@@ -180,8 +492,8 @@ def investing_api(call_type, symbol, from_date, to_date, interval='daily', count
         logger.info("Fetching {} stock from investing_api: {}, from {} to {}".format(interval, symbol, from_date, to_date))
 
     elif call_type == 'index':
-        index_df = investpy.indices.get_indices('united states')
-        index_name = index_df.loc[index_df.symbol == symbol, 'name'].tolist()[0]
+        index_name = investing_name(call_type, symbol, country)
+        throttle('investing')
         data = investpy.get_index_historical_data(index=index_name, country=country,
                                                   from_date=from_date,
                                                   to_date=to_date,
@@ -189,8 +501,8 @@ def investing_api(call_type, symbol, from_date, to_date, interval='daily', count
         logger.info("Fetching {} index from investing_api: {}, from {} to {}".format(interval, symbol, from_date, to_date))
 
     elif call_type == 'fund':
-        funds = investpy.funds.get_funds()
-        fund_name = funds.loc[funds.symbol == symbol, 'name'].tolist()[0]
+        fund_name = investing_name(call_type, symbol, country)
+        throttle('investing')
         data = investpy.get_fund_historical_data(fund=fund_name, country=country,
                                                   from_date=from_date,
                                                   to_date=to_date,
@@ -199,21 +511,25 @@ def investing_api(call_type, symbol, from_date, to_date, interval='daily', count
         logger.info("not supported call type")
         assert False, "Not implemented"
 
-    data = standardize_data('investing', data, symbol=symbol, call_type=call_type, interval=interval)
+    data = standardize_data('investing', data, symbol=symbol, call_type=call_type, interval=interval, compact=compact)
 
     return data
 
 
-def yf_api(call_type, symbol, from_date=None, to_date=None, interval='daily', currency='USD'):
+@cached('yf')
+@instrument('yf')
+def yf_api(call_type, symbol, from_date=None, to_date=None, interval='daily', currency='USD', compact=False):
     """
     Fetch data from yahoo finance
 
     Args:
         call_type (str): type of product. Options are: stock, fund, etf
         symbol (str): ticker name or index symbol.
-        from_date (str): Start date of the data. 'YYYY-MM-DD' format date
+        from_date (str): Start date of the data. 'YYYY-MM-DD' format date.
+                         If given, only the range from this date is downloaded instead of the full history.
         to_date (str): End date of the data. 'YYYY-MM-DD' format date
         interval (str): interval of the dat points. daily, weekly, monthly
+        compact (bool): standardize in compact mode. See `standardize_data`.
 
     Returns:
         df (pd.DataFrame): dataset from Yahoo Finance
@@ -221,6 +537,8 @@ def yf_api(call_type, symbol, from_date=None, to_date=None, interval='daily', cu
     """
 
     logger.info("Fetching data from YahooFinance: {}, from {} to {}.".format(symbol, from_date, to_date))
+    import yfinance as yf
+    throttle('yf')
     data = yf.Ticker(symbol)
 
     if interval=='daily':
@@ -232,8 +550,12 @@ def yf_api(call_type, symbol, from_date=None, to_date=None, interval='daily', cu
     else:
         assert False, "Not supported interval."
 
-    data = data.history(period="max", interval=interval_yf).reset_index()
-    data = standardize_data('yf', data, symbol, call_type=call_type, interval=interval, currency=currency)
+    if from_date is not None:
+        data = data.history(start=from_date, end=to_date, interval=interval_yf).reset_index()
+    else:
+        data = data.history(period="max", interval=interval_yf).reset_index()
+    data = standardize_data('yf', data, symbol, call_type=call_type, interval=interval, currency=currency,
+                            compact=compact)
     if (from_date is not None) and (to_date is not None):
         data = data.loc[(data.Date>from_date) & (data.Date<to_date)]
         data = data.reset_index(drop=True)
@@ -241,7 +563,10 @@ def yf_api(call_type, symbol, from_date=None, to_date=None, interval='daily', cu
     return data
 
 
-def alpha_vantage_api(call_type, symbol, from_date=None, to_date=None, interval='daily', currency='USD', key=alpha_vantage):
+@cached('alpha_vantage')
+@instrument('alpha_vantage')
+def alpha_vantage_api(call_type, symbol, from_date=None, to_date=None, interval='daily', currency='USD', key=None,
+                      outputsize='full', compact=False):
     """
     Fetch data from alpha vantage
 
@@ -250,7 +575,9 @@ def alpha_vantage_api(call_type, symbol, from_date=None, to_date=None, interval=
         symbol (str): ticker name
         interval (str): interval
         currency (str): currency of the index data. Used to match the format from other sources.
-        key (str): key for alpha vantage api
+        key (str): key for alpha vantage api. Defaults to the key in keys/keys.json.
+        outputsize (str): 'full' for the whole history, 'compact' for the latest 100 data points
+        compact (bool): standardize in compact mode. See `standardize_data`.
 
     Returns:
         df (pd.DataFrame): relevant data
@@ -266,9 +593,11 @@ def alpha_vantage_api(call_type, symbol, from_date=None, to_date=None, interval=
         data_column = 'Monthly Adjusted Time Series'
 
     if call_type=='stock':
-        url = 'https://www.alphavantage.co/query?function={}&symbol={}&apikey={}&outputsize=full'.format(input_interval, symbol, key)
-        r = requests.get(url)
-        data = r.json()
+        key = key or get_key('alpha_vantage')
+        url = '{}/query?function={}&symbol={}&apikey={}&outputsize={}'.format(base_url('alpha_vantage'), input_interval,
+                                                                              symbol, key, outputsize)
+        throttle('alpha_vantage')
+        data = get_transport().get_json(url, source='alpha_vantage', symbol=symbol)
         
         data = pd.DataFrame(data[data_column]).T
         data.reset_index(inplace=True)
@@ -279,21 +608,24 @@ def alpha_vantage_api(call_type, symbol, from_date=None, to_date=None, interval=
         logger.info("not supported call type")
         assert False, "Not implemented"
 
-    data = standardize_data('alpha_vantage', data, symbol=symbol, call_type=call_type, interval=interval, currency=currency)
+    data = standardize_data('alpha_vantage', data, symbol=symbol, call_type=call_type, interval=interval, currency=currency,
+                            compact=compact)
     if (from_date is not None) and (to_date is not None):
         data = data.loc[(data.Date>from_date) & (data.Date<to_date)]
         data = data.reset_index(drop=True)
         
     return data
 
-def alpha_vantage_api_financial_statements(call_type, symbol, key=alpha_vantage):
+@cached('alpha_vantage_financial_statements')
+@instrument('alpha_vantage_financial_statements')
+def alpha_vantage_api_financial_statements(call_type, symbol, key=None):
     """
     Fetch financial statements from the past 5 years
 
     Args:
         call_type (str): available options are: income statement, balance sheet, cash flow, earnings
         symbol (str): ticker of the company
-        key (str): key for alpha vantage api
+        key (str): key for alpha vantage api. Defaults to the key in keys/keys.json.
 
     Returns:
         data (pd.DataFrame): data of financial statement.
@@ -313,29 +645,54 @@ def alpha_vantage_api_financial_statements(call_type, symbol, key=alpha_vantage)
         function = 'EARNINGS'
         data_column = 'annualEarnings'
 
-    url = 'https://www.alphavantage.co/query?function={}&symbol={}&apikey={}&outputsize=full'.format(function,
-                                                                                                     symbol, key)
-    r = requests.get(url)
-    data = r.json()
-    data = pd.DataFrame(data[data_column])
+    key = key or get_key('alpha_vantage')
+    url = '{}/query?function={}&symbol={}&apikey={}&outputsize=full'.format(base_url('alpha_vantage'), function,
+                                                                            symbol, key)
+    throttle('alpha_vantage_financial_statements')
+    data = get_transport().get_json(url, source='alpha_vantage_financial_statements', symbol=symbol)
+    data = coerce_statement(pd.DataFrame(data[data_column]))
 
     data = standardize_data('alpha_vantage_financial_statements', data, symbol=symbol, call_type=call_type)
 
     return data
 
 
+# columns of the financial statements that are labels, not figures
+_STATEMENT_LABELS = ['fiscalDateEnding', 'reportedDate', 'reportedCurrency']
+
+
+def coerce_statement(df):
+    """
+    Convert the figures of a financial statement from the json strings of the api to numbers, once at ingest.
+    'None' becomes NaN. Figures are float64: amounts in the hundreds of billions need more than the 24 bits
+        of float32 to stay exact to the dollar. The currency is a categorical.
+
+    Args:
+        df (pd.DataFrame): statement as returned by the api
+
+    Returns:
+        df (pd.DataFrame): the same frame, with typed columns
+    """
+    for column in df.columns:
+        if column == 'reportedCurrency':
+            df[column] = df[column].astype('category')
+        elif column not in _STATEMENT_LABELS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    return df
+
+
 class FMP:
     """
     Class object for FinancialModelingPrep
     """
 
     def __init__(self):
-        self.key = financial_modeling_prep
+        self.key = get_key('financial_modeling_prep')
         logger.info("Financial Modeling Prep api ready.")
 
     def get_jsonparsed_data(self, url):
         """
-        Receive the content of ``url``, parse it as JSON and return the object.
+        Receive the content of ``url`` through the shared transport, parse it as JSON and return the object.
 
         Args:
             url (str): url of the API
@@ -343,35 +700,86 @@ class FMP:
         Returns:
             parsed_content (json): parsed content returned from the API
         """
-        response = urlopen(url)
-        data = response.read().decode("utf-8")
-        return json.loads(data)
+        throttle('fmp')
+        return get_transport().get_json(url, source='fmp')
+
+    def insider_trade_pages(self, ticker, num_pages=None, max_workers=4):
+        """
+        Pages of insider trades of a ticker, in order. Pages are requested `max_workers` at a time,
+            and the paging stops at the first empty page.
+
+        Args:
+            ticker (str): ticker name
+            num_pages (Union[int, None]): maximum number of pages. None fetches until the first empty page.
+            max_workers (int): number of pages requested at once
 
-    def get_historical_insider_trade_ticker(self, ticker, num_pages=1):
+        Returns:
+            pages (generator): (page number, list of records) for every non-empty page
+        """
+        def fetch(page):
+            url = "{}/api/v4/insider-trading?symbol={}&page={}&apikey={}".format(base_url('fmp'), ticker, page, self.key)
+            return self.get_jsonparsed_data(url)
+
+        page = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while (num_pages is None) or (page < num_pages):
+                wave = range(page, page + max_workers if num_pages is None else min(page + max_workers, num_pages))
+                for number, records in zip(wave, executor.map(fetch, wave)):
+                    if len(records) == 0:
+                        return
+                    yield number, records
+                page = wave[-1] + 1
+
+    @cached('fmp')
+    @instrument('fmp')
+    def get_historical_insider_trade_ticker(self, ticker, num_pages=1, max_workers=4):
         """
         Retrieve historical data
 
         Args:
             ticker (str): ticker name
-            num_pages (int): number of pages of reports to call. 1 page = 1 API call
+            num_pages (Union[int, None]): number of pages of reports to call. 1 page = 1 API call.
+                                          None calls every page until the first empty one.
+            max_workers (int): number of pages requested at once
 
         Returns:
             df (pd.DataFrame): insider trade historical data
         """
-        logger.info("Fetching {} pages of {} insider trade data.".format(num_pages, ticker))
+        logger.info("Fetching {} pages of {} insider trade data.".format('all' if num_pages is None else num_pages,
+                                                                         ticker))
 
-        df = pd.DataFrame()
+        records = []
+        for _, page_records in self.insider_trade_pages(ticker, num_pages=num_pages, max_workers=max_workers):
+            records.extend(page_records)
 
-        for page in range(num_pages):
-            url = "https://financialmodelingprep.com/api/v4/insider-trading?symbol={}&page={}&apikey={}".format(ticker, page, self.key)
-            insider_trade = self.get_jsonparsed_data(url)
-            df = pd.concat([df, pd.DataFrame(insider_trade)], axis=0)
+        return insider_trade_frame(records)
 
-        df = df.reset_index(inplace=False)
-        df['transactionDate'] = pd.to_datetime(df['transactionDate'], format='%Y-%m-%d')
+    def stream_insider_trades(self, tickers, sink, num_pages=None, max_workers=4):
+        """
+        Fetch the insider trades of many tickers, e.g. the whole S&P 500, handing every page to `sink`
+            as soon as it arrives, so only one wave of pages is held in memory.
 
-        return df
+        Args:
+            tickers (list): ticker names
+            sink (callable): called with (ticker, page number, df) for every page, e.g. `insider_parquet_sink()`
+            num_pages (Union[int, None]): maximum number of pages per ticker. None fetches every page.
+            max_workers (int): number of pages requested at once
 
+        Returns:
+            n_rows (dict): {ticker: number of trades}
+        """
+        n_rows = dict()
+        for ticker in tickers:
+            n_rows[ticker] = 0
+            for page, records in self.insider_trade_pages(ticker, num_pages=num_pages, max_workers=max_workers):
+                df = insider_trade_frame(records)
+                sink(ticker, page, df)
+                n_rows[ticker] += df.shape[0]
+            logger.info("Fetched {} insider trades of {}.".format(n_rows[ticker], ticker))
+        return n_rows
+
+    @cached('fmp')
+    @instrument('fmp')
     def get_stock_split_history(self, ticker):
         """
         Fetch stock split history of the ticker
@@ -385,11 +793,67 @@ class FMP:
 
         logger.info("Fetching stock split history for {}".format(ticker))
 
-        url = "https://financialmodelingprep.com/api/v3/historical-price-full/stock_split/{}?apikey={}".format(ticker, self.key)
+        url = "{}/api/v3/historical-price-full/stock_split/{}?apikey={}".format(base_url('fmp'), ticker, self.key)
         stock_split = self.get_jsonparsed_data(url)
 
         df = pd.DataFrame(stock_split['historical'])
         df['symbol'] = stock_split['symbol']
         df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
 
-        return df
\ No newline at end of file
+        return df
+
+
+# types of the insider trade columns. Other columns are kept as they come.
+_INSIDER_DATES = {'transactionDate': '%Y-%m-%d', 'filingDate': '%Y-%m-%d %H:%M:%S'}
+_INSIDER_NUMBERS = ['securitiesOwned', 'securitiesTransacted', 'price']
+_INSIDER_CATEGORIES = ['symbol', 'transactionType', 'typeOfOwner', 'acquistionOrDisposition', 'formType',
+                       'securityName']
+
+
+def insider_trade_frame(records):
+    """
+    Build the insider trade frame once from the records of every page, with typed columns:
+        dates as datetimes, amounts as float64 and repeated labels as categoricals.
+
+    Args:
+        records (list): records returned by the FMP insider-trading api
+
+    Returns:
+        df (pd.DataFrame): insider trades
+    """
+    df = pd.DataFrame.from_records(records)
+    if 'transactionDate' not in df.columns:
+        df['transactionDate'] = pd.Series(dtype='object')
+
+    for column, date_format in _INSIDER_DATES.items():
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], format=date_format, errors='coerce')
+    for column in _INSIDER_NUMBERS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    for column in _INSIDER_CATEGORIES:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+
+    return df
+
+
+def insider_parquet_sink(root=basepath / 'data_storage' / 'insider_trades'):
+    """
+    Sink for FMP.stream_insider_trades that writes every page to <root>/<ticker>/<page>.parquet.
+    Read the whole pull back with pd.read_parquet(root).
+
+    Args:
+        root (Union[str, Path]): directory of the pages
+
+    Returns:
+        sink (callable)
+    """
+    root = Path(root)
+
+    def sink(ticker, page, df):
+        directory = root / 'ticker={}'.format(ticker)
+        directory.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(str(directory / '{:05d}.parquet'.format(page)), index=False)
+
+    return sink
@@ -0,0 +1,154 @@
+from pathlib import Path
+import pandas as pd
+from .fetch_data import alpha_vantage_api_financial_statements
+from .concurrency import run_tasks
+from .log import get_logger, output_performance
+
+logger = get_logger(__name__)
+
+basepath = Path(__file__).parent.parent
+
+_PANEL_PATH = basepath / 'data_storage' / 'fundamentals.parquet'
+
+STATEMENTS = ['income statement', 'balance sheet', 'cash flow', 'earnings']
+
+# annual reports are filed within 60 to 90 days of the fiscal year end (10-K deadlines)
+DEFAULT_RELEASE_LAG = '90D'
+
+_INDEX = ['fiscalDateEnding', 'symbol']
+_DROPPED = ['p_key']
+
+
+class FundamentalsPanel:
+    """
+    Annual fundamentals of many companies, one row per (fiscalDateEnding, symbol) and one column per figure.
+    `as_of` returns the latest figures that were published on a date, so a screen over the whole universe
+        is a vectorized query on one frame, without look-ahead.
+    """
+
+    def __init__(self, df=None, release_lag=DEFAULT_RELEASE_LAG):
+        """
+        Args:
+            df (pd.DataFrame): panel indexed by (fiscalDateEnding, symbol)
+            release_lag (str): time between the end of a fiscal year and the publication of its figures
+        """
+        if df is None:
+            df = pd.DataFrame(index=pd.MultiIndex.from_arrays([pd.DatetimeIndex([]), []], names=_INDEX))
+        self.df = df.sort_index()
+        self.release_lag = pd.Timedelta(release_lag)
+
+    @staticmethod
+    def from_statements(frames, release_lag=DEFAULT_RELEASE_LAG):
+        """
+        Join standardized statements into a panel. A figure reported by several statements
+            (e.g. netIncome in the income statement and the cash flow) is kept once, and a statement filed
+            more than once for the same fiscal year (restated or amended) keeps its last filing.
+
+        Args:
+            frames (dict): {statement: [frames returned by alpha_vantage_api_financial_statements]}
+
+        Returns:
+            panel (FundamentalsPanel)
+        """
+        # one frame per statement over every symbol, then one join over the statements
+        statements = []
+        for parts in frames.values():
+            parts = [df.drop(columns=[c for c in _DROPPED if c in df.columns]) for df in parts]
+            if parts:
+                df = pd.concat(parts, ignore_index=True)
+                df['symbol'] = df['symbol'].astype(str)
+                df = df.set_index(_INDEX)
+                statements.append(df[~df.index.duplicated(keep='last')])
+        if not statements:
+            return FundamentalsPanel(release_lag=release_lag)
+        panel = pd.concat(statements, axis=1, join='outer')
+        panel = panel.loc[:, ~panel.columns.duplicated(keep='first')]
+        return FundamentalsPanel(panel, release_lag=release_lag)
+
+    def update(self, other):
+        """
+        Add the rows of another panel. Rows of the other panel replace the same (fiscalDateEnding, symbol).
+
+        Args:
+            other (FundamentalsPanel): newer figures
+
+        Returns:
+            self
+        """
+        df = pd.concat([self.df, other.df])
+        self.df = df[~df.index.duplicated(keep='last')].sort_index()
+        return self
+
+    def as_of(self, date, columns=None):
+        """
+        Latest published figures of every symbol on a date.
+
+        Args:
+            date (Union[str, pd.Timestamp]): date of the query
+            columns (list): figures to return. Defaults to every figure.
+
+        Returns:
+            df (pd.DataFrame): indexed by symbol, with the fiscalDateEnding of the figures
+        """
+        latest_fiscal_date = pd.Timestamp(date) - self.release_lag
+        df = self.df.loc[self.df.index.get_level_values('fiscalDateEnding') <= latest_fiscal_date]
+        if columns is not None:
+            df = df[columns]
+        # the index is sorted by date, so the last row of each symbol is the latest one
+        df = df.reset_index()
+        return df.drop_duplicates(subset='symbol', keep='last').set_index('symbol').sort_index()
+
+    def history(self, column):
+        """
+        One figure for every fiscal year and symbol, e.g. for growth rates over the universe.
+
+        Returns:
+            df (pd.DataFrame): fiscalDateEnding x symbol
+        """
+        return self.df[column].unstack('symbol')
+
+    def save(self, path=_PANEL_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.df.to_parquet(str(path))
+        logger.info("Saved fundamentals of {} symbols to {}".format(self.df.index.get_level_values('symbol').nunique(),
+                                                                   path))
+
+    @staticmethod
+    def load(path=_PANEL_PATH, release_lag=DEFAULT_RELEASE_LAG):
+        return FundamentalsPanel(pd.read_parquet(str(path)), release_lag=release_lag)
+
+
+def load_fundamentals(symbols, statements=STATEMENTS, max_workers=4, retries=3, backoff=1.0, panel=None):
+    """
+    Fetch the statements of many symbols from Alpha Vantage under its rate limit, and join them into a panel.
+    Symbols or statements that fail are logged and left out.
+
+    Args:
+        symbols (list): tickers
+        statements (list): statement types, see STATEMENTS
+        max_workers (int): number of threads. Requests per minute are capped by concurrency.SOURCE_LIMITS.
+        retries (int): number of retries of each request
+        backoff (float): base waiting time between retries in seconds
+        panel (Union[FundamentalsPanel, None]): existing panel to update, e.g. FundamentalsPanel.load()
+
+    Returns:
+        panel (FundamentalsPanel)
+        errors (dict): {'<symbol>:<statement>': exception}
+    """
+    tasks = [('{}:{}'.format(symbol, statement), 'alpha_vantage_financial_statements',
+              alpha_vantage_api_financial_statements, dict(call_type=statement, symbol=symbol))
+             for symbol in symbols for statement in statements]
+
+    with output_performance(logger, 'fetching {} statements'.format(len(tasks))):
+        results, errors = run_tasks(tasks, max_workers=max_workers, retries=retries, backoff=backoff)
+
+    frames = {statement: [] for statement in statements}
+    for name, _, _, kwargs in tasks:
+        if name in results:
+            frames[kwargs['call_type']].append(results[name])
+
+    new = FundamentalsPanel.from_statements(frames)
+    if panel is None:
+        return new, errors
+    return panel.update(new), errors
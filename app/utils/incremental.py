@@ -0,0 +1,107 @@
+from datetime import date, timedelta
+import pandas as pd
+from .fetch_data import fred_fred, investing_api, yf_api, alpha_vantage_api
+from .store import TimeSeriesStore
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# first date requested when nothing is stored yet, for the apis that need an explicit range
+DEFAULT_START = '1970-01-01'
+
+# alpha vantage 'compact' output returns the latest 100 data points.
+# a gap shorter than this many calendar days is always covered by it.
+_COMPACT_DAYS = {'daily': 100, 'weekly': 7 * 100, 'monthly': 30 * 100}
+
+_default_store = None
+
+
+def get_store():
+    """
+    Return the process-wide time-series store, creating it on first use.
+
+    Returns:
+        store (TimeSeriesStore): shared store
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = TimeSeriesStore()
+    return _default_store
+
+
+def fetch_tail(source, call_type, symbol, last_date=None, interval='daily', currency='USD', today=None):
+    """
+    Fetch only the bars after `last_date`.
+    The last stored bar is requested again, since it might have been incomplete when it was stored.
+    Responses are never served from the cache, because the tail is what changes between refreshes.
+
+    Args:
+        source (str): source of data. 'fred', 'investing', 'yf', 'alpha_vantage'
+        call_type (str): type of product
+        symbol (str): ticker name or index symbol
+        last_date (Union[pd.Timestamp, None]): latest stored date. If None, fetches the full history.
+        interval (str): daily, weekly or monthly
+        currency (str): currency of the target
+        today (Union[date, None]): reference date. Defaults to today.
+
+    Returns:
+        df (pd.DataFrame): standardized dataframe of the new bars
+    """
+    today = today or date.today()
+    # the fetchers filter with strict inequalities, so widen the range by one day on each side
+    to_date = (today + timedelta(days=1)).strftime('%Y-%m-%d')
+    if last_date is None:
+        from_date = None
+    else:
+        from_date = (pd.Timestamp(last_date) - timedelta(days=1)).strftime('%Y-%m-%d')
+
+    if source == 'fred':
+        return fred_fred(symbol, observation_start=from_date or DEFAULT_START, observation_end=to_date,
+                         call_type=call_type, use_cache=False)
+
+    elif source == 'investing':
+        return investing_api(call_type, symbol, from_date or DEFAULT_START, to_date, interval=interval,
+                             use_cache=False)
+
+    elif source == 'yf':
+        return yf_api(call_type, symbol, from_date=from_date, to_date=to_date if from_date else None,
+                      interval=interval, currency=currency, use_cache=False)
+
+    elif source == 'alpha_vantage':
+        outputsize = 'full'
+        if (last_date is not None) and ((pd.Timestamp(today) - pd.Timestamp(last_date)).days < _COMPACT_DAYS[interval]):
+            outputsize = 'compact'
+        return alpha_vantage_api(call_type, symbol, from_date=from_date, to_date=to_date if from_date else None,
+                                 interval=interval, currency=currency, outputsize=outputsize, use_cache=False)
+
+    else:
+        assert False, "Source not supported for incremental fetch."
+
+
+def update_history(source, call_type, symbol, interval='daily', currency='USD', store=None, today=None):
+    """
+    Bring the stored history of a series up to date.
+    Looks up the last stored date for (source, symbol, interval), requests only the range after it,
+        and merges the result into the store, de-duplicated on `p_key`.
+
+    Args:
+        source (str): source of data. 'fred', 'investing', 'yf', 'alpha_vantage'
+        call_type (str): type of product
+        symbol (str): ticker name or index symbol
+        interval (str): daily, weekly or monthly
+        currency (str): currency of the target
+        store (Union[TimeSeriesStore, None]): store to update. Defaults to the shared store.
+        today (Union[date, None]): reference date. Defaults to today.
+
+    Returns:
+        df (pd.DataFrame): standardized dataframe of the fetched bars
+    """
+    store = store or get_store()
+
+    last_date = store.last_date(source, symbol, interval)
+    logger.info("Updating {} {} {} from {}.".format(source, symbol, interval, last_date))
+
+    df = fetch_tail(source, call_type, symbol, last_date=last_date, interval=interval, currency=currency, today=today)
+    store.upsert(source, symbol, interval, df)
+
+    return df
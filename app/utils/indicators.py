@@ -0,0 +1,355 @@
+import os
+import math
+import inspect
+import pickle
+from collections import deque
+from pathlib import Path
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+basepath = Path(__file__).parent.parent
+
+_STATE_PATH = basepath / 'data_storage' / 'indicators.pkl'
+# bumped when the layout of the states changes, so older snapshots are not resumed
+_STATE_VERSION = 2
+
+
+def _isnan(value):
+    return value is None or value != value
+
+
+def _divide(a, b):
+    # IEEE division, like numpy: x / 0 is +-inf and 0 / 0 is NaN
+    if b == 0:
+        if a == 0 or _isnan(a):
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class RollingSum:
+    """
+    Sum and count of the finite values among the last `window` values, updated in O(1) per value.
+    The cumulative sum is kept as a high part and a low part that accumulates the rounding error of every addition
+        (TwoSum), and the window sum is its difference with the cumulative sum `window` values before.
+        These are the additions of features.rolling_mean, in the same order, so both give the same bits.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.high = 0.0
+        self.low = 0.0
+        self.count = 0
+        self.history = deque([(0.0, 0.0, 0)], maxlen=window + 1)
+
+    def update(self, value):
+        value = float(value) if value is not None else math.nan
+        valid = math.isfinite(value)
+        if not valid:
+            value = 0.0
+
+        high = self.high + value
+        added = high - self.high
+        self.low += (self.high - (high - added)) + (value - added)
+        self.high = high
+        self.count += valid
+        self.history.append((self.high, self.low, self.count))
+
+    @property
+    def full(self):
+        return len(self.history) == self.window + 1
+
+    @property
+    def sum(self):
+        high, low, count = self.history[0]
+        return (self.high - high) + (self.low - low), self.count - count
+
+
+class RollingMean:
+    """
+    Mean of the last `window` values, updated in O(1) per value.
+    Gives exactly the values of the batch computation (features.rolling_mean), over arbitrarily long histories.
+    NaN until `window` values are seen, and while a NaN (or an infinite value) is in the window.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.sums = RollingSum(window)
+
+    def update(self, value):
+        self.sums.update(value)
+        return self.value
+
+    @property
+    def value(self):
+        total, count = self.sums.sum
+        if not self.sums.full or count < self.window:
+            return math.nan
+        return total / self.window
+
+
+class RollingStd:
+    """
+    Sample standard deviation of the last `window` values, updated in O(1) per value.
+    Gives exactly the values of the batch computation (features.rolling_std).
+    NaN until `window` values are seen, and while a NaN (or an infinite value) is in the window.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.sums = RollingSum(window)
+        self.squares = RollingSum(window)
+
+    def update(self, value):
+        value = float(value) if value is not None else math.nan
+        self.sums.update(value)
+        self.squares.update(value * value)
+        return self.value
+
+    @property
+    def value(self):
+        total, count = self.sums.sum
+        if not self.sums.full or count < self.window:
+            return math.nan
+        squares, _ = self.squares.sum
+        variance = (squares - total * total / self.window) / (self.window - 1)
+        return math.sqrt(max(variance, 0.0))
+
+
+class EMA:
+    """
+    Exponential moving average, same as pandas' ewm(span=span, adjust=False, ignore_na=True).mean().
+    """
+
+    def __init__(self, span):
+        self.alpha = 2 / (span + 1)
+        self.value = math.nan
+
+    def update(self, value):
+        if not _isnan(value):
+            if _isnan(self.value):
+                self.value = value
+            else:
+                self.value = (1 - self.alpha) * self.value + self.alpha * value
+        return self.value
+
+
+class RollingExtreme:
+    """
+    Maximum (or minimum) of the last `window` values, with a monotonic deque. Amortized O(1) per value.
+    NaN until `window` values are seen, and while a NaN is in the window, like pandas' rolling(window).max().
+    """
+
+    def __init__(self, window, mode='max'):
+        assert mode in ['max', 'min']
+        self.window = window
+        self.mode = mode
+        self.candidates = deque()
+        self.n = 0
+        self.last_nan = -math.inf
+
+    def update(self, value):
+        if _isnan(value):
+            self.last_nan = self.n
+        else:
+            if self.mode == 'max':
+                while self.candidates and self.candidates[-1][1] <= value:
+                    self.candidates.pop()
+            else:
+                while self.candidates and self.candidates[-1][1] >= value:
+                    self.candidates.pop()
+            self.candidates.append((self.n, value))
+        self.n += 1
+
+        while self.candidates and self.candidates[0][0] <= self.n - 1 - self.window:
+            self.candidates.popleft()
+
+        return self.value
+
+    @property
+    def value(self):
+        if self.n < self.window or self.last_nan >= self.n - self.window or not self.candidates:
+            return math.nan
+        return self.candidates[0][1]
+
+
+class PctChange:
+    """
+    Relative change over `periods` values, like features.pct_change and pandas' pct_change(periods, fill_method=None):
+        a change from 0 is infinite.
+    """
+
+    def __init__(self, periods=1):
+        self.periods = periods
+        self.values = deque(maxlen=periods + 1)
+        self.value = math.nan
+
+    def update(self, value):
+        self.values.append(value)
+        self.value = math.nan
+        if len(self.values) == self.periods + 1:
+            old = self.values[0]
+            if not (_isnan(old) or _isnan(value)):
+                self.value = _divide(value, old) - 1
+        return self.value
+
+
+class IndicatorState:
+    """
+    Running indicators of one symbol, updated with one close price per bar.
+    The names of the outputs follow features.compute_features.
+    """
+
+    def __init__(self, ma_windows=(20, 50, 200), return_periods=(1, 5, 20), vol_window=20, ema_spans=(12, 26),
+                 extreme_windows=(20, 252)):
+        """
+        Args:
+            ma_windows (tuple): windows of the moving averages and DMA distances
+            return_periods (tuple): periods of the returns
+            vol_window (int): window of the volatility of the one-bar returns
+            ema_spans (tuple): spans of the exponential moving averages
+            extreme_windows (tuple): windows of the rolling max and min of the close
+        """
+        self.last_date = None
+        self.moving_averages = {w: RollingMean(w) for w in ma_windows}
+        self.returns = {p: PctChange(p) for p in set(return_periods) | {1}}
+        self.return_periods = return_periods
+        self.volatility = RollingStd(vol_window)
+        self.emas = {s: EMA(s) for s in ema_spans}
+        self.maxima = {w: RollingExtreme(w, 'max') for w in extreme_windows}
+        self.minima = {w: RollingExtreme(w, 'min') for w in extreme_windows}
+
+    def update(self, close, date=None):
+        """
+        Add one bar.
+
+        Args:
+            close (float): close price of the bar
+            date: date of the bar. Bars at or before the last date are ignored, so replaying a bar is harmless.
+                A bar without a date is always added, and keeps the last date.
+
+        Returns:
+            values (dict): {indicator name: value after this bar}, or None if the bar was ignored
+        """
+        if (date is not None) and (self.last_date is not None) and (date <= self.last_date):
+            return None
+        if date is not None:
+            self.last_date = date
+
+        values = dict()
+        for period, change in self.returns.items():
+            value = change.update(close)
+            if period in self.return_periods:
+                values['return_{}'.format(period)] = value
+
+        for window, moving_average in self.moving_averages.items():
+            value = moving_average.update(close)
+            values['ma_{}'.format(window)] = value
+            values['dma_{}'.format(window)] = _divide(close, value) - 1
+
+        values['volatility_{}'.format(self.volatility.window)] = self.volatility.update(self.returns[1].value)
+
+        for span, ema in self.emas.items():
+            values['ema_{}'.format(span)] = ema.update(close)
+        for window in self.maxima:
+            values['max_{}'.format(window)] = self.maxima[window].update(close)
+            values['min_{}'.format(window)] = self.minima[window].update(close)
+
+        return values
+
+
+def _full_settings(settings):
+    """
+    Every argument of IndicatorState, defaults included, so that equal configurations compare equal.
+    """
+    arguments = inspect.signature(IndicatorState).bind(**settings)
+    arguments.apply_defaults()
+    return {k: tuple(v) if isinstance(v, list) else v for k, v in arguments.arguments.items()}
+
+
+class IndicatorBook:
+    """
+    Indicator states of many symbols, with snapshot and restore to disk, so a live process can resume
+        from the last bar instead of replaying the history.
+    """
+
+    def __init__(self, **settings):
+        """
+        Args:
+            **settings: arguments of IndicatorState, shared by every symbol
+        """
+        self.settings = settings
+        self.states = dict()
+        self.version = _STATE_VERSION
+
+    def update(self, symbol, close, date=None):
+        """
+        Add one bar of a symbol.
+
+        Args:
+            symbol (str): symbol of the bar
+            close (float): close price
+            date: date of the bar
+
+        Returns:
+            values (dict): {indicator name: value}, or None if the bar was already seen
+        """
+        if symbol not in self.states:
+            self.states[symbol] = IndicatorState(**self.settings)
+        return self.states[symbol].update(close, date=date)
+
+    def warm_up(self, df, date_column='Date', symbol_column='symbol', price_column='Close'):
+        """
+        Feed the history of a long frame, bar by bar, to bring the states up to date.
+
+        Args:
+            df (pd.DataFrame): long frame with date, symbol and close columns
+
+        Returns:
+            None
+        """
+        df = df.sort_values(date_column)
+        for symbol, date, close in zip(df[symbol_column], df[date_column], df[price_column]):
+            self.update(symbol, float(close), date=date)
+
+    def snapshot(self, path=_STATE_PATH):
+        """
+        Save every state to disk.
+
+        Args:
+            path (Union[str, Path]): file to write
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(str(tmp_path), 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(str(tmp_path), str(path))
+        logger.info("Saved indicator state of {} symbols to {}".format(len(self.states), path))
+
+    @staticmethod
+    def restore(path=_STATE_PATH, **settings):
+        """
+        Load the states saved by `snapshot`, or start an empty book if there is no snapshot
+            or if it was saved by an older version.
+
+        Args:
+            path (Union[str, Path]): file to read
+            **settings: arguments of IndicatorState. A snapshot must have been saved with the same settings.
+
+        Returns:
+            book (IndicatorBook)
+        """
+        path = Path(path)
+        if not path.exists():
+            return IndicatorBook(**settings)
+        with open(str(path), 'rb') as f:
+            book = pickle.load(f)
+
+        if getattr(book, 'version', None) != _STATE_VERSION:
+            logger.warning("Indicator state at {} was saved by an older version, starting over.".format(path))
+            return IndicatorBook(**settings)
+        assert _full_settings(settings) == _full_settings(book.settings), \
+            "Indicator state at {} was saved with other settings: {}".format(path, book.settings)
+        return book
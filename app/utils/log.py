@@ -1,9 +1,13 @@
 from typing import NoReturn
 import os
+import atexit
+import queue
+import threading
 from contextlib import contextmanager
 import datetime
 import logging
-from logging import (getLogger, FileHandler, StreamHandler, Formatter, INFO, DEBUG)
+from logging import (getLogger, FileHandler, StreamHandler, Formatter, INFO, DEBUG, WARNING, ERROR)
+from logging.handlers import QueueHandler, QueueListener
 import pathlib
 import platform
 import time
@@ -16,18 +20,64 @@ _FORMATTER = Formatter('%(asctime)s [%(name)s] [%(levelname)s] %(message)s')
 
 _LOG_DIR = pathlib.Path(os.path.join('log'))
 
-if not _LOG_DIR.exists():
-    _LOG_DIR.mkdir()
+_LEVELS = {'DEBUG': DEBUG, 'INFO': INFO, 'WARNING': WARNING, 'ERROR': ERROR}
 
+# level of every logger of the app, e.g. PLATFORM_LOG_LEVEL=INFO
+_LEVEL = os.environ.get('PLATFORM_LOG_LEVEL', 'DEBUG')
 
-def get_logger(name):
+# file and console handlers, shared by every logger and created once
+_HANDLERS = []
+# loggers set up by get_logger
+_LOGGERS = dict()
+# set by enable_queue_logging
+_QUEUE_HANDLER = None
+_LISTENER = None
+
+_LOCK = threading.RLock()
+
+
+def _to_level(level):
+    level = level.upper()
+    if level not in _LEVELS:
+        msg = 'log level must be one of {}, given: {}'
+        raise ValueError(msg.format(list(_LEVELS), level))
+    return _LEVELS[level]
+
+
+def _output_handlers():
+    """
+    The file and console handlers. The log directory and file are created on first use.
+    """
+    if not _HANDLERS:
+        _LOG_DIR.mkdir(parents=True, exist_ok=True)
+        log_file = _LOG_DIR / _FILE_FMT.format(_TIME_FMT)
+
+        # for file output
+        fout = FileHandler(filename=str(log_file), mode='a')
+        fout.setFormatter(_FORMATTER)
+
+        # for stdout
+        stdout = StreamHandler()
+        stdout.setFormatter(_FORMATTER)
+
+        _HANDLERS.extend([fout, stdout])
+    return _HANDLERS
+
+
+def _active_handlers():
+    return [_QUEUE_HANDLER] if _QUEUE_HANDLER is not None else _output_handlers()
+
+
+def get_logger(name, level=None):
     """
     Log to file using logging.FileHandler
     Log to console also.
     Also set level or severity to the events tracked.
+    Calling it again for the same name returns the same logger without adding handlers.
 
     Args:
         name (str): Name of the logger.
+        level (str): DEBUG, INFO, WARNING or ERROR. Defaults to the PLATFORM_LOG_LEVEL env variable, or DEBUG.
 
     Raises:
         ValueError: If level of severity is not supported
@@ -36,30 +86,87 @@ def get_logger(name):
         logger (logging.Logger): Logger
 
     """
-    log_file = _LOG_DIR / _FILE_FMT.format(_TIME_FMT)
+    with _LOCK:
+        logger = getLogger(name)
+
+        if name not in _LOGGERS:
+            for handler in _active_handlers():
+                logger.addHandler(handler)
+            _LOGGERS[name] = logger
+            if level is None:
+                logger.setLevel(_to_level(_LEVEL))
+
+        if level is not None:
+            logger.setLevel(_to_level(level))
+    return logger
 
-    logger = getLogger(name)
 
-    # for file output
-    fout = FileHandler(filename=str(log_file), mode='a')
-    fout.setFormatter(_FORMATTER)
-    logger.addHandler(fout)
+def set_level(level):
+    """
+    Change the level of every logger of the app, and of the loggers created afterwards.
 
-    # for stdout
-    stdout = StreamHandler()
-    stdout.setFormatter(_FORMATTER)
-    logger.addHandler(stdout)
+    Args:
+        level (str): DEBUG, INFO, WARNING or ERROR
 
-    # level = CONFIG['log']['level'].upper()
-    level = 'DEBUG'
-    if level == 'INFO':
-        logger.setLevel(INFO)
-    elif level == 'DEBUG':
-        logger.setLevel(DEBUG)
-    else:
-        msg = 'log level must be either INFO or DEBUG, given: {}'
-        raise ValueError(msg.format(level))
-    return logger
+    Returns:
+        None
+    """
+    global _LEVEL
+    value = _to_level(level)
+    with _LOCK:
+        _LEVEL = level
+        for logger in _LOGGERS.values():
+            logger.setLevel(value)
+
+
+def _swap_handlers(old, new):
+    for logger in _LOGGERS.values():
+        for handler in old:
+            logger.removeHandler(handler)
+        for handler in new:
+            logger.addHandler(handler)
+
+
+def enable_queue_logging():
+    """
+    Hand log records to a background thread that writes them to the file and console,
+        so logging calls on hot paths (e.g. per symbol fetches) never wait on disk or console I/O.
+    Applies to the loggers already created and to the ones created afterwards.
+
+    Returns:
+        None
+    """
+    global _QUEUE_HANDLER, _LISTENER
+    with _LOCK:
+        if _QUEUE_HANDLER is not None:
+            return
+        output_handlers = _output_handlers()
+        log_queue = queue.SimpleQueue()
+        _LISTENER = QueueListener(log_queue, *output_handlers, respect_handler_level=True)
+        _LISTENER.start()
+        _QUEUE_HANDLER = QueueHandler(log_queue)
+        _swap_handlers(output_handlers, [_QUEUE_HANDLER])
+    atexit.register(disable_queue_logging)
+
+
+def disable_queue_logging():
+    """
+    Write the queued records and go back to logging directly to the file and console.
+
+    Returns:
+        None
+    """
+    global _QUEUE_HANDLER, _LISTENER
+    with _LOCK:
+        if _QUEUE_HANDLER is None:
+            return
+        _swap_handlers([_QUEUE_HANDLER], _output_handlers())
+        _LISTENER.stop()
+        _QUEUE_HANDLER, _LISTENER = None, None
+
+
+if os.environ.get('PLATFORM_LOG_QUEUE', '0') == '1':
+    enable_queue_logging()
 
 
 def print_info() -> NoReturn:
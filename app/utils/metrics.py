@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import inspect
+import threading
+import functools
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from .log import get_logger, output_performance
+
+logger = get_logger(__name__)
+
+# upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+# set PLATFORM_METRICS=0 to turn recording off
+_ENABLED = os.environ.get('PLATFORM_METRICS', '1') != '0'
+
+
+class Histogram:
+    """
+    Counts of observations per bucket, with their sum, in the Prometheus layout.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {'buckets': {str(b): c for b, c in zip(self.buckets, self.cumulative())},
+                'sum': self.sum, 'count': self.count}
+
+    def cumulative(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+
+class MetricsRegistry:
+    """
+    In-process registry of counters and histograms, labelled e.g. by source and symbol.
+    Thread safe; recording a value is a dict lookup and an addition under a lock.
+    """
+
+    def __init__(self):
+        self.counters = dict()
+        self.histograms = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def inc(self, name, value=1, **labels):
+        """
+        Add to a counter.
+
+        Args:
+            name (str): name of the counter, e.g. 'cache_hits_total'
+            value (float): amount to add
+            **labels: labels of the series, e.g. source='fred'
+        """
+        if not _ENABLED:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Add an observation to a histogram.
+
+        Args:
+            name (str): name of the histogram, e.g. 'fetch_latency_seconds'
+            value (float): observed value
+            **labels: labels of the series
+        """
+        if not _ENABLED:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_dict(self):
+        """
+        Returns:
+            metrics (dict): {'counters': [...], 'histograms': [...]}, each entry with 'name', 'labels' and values
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [dict({'name': name, 'labels': dict(labels)}, **histogram.to_dict())
+                          for (name, labels), histogram in sorted(self.histograms.items())]
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self):
+        """
+        Returns:
+            text (str): metrics in the Prometheus text exposition format
+        """
+        def label_text(labels, extra=None):
+            labels = list(labels) + ([extra] if extra else [])
+            if not labels:
+                return ''
+            return '{' + ','.join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in labels) + '}'
+
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append('# TYPE {} counter'.format(name))
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append('{}{} {}'.format(name, label_text(labels), value))
+
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append('# TYPE {} histogram'.format(name))
+                for (n, labels), histogram in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.cumulative()):
+                        le = '+Inf' if bound == float('inf') else str(bound)
+                        lines.append('{}_bucket{} {}'.format(name, label_text(labels, ('le', le)), count))
+                    lines.append('{}_sum{} {}'.format(name, label_text(labels), histogram.sum))
+                    lines.append('{}_count{} {}'.format(name, label_text(labels), histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, fmt='json'):
+        """
+        Write the metrics to a file, e.g. for a node exporter textfile collector.
+
+        Args:
+            path (Union[str, Path]): file to write
+            fmt (str): 'json' or 'prometheus'
+        """
+        assert fmt in ['json', 'prometheus']
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(str(tmp_path), 'w') as f:
+            f.write(self.to_json() if fmt == 'json' else self.to_prometheus())
+        os.replace(str(tmp_path), str(path))
+
+    def serve(self, port=9100, host='127.0.0.1'):
+        """
+        Serve the metrics over http from a background thread: /metrics in Prometheus text, /metrics.json in json.
+
+        Args:
+            port (int): port to listen on
+            host (str): address to bind
+
+        Returns:
+            server (ThreadingHTTPServer): call server.shutdown() to stop
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = registry.to_prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = registry.to_json(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info("Serving metrics on http://{}:{}/metrics".format(host, port))
+        return server
+
+
+_registry = MetricsRegistry()
+
+# seconds each thread spent waiting for rate limits, so measure() can leave them out of the latency
+_throttled = threading.local()
+
+
+def get_registry():
+    return _registry
+
+
+@contextmanager
+def measure(name, source=None, symbol=None, registry=None):
+    """
+    Time a block, log it with output_performance and record it in the latency histogram.
+    Rate limit waits of the same thread (see record_throttle_wait) are left out of the latency.
+    Failures are counted in 'errors_total'.
+
+    Args:
+        name (str): name of the process, used for logging
+        source (str): source label
+        symbol (str): symbol label
+
+    Returns:
+        None
+    """
+    registry = registry or _registry
+    ts = time.perf_counter()
+    throttled = getattr(_throttled, 'seconds', 0.0)
+    try:
+        with output_performance(logger, name):
+            yield
+    except Exception:
+        registry.inc('errors_total', source=source, symbol=symbol)
+        raise
+    finally:
+        waited = getattr(_throttled, 'seconds', 0.0) - throttled
+        registry.observe('fetch_latency_seconds', max(time.perf_counter() - ts - waited, 0.0),
+                         source=source, symbol=symbol)
+
+
+def instrument(source):
+    """
+    Decorator that records the latency, rows returned and errors of a fetcher, labelled by source and symbol.
+    Put it under @cached, so cache hits are not counted as fetches.
+
+    Args:
+        source (str): source of data
+
+    Returns:
+        decorator
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            symbol = arguments.get('symbol', arguments.get('ticker'))
+
+            with measure('{} {}'.format(func.__qualname__, symbol), source=source, symbol=symbol):
+                result = func(*args, **kwargs)
+
+            if hasattr(result, 'shape'):
+                _registry.inc('rows_total', result.shape[0], source=source, symbol=symbol)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def record_bytes(source, n_bytes, symbol=None):
+    """
+    Count bytes downloaded from a source.
+    """
+    _registry.inc('bytes_fetched_total', n_bytes, source=source, symbol=symbol)
+
+
+def record_throttle_wait(source, seconds):
+    """
+    Record time spent waiting for the rate limit of a source, in 'throttle_wait_seconds'.
+    """
+    _registry.observe('throttle_wait_seconds', seconds, source=source)
+    _throttled.seconds = getattr(_throttled, 'seconds', 0.0) + seconds
@@ -0,0 +1,149 @@
+import json
+import threading
+from datetime import datetime, timedelta
+import pandas as pd
+import pandas_market_calendars as mcal
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor
+from .incremental import update_history
+from .log import get_logger, output_progress
+
+logger = get_logger(__name__)
+
+# sources that are not tied to the opening hours of a market
+_ALWAYS_OPEN = ['fred']
+
+
+def load_watchlist(path):
+    """
+    Read a watchlist in the data_fetch_config format of master_df.
+
+    Args:
+        path (str): path of the json file
+
+    Returns:
+        watchlist (list): [{'source': ..., 'config': [...]}, ...]
+    """
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class MarketHours:
+    """
+    Opening hours of market calendars, with the schedule of each (calendar, day) computed once.
+    """
+
+    def __init__(self, after_close=timedelta(minutes=30)):
+        """
+        Args:
+            after_close (timedelta): keep refreshing this long after the close, to pick up the final bar
+        """
+        self.after_close = after_close
+        self._schedules = dict()
+        self._lock = threading.Lock()
+
+    def _schedule(self, calendar, day):
+        with self._lock:
+            if (calendar, day) not in self._schedules:
+                self._schedules[(calendar, day)] = mcal.get_calendar(calendar).schedule(start_date=day, end_date=day)
+            return self._schedules[(calendar, day)]
+
+    def is_open(self, calendar, now=None):
+        """
+        Whether the market is in session (or just closed) now.
+
+        Args:
+            calendar (str): name of the pandas_market_calendars calendar, e.g. 'NYSE'
+            now (Union[pd.Timestamp, None]): time to check, in UTC. Defaults to now.
+
+        Returns:
+            is_open (bool)
+        """
+        now = pd.Timestamp.now(tz='UTC') if now is None else pd.Timestamp(now)
+        schedule = self._schedule(calendar, now.strftime('%Y-%m-%d'))
+        if schedule.shape[0] == 0:
+            return False
+        market_open = schedule['market_open'].iloc[0]
+        market_close = schedule['market_close'].iloc[0]
+        return market_open <= now <= market_close + self.after_close
+
+
+class RefreshService:
+    """
+    Keeps the stored history of every symbol of a watchlist up to date.
+    Each symbol is its own job on a shared worker pool, so a slow api call only delays its own symbol.
+    A job never overlaps with its previous run, runs missed while the pool was busy are coalesced into one,
+        and symbols whose market is closed are skipped. Results go through the incremental fetch path.
+    """
+
+    def __init__(self, watchlist, seconds=60, max_workers=8, blocking=True, hours=None):
+        """
+        Args:
+            watchlist (list): entries in the data_fetch_config format
+            seconds (int): refresh interval of every symbol
+            max_workers (int): number of worker threads
+            blocking (bool): run the scheduler in the foreground. Otherwise it runs in a background thread.
+            hours (Union[MarketHours, None]): market hours to check before a refresh
+        """
+        self.watchlist = watchlist
+        self.seconds = seconds
+        self.hours = hours or MarketHours()
+
+        scheduler = BlockingScheduler if blocking else BackgroundScheduler
+        self.scheduler = scheduler(executors={'default': ThreadPoolExecutor(max_workers)},
+                                   job_defaults={'coalesce': True,
+                                                 'max_instances': 1,
+                                                 'misfire_grace_time': seconds})
+        self._add_jobs()
+
+    def _add_jobs(self):
+        entries = [(data_config['source'], config) for data_config in self.watchlist
+                   for config in data_config['config']]
+        now = datetime.now()
+
+        for i, (source, config) in enumerate(entries):
+            job_id = '{}:{}:{}'.format(source, config['symbol'], config.get('interval', 'daily'))
+            # spread the first runs over one interval, so the symbols do not all hit the apis at once
+            first_run = now + timedelta(seconds=self.seconds * i / max(len(entries), 1))
+            self.scheduler.add_job(self.refresh, 'interval', args=[source, config], id=job_id,
+                                   seconds=self.seconds, next_run_time=first_run, replace_existing=True)
+
+        logger.info("Scheduled {} symbols every {} seconds.".format(len(entries), self.seconds))
+
+    def refresh(self, source, config):
+        """
+        Fetch the new bars of one watchlist entry into the store, if its market is open.
+
+        Args:
+            source (str): source of data
+            config (dict): entry of the watchlist, with 'symbol', 'call_type', 'interval', 'currency'
+                           and optionally 'calendar' (defaults to 'NYSE')
+
+        Returns:
+            None
+        """
+        calendar = config.get('calendar', 'NYSE')
+        if (source not in _ALWAYS_OPEN) and not self.hours.is_open(calendar):
+            logger.debug("Skipped {} {}: {} is closed.".format(source, config['symbol'], calendar))
+            return
+
+        with output_progress(logger, 'refresh of {} {}'.format(source, config['symbol']), skip_on_error=True):
+            update_history(source, config['call_type'], config['symbol'],
+                           interval=config.get('interval', 'daily'),
+                           currency=config.get('currency', 'USD'))
+
+    def start(self):
+        """
+        Start the scheduler. Blocks if the service was created with blocking=True.
+        """
+        self.scheduler.start()
+
+    def shutdown(self, wait=True):
+        """
+        Stop the scheduler.
+
+        Args:
+            wait (bool): wait for the running jobs to finish
+        """
+        self.scheduler.shutdown(wait=wait)
@@ -0,0 +1,193 @@
+import os
+import threading
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from .fetch_data import derive_p_key
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+basepath = Path(__file__).parent.parent
+
+_STORE_DIR = basepath / 'data_storage' / 'history'
+
+
+class TimeSeriesStore:
+    """
+    Local columnar store for the standardized frames returned by the fetchers.
+    Each series is kept under <root>/<source>/<symbol>/<interval>/, split into one parquet file per year,
+        so that appending the latest bars only rewrites the partition of the current year.
+    Reads prune the yearly partitions by date, push the date filter down to the parquet row groups,
+        and load only the requested columns.
+    Rows are identified by `p_key`.
+    """
+
+    def __init__(self, root=_STORE_DIR):
+        """
+        Args:
+            root (Union[str, Path]): root directory of the store
+        """
+        self.root = Path(root)
+        self._lock = threading.RLock()
+
+    def _series_dir(self, source, symbol, interval):
+        return self.root / source / symbol / str(interval)
+
+    def _partitions(self, source, symbol, interval, start=None, end=None):
+        series_dir = self._series_dir(source, symbol, interval)
+        if not series_dir.exists():
+            return []
+
+        partitions = sorted(series_dir.glob('*.parquet'))
+        if start is not None:
+            partitions = [p for p in partitions if int(p.stem) >= pd.Timestamp(start).year]
+        if end is not None:
+            partitions = [p for p in partitions if int(p.stem) <= pd.Timestamp(end).year]
+        return partitions
+
+    def symbols(self, source, interval):
+        """
+        List the symbols stored for a source and interval.
+
+        Args:
+            source (str): source of data
+            interval (str): daily, weekly or monthly
+
+        Returns:
+            symbols (list): stored symbols
+        """
+        source_dir = self.root / source
+        if not source_dir.exists():
+            return []
+        return sorted(p.parent.name for p in source_dir.glob('*/{}'.format(interval)))
+
+    def last_date(self, source, symbol, interval):
+        """
+        Return the latest stored date of a series, reading only the date column of the latest partition.
+
+        Args:
+            source (str): source of data
+            symbol (str): symbol of the data
+            interval (str): daily, weekly or monthly
+
+        Returns:
+            last_date (Union[pd.Timestamp, None]): None if nothing is stored yet
+        """
+        partitions = self._partitions(source, symbol, interval)
+        if len(partitions) == 0:
+            return None
+        return pq.read_table(str(partitions[-1]), columns=['Date']).to_pandas()['Date'].max()
+
+    def version(self, source, symbol, interval):
+        """
+        Token that changes whenever a series is written, from the modification time of its latest partition.
+
+        Returns:
+            version (Union[tuple, None]): None if nothing is stored yet
+        """
+        partitions = self._partitions(source, symbol, interval)
+        if len(partitions) == 0:
+            return None
+        stat = partitions[-1].stat()
+        return partitions[-1].stem, stat.st_mtime_ns, stat.st_size
+
+    def read(self, source, symbol, interval, start=None, end=None, columns=None):
+        """
+        Read stored series.
+
+        Args:
+            source (str): source of data
+            symbol (Union[str, list]): symbol of the data, or a list of symbols of the same source
+            interval (str): daily, weekly or monthly
+            start (Union[str, None]): 'YYYY-MM-DD' format date. Inclusive.
+            end (Union[str, None]): 'YYYY-MM-DD' format date. Inclusive.
+            columns (Union[list, None]): columns to load. If None, loads every column.
+
+        Returns:
+            df (pd.DataFrame): stored rows, sorted by symbol and date
+        """
+        symbols = [symbol] if isinstance(symbol, str) else list(symbol)
+
+        files = []
+        for s in symbols:
+            files.extend(str(p) for p in self._partitions(source, s, interval, start=start, end=end))
+
+        if len(files) == 0:
+            return pd.DataFrame(columns=columns)
+
+        dataset = ds.dataset(files, format='parquet')
+
+        # the date filter is compared in the time zone of the stored dates
+        tz = getattr(dataset.schema.field('Date').type, 'tz', None)
+        condition = None
+        if start is not None:
+            condition = ds.field('Date') >= pa.scalar(_as_timestamp(start, tz))
+        if end is not None:
+            upper = ds.field('Date') < pa.scalar(_as_timestamp(end, tz) + pd.Timedelta(days=1))
+            condition = upper if condition is None else condition & upper
+
+        table = dataset.to_table(columns=columns, filter=condition)
+        df = table.to_pandas()
+
+        sort_by = [c for c in ['symbol', 'Date'] if c in df.columns]
+        if len(sort_by) > 0:
+            df = df.sort_values(sort_by)
+        return df.reset_index(drop=True)
+
+    def upsert(self, source, symbol, interval, df):
+        """
+        Merge rows into a stored series, de-duplicated on `p_key` (new rows win).
+        Only the yearly partitions touched by `df` are read, and a partition is rewritten only if it changed.
+
+        Args:
+            source (str): source of data
+            symbol (str): symbol of the data
+            interval (str): daily, weekly or monthly
+            df (pd.DataFrame): standardized dataframe. A frame standardized in compact mode gets its `p_key` first.
+
+        Returns:
+            n_rows (int): number of rows that were not stored before
+        """
+        if df.shape[0] == 0:
+            return 0
+        if 'p_key' not in df.columns:
+            df = derive_p_key(df.copy())
+
+        series_dir = self._series_dir(source, symbol, interval)
+        n_rows = 0
+
+        with self._lock:
+            series_dir.mkdir(parents=True, exist_ok=True)
+
+            for year, new in df.groupby(df['Date'].dt.year):
+                path = series_dir / '{}.parquet'.format(year)
+
+                if path.exists():
+                    old = pd.read_parquet(str(path))
+                    merged = pd.concat([old, new], ignore_index=True)
+                    merged = merged.drop_duplicates(subset='p_key', keep='last')
+                    merged = merged.sort_values('Date').reset_index(drop=True)
+                    if merged.equals(old):
+                        continue
+                    n_rows += merged.shape[0] - old.shape[0]
+                else:
+                    merged = new.drop_duplicates(subset='p_key', keep='last')
+                    merged = merged.sort_values('Date').reset_index(drop=True)
+                    n_rows += merged.shape[0]
+
+                tmp_path = series_dir / '{}.tmp'.format(year)
+                merged.to_parquet(str(tmp_path), index=False)
+                os.replace(str(tmp_path), str(path))
+
+        logger.info("Stored {} rows of {} {} {}.".format(n_rows, source, symbol, interval))
+        return n_rows
+
+
+def _as_timestamp(date, tz):
+    ts = pd.Timestamp(date)
+    if (tz is not None) and (ts.tzinfo is None):
+        ts = ts.tz_localize(tz)
+    return ts
@@ -1,17 +1,324 @@
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date
+from .visualization import plot_data
+from .alignment import align_frames
+from .concurrency import run_tasks
+from .incremental import get_store, update_history
+from .log import get_logger, output_performance
 
-def create_plots(plot_settings):
+logger = get_logger(__name__)
+
+
+def create_plots(plot_settings, plot_type='line'):
     """
     Create plot based on user input.
 
     Args:
-        plot_type:
         plot_settings(list): [[dataset, x_column, y_column], [dataset, x_column, y_column], ...]
+        plot_type (str): 'line', 'scatter' or 'bar'
 
     Returns:
         fig (plotly.graph_objs._figure.Figure): plot
     """
-    fig = _plot_data('line', plot_settings)
+    settings = [[plot_type, data, x, y, y, i > 0] for i, (data, x, y) in enumerate(plot_settings)]
+    return plot_data(settings)
+
+
+def config_key(config):
+    """
+    Stable hash of a dashboard config, to share its data between every viewer.
+    """
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+class DashboardCache:
+    """
+    Process-wide data and figure cache of the dashboard, shared by every session of the Streamlit server.
+
+    A config is {'interval', 'start_date', 'data_fetch_config' (the master_df format), optional 'calendar'}.
+    Its series live in the time-series store, and a background thread brings them up to date incrementally:
+        every series is fetched once per cycle however many configs use it, and a series that fails
+        (e.g. a delisted ticker) is skipped for a time that doubles with every failure.
+        Each refresh computes a data version per config from the store; when it changes, the aligned frame is
+        rebuilt once, and values and figures (kept as JSON) computed for the previous version are dropped.
+    A value is computed once per (config, name, version) even when many viewers ask for it at the same time:
+        the others wait for the first one and share its result.
+    Only the `max_configs` configs registered last are kept and refreshed.
+    """
+
+    def __init__(self, store=None, max_values=256, max_configs=16, retry_seconds=15 * 60, max_retry_seconds=24 * 3600):
+        """
+        Args:
+            store (Union[TimeSeriesStore, None]): store of the series. Defaults to the shared store.
+            max_values (int): number of computed values and figures kept
+            max_configs (int): number of configs kept, least recently registered first out
+            retry_seconds (float): time before a failed series is fetched again. Doubles with every failure.
+            max_retry_seconds (float): longest time between two fetches of a failing series
+        """
+        self.store = store or get_store()
+        self.max_values = max_values
+        self.max_configs = max_configs
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.configs = OrderedDict()
+        self.versions = dict()
+        self.values = OrderedDict()
+        self.failures = dict()
+        self._lock = threading.Lock()
+        self._key_locks = dict()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _entries(config):
+        for data_config in config['data_fetch_config']:
+            for entry in data_config['config']:
+                yield data_config['source'], entry
+
+    @staticmethod
+    def _series(source, entry):
+        return source, entry['symbol'], entry['interval']
+
+    def register(self, config):
+        """
+        Add a config to the cache and to the background refresh, or mark it as used again.
+        The first call fetches its missing history. Registering more than `max_configs` configs drops
+            the least recently registered one, with its values.
+
+        Args:
+            config (dict): dashboard config
+
+        Returns:
+            key (str): key of the config
+        """
+        key = config_key(config)
+        with self._key_lock(key):
+            with self._lock:
+                known = key in self.configs
+                if known:
+                    self.configs.move_to_end(key)
+            if not known:
+                with self._lock:
+                    self.configs[key] = config
+                    while len(self.configs) > self.max_configs:
+                        self._drop(next(iter(self.configs)))
+                self.refresh(key, missing_only=True)
+        return key
+
+    def _drop(self, key):
+        # with self._lock held
+        self.configs.pop(key, None)
+        self.versions.pop(key, None)
+        for cached_key in [k for k in self.values if k[0] == key]:
+            del self.values[cached_key]
+        for lock_key in [k for k in self._key_locks if k == key or (isinstance(k, tuple) and k[0] == key)]:
+            del self._key_locks[lock_key]
+        logger.info("Dropped the config {}.".format(key))
+
+    def _update(self, entries, max_workers=8):
+        """
+        Fetch the new bars of series into the store, once each. Series that failed recently are skipped.
+
+        Args:
+            entries (dict): {(source, symbol, interval): (source, config entry)}
+            max_workers (int): number of threads
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = {'{}:{}:{}'.format(*series): series for series in entries
+                   if self.failures.get(series, (0, now))[1] <= now}
+        tasks = []
+        for name, series in due.items():
+            source, entry = entries[series]
+            tasks.append((name, source, update_history,
+                          dict(source=source, call_type=entry.get('call_type', 'index'), symbol=entry['symbol'],
+                               interval=entry['interval'], currency=entry.get('currency', 'USD'), store=self.store)))
+        if len(tasks) == 0:
+            return
+
+        with output_performance(logger, 'refreshing {} series'.format(len(tasks))):
+            _, errors = run_tasks(tasks, max_workers=max_workers)
+
+        with self._lock:
+            for name, series in due.items():
+                if name in errors:
+                    n_failures = self.failures.get(series, (0, now))[0] + 1
+                    wait = min(self.retry_seconds * 2 ** (n_failures - 1), self.max_retry_seconds)
+                    self.failures[series] = (n_failures, time.monotonic() + wait)
+                else:
+                    self.failures.pop(series, None)
+        if len(errors) > 0:
+            logger.info("{} series failed and are skipped until their next retry.".format(len(errors)))
+
+    def _data_version(self, config):
+        versions = [(source, entry['symbol'], self.store.version(source, entry['symbol'], entry['interval']))
+                    for source, entry in self._entries(config)]
+        return hashlib.sha256(repr(versions).encode('utf-8')).hexdigest()[:16]
+
+    def refresh(self, key, missing_only=False, max_workers=8):
+        """
+        Fetch the new bars of every series of a config into the store, and bump its version if anything changed.
+
+        Args:
+            key (str): key of the config
+            missing_only (bool): only fetch the series that are not stored yet
+            max_workers (int): number of threads
+
+        Returns:
+            changed (bool): whether the data version changed
+        """
+        entries = {self._series(source, entry): (source, entry) for source, entry in self._entries(self.configs[key])
+                   if not (missing_only and self.store.last_date(source, entry['symbol'], entry['interval']))}
+        self._update(entries, max_workers=max_workers)
+        return self._bump(key)
+
+    def refresh_all(self, max_workers=8):
+        """
+        Fetch the new bars of the series of every config, once per series, and bump the versions of the configs
+            whose data changed.
+
+        Args:
+            max_workers (int): number of threads
+
+        Returns:
+            changed (list): keys of the configs whose data version changed
+        """
+        with self._lock:
+            configs = list(self.configs.items())
+        entries = dict()
+        for _, config in configs:
+            for source, entry in self._entries(config):
+                entries.setdefault(self._series(source, entry), (source, entry))
+        self._update(entries, max_workers=max_workers)
+        return [key for key, _ in configs if self._bump(key)]
+
+    def _bump(self, key):
+        """
+        Compute the data version of a config, and drop the values of the previous version if it changed.
+
+        Returns:
+            changed (bool): whether the data version changed
+        """
+        with self._lock:
+            config = self.configs.get(key)
+        if config is None:
+            return False
+        version = self._data_version(config)
+        with self._lock:
+            if key not in self.configs:
+                return False
+            changed = self.versions.get(key) != version
+            self.versions[key] = version
+            if changed:
+                for cached_key in [k for k in self.values if k[0] == key and k[2] != version]:
+                    del self.values[cached_key]
+                # the locks of the values of older versions go with them
+                for cached_key in [k for k in self._key_locks if isinstance(k, tuple) and k[0] == key
+                                   and k[2] != version]:
+                    del self._key_locks[cached_key]
+        return changed
+
+    def cached_value(self, key, name, builder):
+        """
+        Value computed once per (config, name, data version) and shared by every viewer.
+
+        Args:
+            key (str): key of the config
+            name (str): name of the value, including its parameters, e.g. 'corr_36'
+            builder (callable): computes the value, without arguments
+
+        Returns:
+            value
+        """
+        with self._lock:
+            cache_key = (key, name, self.versions.get(key))
+            if cache_key in self.values:
+                self.values.move_to_end(cache_key)
+                return self.values[cache_key]
+
+        with self._key_lock(cache_key):
+            with self._lock:
+                if cache_key in self.values:
+                    return self.values[cache_key]
+            value = builder()
+            with self._lock:
+                self.values[cache_key] = value
+                while len(self.values) > self.max_values:
+                    evicted, _ = self.values.popitem(last=False)
+                    self._key_locks.pop(evicted, None)
+        return value
+
+    def master(self, key):
+        """
+        Series of a config aligned on its calendar, read from the store.
+
+        Returns:
+            master (pd.DataFrame): wide frame with a 'Date' column and one column per alias
+        """
+        config = self.configs[key]
+
+        def build():
+            frames = dict()
+            for source, entry in self._entries(config):
+                df = self.store.read(source, entry['symbol'], entry['interval'], start=config['start_date'])
+                if df.shape[0] > 0:
+                    frames[entry['alias']] = df
+            settings = {entry['alias']: {k: entry[k] for k in ['columns', 'agg', 'release_lag'] if k in entry}
+                        for _, entry in self._entries(config)}
+            return align_frames(frames, config['start_date'], date.today().strftime('%Y-%m-%d'),
+                                interval=config['interval'], calendar=config.get('calendar', 'NYSE'),
+                                settings=settings)
+
+        return self.cached_value(key, 'master', build)
+
+    def figure_json(self, key, name, build_figure):
+        """
+        Figure of a config, rendered to JSON once per data version.
+
+        Args:
+            key (str): key of the config
+            name (str): name of the figure, including its parameters
+            build_figure (callable): returns a plotly figure, without arguments
+
+        Returns:
+            figure (str): plotly JSON, e.g. for plotly.io.from_json
+        """
+        return self.cached_value(key, 'figure:' + name, lambda: build_figure().to_json())
+
+    def start(self, interval_seconds=15 * 60):
+        """
+        Refresh every registered config in a background thread, and rebuild the aligned frames that changed,
+            so viewers find them ready.
+
+        Args:
+            interval_seconds (int): time between two refreshes
+        """
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    changed = self.refresh_all()
+                except Exception as e:
+                    logger.error("Refresh failed: {}: {}".format(e.__class__.__name__, e))
+                    continue
+                for key in changed:
+                    try:
+                        self.master(key)
+                    except Exception as e:
+                        logger.error("Rebuild of {} failed: {}: {}".format(key, e.__class__.__name__, e))
+
+        self._thread = threading.Thread(target=loop, name='dashboard-refresh', daemon=True)
+        self._thread.start()
 
-    return fig
\ No newline at end of file
+    def stop(self):
+        self._stop.set()
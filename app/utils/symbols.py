@@ -0,0 +1,153 @@
+import os
+import time
+import pickle
+import threading
+from pathlib import Path
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+basepath = Path(__file__).parent.parent
+
+_INDEX_PATH = basepath / 'data_storage' / 'symbols.pkl'
+
+# listings and series metadata are refreshed after this many seconds
+DEFAULT_MAX_AGE = 60 * 60 * 24 * 7
+
+# a symbol missing from a listing older than this triggers one early refresh of the listing
+_MISS_REFRESH_AGE = 60 * 60
+
+
+class SymbolIndex:
+    """
+    Persistent index of symbol metadata, e.g. the investing.com name of an etf or the frequency of a FRED series.
+    Entries live in namespaces such as ('etf', 'united states') and are looked up by symbol in a dict.
+    The index file is loaded on first use, and a namespace is reloaded when it is older than `max_age`.
+    """
+
+    def __init__(self, path=_INDEX_PATH, max_age=DEFAULT_MAX_AGE):
+        """
+        Args:
+            path (Union[str, Path]): file to persist the index
+            max_age (int): seconds after which a namespace or entry is refreshed
+        """
+        self.path = Path(path)
+        self.max_age = max_age
+
+        self._lock = threading.RLock()
+        self._index = None
+
+    def _load(self):
+        if self._index is None:
+            self._index = {'listings': dict(), 'entries': dict()}
+            if self.path.exists():
+                try:
+                    with open(str(self.path), 'rb') as f:
+                        self._index = pickle.load(f)
+                except (OSError, pickle.UnpicklingError, EOFError) as e:
+                    logger.info("Ignoring unreadable symbol index {}: {}".format(self.path, e))
+        return self._index
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(str(tmp_path), 'wb') as f:
+            pickle.dump(self._index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(str(tmp_path), str(self.path))
+
+    def listing(self, namespace, loader, max_age=None, force=False):
+        """
+        Return the whole listing of a namespace, downloading it only if it is missing or stale.
+
+        Args:
+            namespace (tuple): e.g. ('etf', 'united states')
+            loader (callable): function without arguments that returns {symbol: value} for the namespace
+            max_age (Union[int, None]): overrides the max age of the index
+            force (bool): reload regardless of the age
+
+        Returns:
+            listing (dict): {symbol: value}
+        """
+        max_age = self.max_age if max_age is None else max_age
+
+        with self._lock:
+            listings = self._load()['listings']
+            entry = listings.get(namespace)
+            if force or (entry is None) or (time.time() - entry['updated'] > max_age):
+                logger.info("Loading symbol listing {}.".format(namespace))
+                entry = {'updated': time.time(), 'values': loader()}
+                listings[namespace] = entry
+                self._save()
+            return entry['values']
+
+    def lookup(self, namespace, symbol, loader, max_age=None):
+        """
+        Look up one symbol in the listing of a namespace.
+
+        Args:
+            namespace (tuple): e.g. ('etf', 'united states')
+            symbol (str): symbol to look up
+            loader (callable): function without arguments that returns {symbol: value} for the namespace
+            max_age (Union[int, None]): overrides the max age of the index
+
+        Raises:
+            KeyError: If the symbol is not in the listing
+
+        Returns:
+            value of the symbol
+        """
+        with self._lock:
+            values = self.listing(namespace, loader, max_age=max_age)
+            if symbol in values:
+                return values[symbol]
+
+            # the symbol might be newer than the listing
+            if time.time() - self._index['listings'][namespace]['updated'] > _MISS_REFRESH_AGE:
+                values = self.listing(namespace, loader, force=True)
+                if symbol in values:
+                    return values[symbol]
+
+        raise KeyError("{} not found in {}".format(symbol, namespace))
+
+    def lookup_one(self, namespace, symbol, loader, max_age=None):
+        """
+        Look up metadata that is fetched one symbol at a time, memoizing the result.
+
+        Args:
+            namespace (str): e.g. 'fred'
+            symbol (str): symbol to look up
+            loader (callable): function that takes the symbol and returns its metadata
+            max_age (Union[int, None]): overrides the max age of the index
+
+        Returns:
+            metadata of the symbol
+        """
+        max_age = self.max_age if max_age is None else max_age
+
+        with self._lock:
+            entry = self._load()['entries'].get((namespace, symbol))
+        if (entry is not None) and (time.time() - entry['updated'] <= max_age):
+            return entry['value']
+
+        # loaded outside of the lock, so that lookups of different symbols do not wait for each other
+        entry = {'updated': time.time(), 'value': loader(symbol)}
+        with self._lock:
+            self._index['entries'][(namespace, symbol)] = entry
+            self._save()
+        return entry['value']
+
+
+_default_index = None
+
+
+def get_symbol_index():
+    """
+    Return the process-wide symbol index, creating it on first use.
+
+    Returns:
+        index (SymbolIndex): shared index
+    """
+    global _default_index
+    if _default_index is None:
+        _default_index = SymbolIndex()
+    return _default_index
@@ -0,0 +1,199 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+from .log import get_logger
+from .metrics import record_bytes
+
+logger = get_logger(__name__)
+
+# base urls of the REST apis. Point one to a local stub server with set_base_url, or with an env variable,
+# e.g. PLATFORM_ALPHA_VANTAGE_URL=http://127.0.0.1:8000
+BASE_URLS = {
+    'alpha_vantage': 'https://www.alphavantage.co',
+    'fmp': 'https://financialmodelingprep.com',
+    'finviz': 'https://finviz.com',
+}
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 60)
+
+# memory of the bodies kept for conditional requests, in total and per body
+MAX_VALIDATOR_BYTES = 64 * 2 ** 20
+MAX_BODY_BYTES = 8 * 2 ** 20
+
+
+def base_url(source):
+    """
+    Base url of an api, without a trailing slash.
+
+    Args:
+        source (str): 'alpha_vantage', 'fmp', ...
+
+    Returns:
+        url (str)
+    """
+    return os.environ.get('PLATFORM_{}_URL'.format(source.upper()), BASE_URLS[source]).rstrip('/')
+
+
+def set_base_url(source, url):
+    BASE_URLS[source] = url
+    os.environ.pop('PLATFORM_{}_URL'.format(source.upper()), None)
+
+
+class HttpTransport:
+    """
+    Shared http client of the REST fetchers.
+    One requests.Session per host keeps connections alive between calls, so only the first call to a host pays
+        for DNS, TCP and TLS. Responses are gzip compressed, every call has a timeout, and a response with an ETag or
+        Last-Modified header is revalidated with a conditional request: a 304 reuses the body kept in memory.
+        The kept bodies are bounded in bytes, least recently used first out, and larger bodies are not kept.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_size=16, max_validator_bytes=MAX_VALIDATOR_BYTES,
+                 max_body_bytes=MAX_BODY_BYTES):
+        """
+        Args:
+            timeout (tuple): (connect, read) timeouts in seconds
+            pool_size (int): connections kept alive per host. Match the concurrency of the busiest source.
+            max_validator_bytes (int): total size of the bodies kept for conditional requests
+            max_body_bytes (int): largest body kept for conditional requests
+        """
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_validator_bytes = max_validator_bytes
+        self.max_body_bytes = min(max_body_bytes, max_validator_bytes)
+        self._sessions = dict()
+        self._validators = OrderedDict()
+        self._validator_bytes = 0
+        self._lock = threading.Lock()
+
+    def _session(self, host):
+        with self._lock:
+            if host not in self._sessions:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({'Accept-Encoding': 'gzip, deflate', 'User-Agent': 'platform/1.0'})
+                self._sessions[host] = session
+            return self._sessions[host]
+
+    def _forget(self, url):
+        # with self._lock held
+        validator = self._validators.pop(url, None)
+        if validator is not None:
+            self._validator_bytes -= len(validator[2])
+
+    def _remember(self, url, response):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        with self._lock:
+            self._forget(url)
+            if not (etag or last_modified) or len(response.content) > self.max_body_bytes:
+                return
+            self._validators[url] = (etag, last_modified, response.content)
+            self._validator_bytes += len(response.content)
+            while self._validator_bytes > self.max_validator_bytes:
+                self._forget(next(iter(self._validators)))
+
+    @staticmethod
+    def _wire_size(response):
+        """
+        Size of the body as received, before decompression.
+        """
+        try:
+            return int(response.raw.tell())
+        except (AttributeError, TypeError, ValueError):
+            pass
+        length = response.headers.get('Content-Length', '')
+        return int(length) if length.isdigit() else len(response.content)
+
+    def get_bytes(self, url, source=None, symbol=None, headers=None):
+        """
+        GET a url and return the body.
+
+        Args:
+            url (str): url with the query string
+            source (str): source of data, used to label the bytes fetched
+            symbol (str): symbol, used to label the bytes fetched
+            headers (dict): extra request headers
+
+        Raises:
+            requests.HTTPError: if the response is an error
+
+        Returns:
+            content (bytes): body of the response, decompressed
+        """
+        headers = dict(headers or dict())
+        with self._lock:
+            validator = self._validators.get(url)
+        if validator is not None:
+            etag, last_modified, _ = validator
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        response = self._session(urlparse(url).netloc).get(url, headers=headers, timeout=self.timeout)
+        record_bytes(source or urlparse(url).netloc, self._wire_size(response), symbol=symbol)
+
+        if response.status_code == 304 and validator is not None:
+            with self._lock:
+                if url in self._validators:
+                    self._validators.move_to_end(url)
+            return validator[2]
+
+        response.raise_for_status()
+        self._remember(url, response)
+        return response.content
+
+    def get_json(self, url, source=None, symbol=None, headers=None):
+        """
+        GET a url and decode the json body directly from the bytes.
+
+        Returns:
+            data (Union[dict, list]): decoded json
+        """
+        return json.loads(self.get_bytes(url, source=source, symbol=symbol, headers=headers))
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """
+    Return the process-wide transport, creating it on first use.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = HttpTransport()
+        return _transport
+
+
+def set_transport(transport):
+    """
+    Replace the process-wide transport, e.g. with a stub that serves recorded responses.
+    Any object with the get_bytes and get_json methods of HttpTransport works.
+
+    Args:
+        transport (HttpTransport): transport to use
+
+    Returns:
+        previous (HttpTransport): the transport replaced
+    """
+    global _transport
+    with _transport_lock:
+        previous, _transport = _transport, transport
+    return previous
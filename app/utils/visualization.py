@@ -1,17 +1,142 @@
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from .log import get_logger
 
 logger = get_logger(__name__)
 
+# a chart is a few thousand pixels wide, so more points than this are not visible
+MAX_POINTS = 2000
+# above this many points, lines and markers are drawn with WebGL
+WEBGL_THRESHOLD = 1000
 
-def plot_data(plot_settings, show_y_axis=False):
+
+def _as_numbers(x):
+    """
+    x values as floats for the areas of LTTB. Datetimes, naive or tz-aware (e.g. the Date of yf), become nanoseconds
+        since the epoch in UTC; values that are neither numbers nor dates (e.g. labels) become their positions.
+    """
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return pd.DatetimeIndex(x).asi8.astype('float64')
+    x = np.asarray(x)
+    if x.dtype == object:
+        # numpy keeps tz-aware timestamps as objects
+        try:
+            return pd.DatetimeIndex(x).asi8.astype('float64')
+        except (TypeError, ValueError):
+            return np.arange(len(x), dtype='float64')
+    return x.astype('float64')
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling: keeps the first and last points, and in each of n_out - 2 buckets
+        the point forming the largest triangle with the point kept before it and the mean of the next bucket.
+        Peaks and troughs survive, so the line looks the same at screen resolution.
+
+    Args:
+        x (Union[np.ndarray, pd.Series]): sorted x values, numbers or datetimes, naive or tz-aware
+        y (np.ndarray): y values, without NaN
+        n_out (int): number of points to keep
+
+    Returns:
+        index (np.ndarray): positions of the kept points
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = _as_numbers(x)
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+
+    # mean of every bucket, for the third point of the triangles
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    mean_x = np.append(sums_x / sizes, x[-1])
+    mean_y = np.append(sums_y / sizes, y[-1])
+
+    index = np.empty(n_out, dtype=int)
+    index[0], index[-1] = 0, n - 1
+    previous = 0
+    for b in range(n_out - 2):
+        start, end = edges[b], edges[b + 1]
+        area = np.abs((x[previous] - mean_x[b + 1]) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (mean_y[b + 1] - y[previous]))
+        previous = start + int(np.argmax(area))
+        index[b + 1] = previous
+    return index
+
+
+def minmax(y, n_out):
+    """
+    Min/max downsampling: keeps the lowest and the highest point of each of n_out / 2 buckets, in their order.
+    Faster than LTTB, and keeps every extreme, e.g. for bars.
+
+    Args:
+        y (np.ndarray): y values, without NaN
+        n_out (int): number of points to keep, about
+
+    Returns:
+        index (np.ndarray): positions of the kept points
+    """
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+
+    # first position of the minimum and of the maximum of every bucket
+    order_min = np.lexsort((np.arange(n), y, bucket))
+    order_max = np.lexsort((np.arange(n), -y, bucket))
+    return np.unique(np.concatenate([order_min[edges[:-1]], order_max[edges[:-1]]]))
+
+
+def downsample(data, x, y, max_points=MAX_POINTS, method='lttb'):
+    """
+    Reduce a series to about max_points points, keeping its visual shape.
+    Rows with a missing x or y are dropped first.
+
+    Args:
+        data (pd.DataFrame): dataset, sorted by x
+        x (str): column of the x axis
+        y (str): column of the y axis
+        max_points (int): number of points to keep
+        method (str): 'lttb' or 'minmax'
+
+    Returns:
+        data (pd.DataFrame): the x and y columns of the kept rows
+    """
+    assert method in ['lttb', 'minmax']
+    data = data[[x, y]].dropna()
+    if data.shape[0] <= max_points:
+        return data
+
+    if method == 'lttb':
+        index = lttb(data[x], data[y].to_numpy(), max_points)
+    else:
+        index = minmax(data[y].to_numpy(), max_points)
+    return data.iloc[index]
+
+
+def plot_data(plot_settings, show_y_axis=False, max_points=MAX_POINTS, method='lttb', webgl_threshold=WEBGL_THRESHOLD):
     """
     Create a plotly figure. The input should be a list of list.
+    Long series are downsampled to `max_points` (bars with min/max, to keep every extreme),
+        and drawn with WebGL above `webgl_threshold` points, so the size of the figure does not grow with the history.
 
     Args:
         plot_settings (list): [[plot_type1, dataset, x_column, y_column, data_label, secondary_axis_bool],
                                [plot_type1, dataset, x_column, y_column, data_label, secondary_axis_bool], ...]
+        show_y_axis (bool): show the y axes
+        max_points (Union[int, None]): maximum number of points per trace. None plots every point.
+        method (str): downsampling of lines and markers, 'lttb' or 'minmax'
+        webgl_threshold (Union[int, None]): number of points above which Scattergl is used. None never uses it.
 
     Returns:
         fig (plotly.graph_objs._figure.Figure): plot
@@ -22,9 +147,14 @@ def plot_data(plot_settings, show_y_axis=False):
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
     for i, setting in enumerate(plot_settings):
-        plot_type = setting[0]
+        plot_type, data, x, y = setting[0], setting[1], setting[2], setting[3]
         assert plot_type in ['scatter', 'line', 'bar']
-        trace = create_trace(plot_type, setting[1], setting[2], setting[3], setting[4], 'y' + str(i + 1))
+
+        if (max_points is not None) and (data.shape[0] > max_points):
+            data = downsample(data, x, y, max_points=max_points, method='minmax' if plot_type == 'bar' else method)
+        webgl = (webgl_threshold is not None) and (data.shape[0] > webgl_threshold)
+
+        trace = create_trace(plot_type, data, x, y, setting[4], 'y' + str(i + 1), webgl=webgl)
         fig.add_trace(trace, secondary_y=setting[5])
 
     # update fig to make it
@@ -45,7 +175,7 @@ def plot_data(plot_settings, show_y_axis=False):
     return fig
 
 
-def create_trace(plot_type, data, x, y, name, yaxis):
+def create_trace(plot_type, data, x, y, name, yaxis, webgl=False):
     """
     Create a plotly trace.
 
@@ -56,27 +186,83 @@ def create_trace(plot_type, data, x, y, name, yaxis):
         y (str): Column name that goes to the y axis
         name (str): Name of the
         yaxis (str): Name of the 'y' axis
+        webgl (bool): draw lines and markers with go.Scattergl
 
     Returns:
         trace (Union[plotly.graph_objs._bar.Bar, plotly.graph_objs._scatter.Scatter]):
     """
+    scatter = go.Scattergl if webgl else go.Scatter
+
     if plot_type == 'bar':
         trace = go.Bar(x=data[x],
                        y=data[y],
                        name=name,
                        yaxis=yaxis)
     if plot_type == 'line':
-        trace = go.Scatter(x=data[x],
-                           y=data[y],
-                           name=name,
-                           yaxis=yaxis)
+        trace = scatter(x=data[x],
+                        y=data[y],
+                        name=name,
+                        yaxis=yaxis)
     if plot_type == 'scatter':
-        trace = go.Scatter(x=data[x],
-                           y=data[y],
-                           name=name,
-                           yaxis=yaxis,
-                           mode='markers')
+        trace = scatter(x=data[x],
+                        y=data[y],
+                        name=name,
+                        yaxis=yaxis,
+                        mode='markers')
 
     return trace
 
 
+def zoom_range(relayout_data):
+    """
+    X range of a plotly relayout event, e.g. from a zoom in Streamlit.
+
+    Args:
+        relayout_data (dict): relayout event of the figure
+
+    Returns:
+        x_range (Union[tuple, None]): (start, end), or None if the event did not set a range (e.g. autoscale)
+    """
+    if relayout_data is None:
+        return None
+    if ('xaxis.range[0]' in relayout_data) and ('xaxis.range[1]' in relayout_data):
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return None
+
+
+def _as_timestamp(value, column):
+    # plotly sends the range as naive strings, in the time zone of the axis
+    value = pd.Timestamp(value)
+    tz = getattr(column.dt, 'tz', None)
+    if (tz is not None) and (value.tzinfo is None):
+        return value.tz_localize(tz)
+    if (tz is None) and (value.tzinfo is not None):
+        return value.tz_convert(None)
+    return value
+
+
+def plot_data_range(plot_settings, start, end, **kwargs):
+    """
+    Plot only the rows of each dataset within [start, end], so the zoomed window is drawn at full detail again,
+        with up to max_points points in the window instead of in the whole history.
+
+    Args:
+        plot_settings (list): settings of plot_data
+        start: first x value of the window
+        end: last x value of the window
+        **kwargs: arguments of plot_data
+
+    Returns:
+        fig (plotly.graph_objs._figure.Figure): plot
+    """
+    windowed = []
+    for setting in plot_settings:
+        data, x = setting[1], setting[2]
+        if pd.api.types.is_datetime64_any_dtype(data[x]):
+            low, high = _as_timestamp(start, data[x]), _as_timestamp(end, data[x])
+        else:
+            low, high = start, end
+        windowed.append([setting[0], data.loc[(data[x] >= low) & (data[x] <= high)]] + list(setting[2:]))
+    return plot_data(windowed, **kwargs)
@@ -0,0 +1,69 @@
+"""
+Compare two benchmark result files, e.g. of the base and the head of a change.
+
+Usage (from the root of the repository):
+    python -m benchmarks.compare 1a2b3c4 5d6e7f8           # commits with saved results
+    python -m benchmarks.compare base.json head.json --threshold 0.2
+
+Exits with status 1 if a case got slower, or used more memory, by more than the threshold.
+"""
+import sys
+import json
+import argparse
+from pathlib import Path
+
+RESULT_DIR = Path(__file__).parent / 'results'
+
+
+def load_results(name):
+    """
+    Results of a file path, or of a commit saved under results/.
+
+    Returns:
+        results (dict): {(benchmark, symbols, years): result}
+    """
+    path = Path(name)
+    if not path.exists():
+        path = RESULT_DIR / '{}.json'.format(name)
+    with open(str(path), 'r') as f:
+        results = json.load(f)['results']
+    return {(r['benchmark'], r['symbols'], r['years']): r for r in results}
+
+
+def compare(base, head, threshold=0.1):
+    """
+    Ratio head / base of the time and peak memory of every case present in both.
+
+    Returns:
+        rows (list): [(case, time ratio, memory ratio, regressed), ...]
+    """
+    rows = []
+    for case in sorted(set(base) & set(head)):
+        time_ratio = head[case]['seconds'] / base[case]['seconds'] if base[case]['seconds'] else float('nan')
+        memory_ratio = head[case]['peak_mb'] / base[case]['peak_mb'] if base[case]['peak_mb'] else float('nan')
+        regressed = time_ratio > 1 + threshold or memory_ratio > 1 + threshold
+        rows.append((case, time_ratio, memory_ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base', help="result file or commit of the baseline")
+    parser.add_argument('head', help="result file or commit to compare")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative change reported as a regression")
+    args = parser.parse_args(argv)
+
+    rows = compare(load_results(args.base), load_results(args.head), threshold=args.threshold)
+
+    print("{:<24} {:>7} {:>5}  {:>7}  {:>7}".format('benchmark', 'symbols', 'years', 'time', 'memory'))
+    for (name, n_symbols, years), time_ratio, memory_ratio, regressed in rows:
+        print("{:<24} {:>7} {:>5}  {:>6.2f}x  {:>6.2f}x{}".format(name, n_symbols, years, time_ratio, memory_ratio,
+                                                                 '  <- regression' if regressed else ''))
+
+    n_regressed = sum(row[3] for row in rows)
+    print("{} of {} cases regressed by more than {:.0%}".format(n_regressed, len(rows), args.threshold))
+    return 1 if n_regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Raw api responses for the benchmarks, in the format each source returns them: the tz-aware Date index and the
+    Dividends and Stock Splits columns of yfinance, the holidays of FRED daily series as NaN, and the string fields
+    and metadata of the Alpha Vantage and FMP json bodies.
+
+Fixtures are generated once from a fixed seed and kept under benchmarks/fixtures/, so every run and every commit
+    replays exactly the same data. A response recorded from the live api can be used instead by saving it with
+    `save_fixture` under the same name.
+"""
+import json
+import pickle
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import USFederalHolidayCalendar
+from pandas.tseries.offsets import CustomBusinessDay
+
+FIXTURE_DIR = Path(__file__).parent / 'fixtures'
+
+# bump when the generated responses change, so the fixtures saved by older versions are not replayed
+FIXTURE_VERSION = 2
+
+END_DATE = '2022-06-30'
+
+TRADING_DAYS = 252
+
+_TRADING_DAY = CustomBusinessDay(calendar=USFederalHolidayCalendar())
+
+
+def fixture_path(source, symbol, years):
+    return FIXTURE_DIR / 'v{}'.format(FIXTURE_VERSION) / source / '{}_{}y.pkl'.format(symbol, years)
+
+
+def save_fixture(source, symbol, years, response):
+    path = fixture_path(source, symbol, years)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(str(path), 'wb') as f:
+        pickle.dump(response, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _seed(source, symbol, years):
+    return sum(ord(c) for c in '{}:{}'.format(source, symbol)) * 1000 + years
+
+
+def _prices(source, symbol, years):
+    """
+    Daily OHLCV bars of a geometric random walk over the trading days of the last `years` years.
+    """
+    rng = np.random.default_rng(_seed(source, symbol, years))
+    dates = pd.date_range(end=END_DATE, periods=years * TRADING_DAYS, freq=_TRADING_DAY, name='Date')
+    n = len(dates)
+
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, n)))
+    open_ = close * np.exp(rng.normal(0, 0.005, n))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.007, n)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.007, n)))
+    volume = rng.integers(10 ** 5, 10 ** 7, n)
+
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=dates)
+
+
+def _generate(source, symbol, years):
+    if source == 'fred':
+        # daily series have an observation every weekday, missing ('.', read as NaN) on holidays
+        series = _prices(source, symbol, years)['Close'].round(2)
+        series = series.reindex(pd.bdate_range(series.index[0], series.index[-1]))
+        return series
+
+    if source == 'investing':
+        df = _prices(source, symbol, years).round({'Open': 2, 'High': 2, 'Low': 2, 'Close': 2})
+        df['Currency'] = 'USD'
+        return df
+
+    if source == 'yf':
+        # Ticker.history: midnight of every session in the time zone of the exchange, and the corporate actions
+        df = _prices(source, symbol, years)
+        df.index = df.index.tz_localize('America/New_York')
+        df['Dividends'] = 0.0
+        df.iloc[::63, df.columns.get_loc('Dividends')] = (df['Close'].iloc[::63] * 0.005).round(2)
+        df['Stock Splits'] = 0.0
+        return df
+
+    if source == 'alpha_vantage':
+        df = _prices(source, symbol, years).iloc[::-1]
+        series = {d.strftime('%Y-%m-%d'): {'1. open': '{:.4f}'.format(o), '2. high': '{:.4f}'.format(h),
+                                           '3. low': '{:.4f}'.format(l), '4. close': '{:.4f}'.format(c),
+                                           '5. volume': str(v)}
+                  for d, o, h, l, c, v in zip(df.index, df.Open, df.High, df.Low, df.Close, df.Volume)}
+        meta = {'1. Information': 'Daily Prices (open, high, low, close) and Volumes', '2. Symbol': symbol,
+                '3. Last Refreshed': END_DATE, '4. Output Size': 'Full size', '5. Time Zone': 'US/Eastern'}
+        return json.dumps({'Meta Data': meta, 'Time Series (Daily)': series}, indent=4).encode('utf-8')
+
+    if source == 'fmp':
+        rng = np.random.default_rng(_seed(source, symbol, years))
+        dates = pd.date_range(end=END_DATE, periods=years * 40, freq=_TRADING_DAY)
+        owners = [('director', 'Common Stock'), ('officer: Chief Executive Officer', 'Common Stock'),
+                  ('10 percent owner', 'Class A Common Stock')]
+        company_cik = '{:010d}'.format(_seed(source, symbol, 0))
+        trades = []
+        for i, d in enumerate(dates[::-1]):
+            owner, security = owners[i % len(owners)]
+            sale = i % 3 > 0
+            reporting_cik = '{:010d}'.format(1000000 + i % 7)
+            trades.append({
+                'symbol': symbol,
+                'filingDate': (d + pd.Timedelta(hours=17, minutes=i % 60)).strftime('%Y-%m-%d %H:%M:%S'),
+                'transactionDate': (d - pd.Timedelta(days=2)).strftime('%Y-%m-%d'),
+                'reportingCik': reporting_cik,
+                'transactionType': 'S-Sale' if sale else 'P-Purchase',
+                'securitiesOwned': float(rng.integers(10 ** 4, 10 ** 6)),
+                'companyCik': company_cik,
+                'reportingName': 'Insider {}'.format(i % 7),
+                'typeOfOwner': owner,
+                'acquistionOrDisposition': 'D' if sale else 'A',
+                'formType': '4',
+                'securitiesTransacted': float(rng.integers(100, 10000)),
+                'price': round(float(rng.uniform(10, 300)), 2),
+                'securityName': security,
+                'link': 'https://www.sec.gov/Archives/edgar/data/{}/{:018d}-index.htm'.format(reporting_cik, i),
+            })
+        return json.dumps(trades).encode('utf-8')
+
+    assert False, "No fixture for source {}".format(source)
+
+
+def load_fixture(source, symbol, years):
+    """
+    Raw response of a source for a symbol and a length of history, generated and saved on first use.
+
+    Args:
+        source (str): 'fred', 'investing', 'yf', 'alpha_vantage' or 'fmp'
+        symbol (str): symbol of the series
+        years (int): years of daily history
+
+    Returns:
+        response: pd.Series for fred, pd.DataFrame for investing and yf, json bytes for alpha_vantage and fmp
+    """
+    path = fixture_path(source, symbol, years)
+    if path.exists():
+        with open(str(path), 'rb') as f:
+            return pickle.load(f)
+    response = _generate(source, symbol, years)
+    save_fixture(source, symbol, years, response)
+    return response
+
+
+def universe(n_symbols):
+    """
+    Symbols of a synthetic universe.
+    """
+    return ['S{:04d}'.format(i) for i in range(n_symbols)]
@@ -0,0 +1,254 @@
+"""
+Offline benchmarks of the data path, replayed from fixtures (see fixtures.py and stubs.py).
+
+Measures the time and peak memory of standardize_data, master_df.fetch_data, the REST fetchers (Alpha Vantage, FMP),
+    create_price_features, plot_data and the database helpers (on sqlite) over universes of 1 to 500 symbols
+    and 1 to 30 years of daily history.
+Results are saved to benchmarks/results/<commit>.json, to be compared between commits with benchmarks/compare.py.
+
+Usage (from the root of the repository):
+    python -m benchmarks.run                     # quick grid
+    python -m benchmarks.run --profile full      # 1 to 500 symbols, 1 to 30 years
+    python -m benchmarks.run --only standardize_data --only plot_data
+"""
+import gc
+import sys
+import json
+import time
+import sqlite3
+import platform
+import argparse
+import subprocess
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+
+from . import stubs
+from .fixtures import load_fixture, universe
+from app.utils import log
+from app.utils.fetch_data import standardize_data, alpha_vantage_api, insider_trade_frame, FMP
+from app.utils.data_prep import master_df, create_price_features
+from app.utils.visualization import plot_data
+from app.utils.db_connection import write_frame, read_query_frame, stream_query_frames
+
+RESULT_DIR = Path(__file__).parent / 'results'
+
+PROFILES = {
+    'quick': {'symbols': (1, 10, 50), 'years': (1, 5)},
+    'full': {'symbols': (1, 10, 100, 500), 'years': (1, 5, 30)},
+}
+
+# the figure of one trace per symbol gets unreadable long before 500 symbols
+_MAX_TRACES = 50
+
+_DB_COLUMNS = ['p_key', 'Date', 'Open', 'High', 'Low', 'Close', 'Volume', 'symbol']
+
+
+def measure(func, repeat=3):
+    """
+    Best wall time over `repeat` runs, and peak traced memory of one more run.
+
+    Args:
+        func (callable): function without arguments. Returns the number of rows it processed.
+        repeat (int): number of timed runs
+
+    Returns:
+        result (dict): 'seconds', 'rows', 'rows_per_sec', 'peak_mb'
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        ts = time.perf_counter()
+        rows = func()
+        times.append(time.perf_counter() - ts)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = min(times)
+    return {'seconds': seconds, 'rows': rows, 'rows_per_sec': rows / seconds if seconds > 0 else None,
+            'peak_mb': peak / 2 ** 20}
+
+
+def _yf_frames(symbols, years):
+    return {symbol: standardize_data('yf', load_fixture('yf', symbol, years).reset_index(), symbol,
+                                     call_type='stock', interval='daily', currency='USD')
+            for symbol in symbols}
+
+
+def _alpha_vantage_frame(body):
+    # the frame alpha_vantage_api builds from the json body, before standardize_data
+    df = pd.DataFrame(json.loads(body)['Time Series (Daily)']).T.reset_index()
+    df.columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+    return df
+
+
+def bench_standardize_data(symbols, years):
+    raw = {source: {symbol: load_fixture(source, symbol, years) for symbol in symbols}
+           for source in ['fred', 'investing', 'yf', 'alpha_vantage', 'fmp']}
+    raw['alpha_vantage'] = {symbol: _alpha_vantage_frame(body) for symbol, body in raw['alpha_vantage'].items()}
+    raw['fmp'] = {symbol: json.loads(body) for symbol, body in raw['fmp'].items()}
+
+    def run():
+        rows = 0
+        for symbol in symbols:
+            rows += standardize_data('fred', pd.DataFrame(raw['fred'][symbol]).reset_index(), symbol,
+                                     call_type='index', interval='daily', currency='percent').shape[0]
+            rows += standardize_data('investing', raw['investing'][symbol].reset_index(), symbol,
+                                     call_type='stock', interval='daily').shape[0]
+            rows += standardize_data('yf', raw['yf'][symbol].reset_index(), symbol,
+                                     call_type='stock', interval='daily', currency='USD').shape[0]
+            rows += standardize_data('alpha_vantage', raw['alpha_vantage'][symbol].copy(), symbol,
+                                     call_type='stock', interval='daily', currency='USD').shape[0]
+            rows += insider_trade_frame(raw['fmp'][symbol]).shape[0]
+        return rows
+
+    return run
+
+
+def bench_fetch_data(symbols, years):
+    start_date = (pd.Timestamp('2022-06-30') - pd.DateOffset(years=years)).strftime('%Y-%m-%d')
+    config = [
+        {'source': 'fred',
+         'config': [{'symbol': 'F' + symbol, 'alias': 'fred_' + symbol, 'interval': 'daily'}
+                    for symbol in symbols[:max(len(symbols) // 10, 1)]]},
+        {'source': 'yf',
+         'config': [{'symbol': symbol, 'alias': 'yf_' + symbol, 'call_type': 'stock', 'interval': 'daily',
+                     'currency': 'USD'} for symbol in symbols]},
+    ]
+
+    def run():
+        df = master_df('daily', start_date, '2022-07-01', config)
+        data = df.fetch_data(max_workers=8, retries=0)
+        assert len(df.failed_dict_format) == 0, df.failed_dict_format
+        return sum(d.shape[0] for d in data.values())
+
+    return run
+
+
+def bench_fetch_rest(symbols, years):
+    fmp = FMP()
+
+    def run():
+        rows = 0
+        for symbol in symbols:
+            rows += alpha_vantage_api('stock', symbol).shape[0]
+            rows += fmp.get_historical_insider_trade_ticker(symbol, num_pages=None).shape[0]
+        return rows
+
+    return run
+
+
+def bench_create_price_features(symbols, years):
+    frames = _yf_frames(symbols, years)
+
+    def run():
+        return sum(create_price_features(df.copy()).shape[0] for df in frames.values())
+
+    return run
+
+
+def bench_plot_data(symbols, years):
+    frames = _yf_frames(symbols[:_MAX_TRACES], years)
+    settings = [['line', df, 'Date', 'Close', symbol, i > 0] for i, (symbol, df) in enumerate(frames.items())]
+
+    def run():
+        fig = plot_data(settings)
+        fig.to_json()
+        return sum(df.shape[0] for df in frames.values())
+
+    return run
+
+
+def bench_db(symbols, years):
+    df = pd.concat(_yf_frames(symbols, years).values(), ignore_index=True)[_DB_COLUMNS]
+
+    def run():
+        connection = sqlite3.connect(':memory:')
+        connection.execute("CREATE TABLE prices (p_key TEXT PRIMARY KEY, Date TEXT, Open REAL, High REAL, Low REAL, "
+                           "Close REAL, Volume INTEGER, symbol TEXT)")
+        write_frame(connection, df, 'prices', batch_size=1000)
+        n_rows = read_query_frame(connection, "SELECT * FROM prices").shape[0]
+        n_rows += sum(frame.shape[0] for frame in stream_query_frames(connection, "SELECT * FROM prices"))
+        connection.close()
+        return df.shape[0] + n_rows
+
+    return run
+
+
+BENCHMARKS = {
+    'standardize_data': bench_standardize_data,
+    'master_df.fetch_data': bench_fetch_data,
+    'rest_fetch': bench_fetch_rest,
+    'create_price_features': bench_create_price_features,
+    'plot_data': bench_plot_data,
+    'db_write_read': bench_db,
+}
+
+
+def commit_id():
+    """
+    Short hash of HEAD, with '-dirty' if the tree has uncommitted changes.
+    """
+    try:
+        sha = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD', '--', 'app']) != 0
+        return sha + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmarks(profile='quick', only=None, repeat=3):
+    """
+    Run every benchmark over the grid of the profile.
+
+    Returns:
+        results (list): one dict per (benchmark, symbols, years)
+    """
+    grid = PROFILES[profile]
+    results = []
+
+    for name, bench in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        for years in grid['years']:
+            stubs.set_years(years)
+            for n_symbols in grid['symbols']:
+                result = measure(bench(universe(n_symbols), years), repeat=repeat)
+                result.update({'benchmark': name, 'symbols': n_symbols, 'years': years})
+                results.append(result)
+                print("{:<24} {:>4} symbols {:>3} years  {:>9.4f} s  {:>12,.0f} rows/s  {:>8.1f} MB".format(
+                    name, n_symbols, years, result['seconds'], result['rows_per_sec'] or 0, result['peak_mb']))
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', choices=list(PROFILES), default='quick')
+    parser.add_argument('--only', action='append', choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case, the best one is kept")
+    parser.add_argument('--output', default=None, help="result file. Defaults to results/<commit>.json")
+    args = parser.parse_args(argv)
+
+    log.set_level('WARNING')
+    stubs.install()
+
+    commit = commit_id()
+    results = run_benchmarks(args.profile, only=args.only, repeat=args.repeat)
+
+    output = Path(args.output) if args.output else RESULT_DIR / '{}.json'.format(commit)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(str(output), 'w') as f:
+        json.dump({'commit': commit, 'profile': args.profile, 'date': datetime.now().isoformat(timespec='seconds'),
+                   'python': sys.version.split()[0], 'pandas': pd.__version__, 'platform': platform.platform(),
+                   'results': results}, f, indent=2)
+    print("Saved {} results to {}".format(len(results), output))
+
+
+if __name__ == '__main__':
+    main()
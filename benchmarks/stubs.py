@@ -0,0 +1,114 @@
+"""
+Stub transport that answers every fetcher of app.utils.fetch_data from the fixtures, without keys or network.
+
+`install(years)` replaces the fredapi client and the investpy and yfinance modules, as seen by fetch_data,
+    plugs a stub into the shared http transport of the REST fetchers, and lifts the rate limits, the response cache
+    and the persistent symbol index, so the benchmarks time the code of the platform rather than the apis.
+"""
+import os
+import sys
+import json
+import types
+import tempfile
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+from .fixtures import load_fixture
+
+os.environ['PLATFORM_CACHE'] = '0'
+
+from app.utils import fetch_data, concurrency, symbols, transport  # noqa: E402
+
+_state = {'years': 1}
+
+
+class StubFred:
+    def get_series(self, symbol, observation_start=None, observation_end=None):
+        return load_fixture('fred', symbol, _state['years']).copy()
+
+    def search(self, symbol):
+        return pd.DataFrame({'frequency': ['Daily'], 'units': ['Percent']}, index=pd.Index([symbol], name='series id'))
+
+
+def _investing_history(symbol, **kwargs):
+    return load_fixture('investing', symbol, _state['years']).copy()
+
+
+def _investing_listing(*args, **kwargs):
+    return pd.DataFrame({'symbol': [], 'name': []})
+
+
+def _investpy_module():
+    module = types.ModuleType('investpy')
+    module.get_etf_historical_data = lambda etf, **kwargs: _investing_history(etf, **kwargs)
+    module.get_index_historical_data = lambda index, **kwargs: _investing_history(index, **kwargs)
+    module.get_fund_historical_data = lambda fund, **kwargs: _investing_history(fund, **kwargs)
+    module.stocks = types.SimpleNamespace(get_stock_historical_data=lambda stock, **kwargs: _investing_history(stock))
+    module.etfs = types.SimpleNamespace(get_etfs=_investing_listing)
+    module.indices = types.SimpleNamespace(get_indices=_investing_listing)
+    module.funds = types.SimpleNamespace(get_funds=_investing_listing)
+    return module
+
+
+class _Ticker:
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def history(self, period=None, start=None, end=None, interval='1d'):
+        return load_fixture('yf', self.symbol, _state['years']).copy()
+
+
+def _yfinance_module():
+    module = types.ModuleType('yfinance')
+    module.Ticker = _Ticker
+    return module
+
+
+class StubTransport:
+    """
+    Answers the http GETs of the REST fetchers (Alpha Vantage, FMP) from the fixtures.
+    """
+
+    def get_bytes(self, url, source=None, symbol=None, headers=None):
+        parsed = urlparse(url)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+        if 'alphavantage' in parsed.netloc:
+            return load_fixture('alpha_vantage', query['symbol'], _state['years'])
+        if 'financialmodelingprep' in parsed.netloc and 'insider-trading' in parsed.path:
+            if int(query.get('page', 0)) > 0:
+                return b'[]'
+            return load_fixture('fmp', query['symbol'], _state['years'])
+        assert False, "No fixture for {}".format(url)
+
+    def get_json(self, url, source=None, symbol=None, headers=None):
+        return json.loads(self.get_bytes(url, source=source, symbol=symbol, headers=headers))
+
+
+def install(years=1):
+    """
+    Route the fetchers to the fixtures.
+
+    Args:
+        years (int): years of history returned for every symbol
+
+    Returns:
+        None
+    """
+    _state['years'] = years
+
+    sys.modules['investpy'] = _investpy_module()
+    sys.modules['yfinance'] = _yfinance_module()
+    transport.set_transport(StubTransport())
+    fetch_data._keys = {'fred': 'stub', 'alpha_vantage': 'stub', 'financial_modeling_prep': 'stub'}
+    fetch_data._fred = StubFred()
+
+    for source in list(concurrency.SOURCE_LIMITS):
+        concurrency.SOURCE_LIMITS[source] = {'concurrency': 64, 'calls': None, 'period': None}
+    concurrency._limiters.clear()
+    concurrency._semaphores.clear()
+
+    symbols._default_index = symbols.SymbolIndex(path=os.path.join(tempfile.mkdtemp(), 'symbols.pkl'))
+
+
+def set_years(years):
+    _state['years'] = years
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.utils.alignment import align_series, align_frames, series_interval
+
+pytest.importorskip('pandas_market_calendars')
+from app.utils.alignment import trading_calendar  # noqa: E402
+
+
+def monthly_macro():
+    # a FRED monthly series, dated on the first day of its month
+    dates = pd.date_range('2021-11-01', '2022-03-01', freq='MS')
+    return pd.DataFrame({'Date': dates, 'v': np.arange(len(dates), dtype=float), 'interval': 'monthly'})
+
+
+def daily_bars():
+    dates = pd.bdate_range('2022-01-03', '2022-01-14')
+    n = len(dates)
+    return pd.DataFrame({'Date': dates, 'Open': np.arange(n) + 10.0, 'High': np.arange(n) + 20.0,
+                         'Low': np.arange(n) + 5.0, 'Close': np.arange(n) + 15.0, 'Volume': 100,
+                         'interval': 'daily'})
+
+
+def test_trading_calendar_periods():
+    daily = trading_calendar('2022-01-01', '2022-01-31', 'daily')
+    assert daily[0] == pd.Timestamp('2022-01-03') and pd.Timestamp('2022-01-17') not in daily
+    monthly = trading_calendar('2022-01-01', '2022-04-30', 'monthly')
+    assert list(monthly) == [pd.Timestamp(d) for d in ['2022-01-31', '2022-02-28', '2022-03-31', '2022-04-29']]
+
+
+def test_daily_bars_are_bucketed_into_weeks():
+    dates = trading_calendar('2022-01-03', '2022-01-21', 'weekly')
+    aligned = align_series(daily_bars(), dates, interval='weekly', columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+    assert list(aligned.index) == [pd.Timestamp(d) for d in ['2022-01-07', '2022-01-14', '2022-01-21']]
+    assert aligned['Open'].tolist() == [10.0, 15.0, 15.0]
+    assert aligned['High'].tolist() == [24.0, 29.0, 29.0]
+    assert aligned['Close'].tolist() == [19.0, 24.0, 24.0]
+    # flows are not carried forward
+    assert aligned['Volume'].tolist() == [500, 500, 0]
+
+
+def test_daily_values_are_visible_on_their_date():
+    dates = trading_calendar('2022-01-03', '2022-01-14', 'daily')
+    aligned = align_series(daily_bars(), dates)
+    assert aligned.loc['2022-01-03', 'Close'] == 15.0
+    assert aligned['Close'].is_monotonic_increasing
+
+
+def test_monthly_values_are_visible_after_their_month():
+    dates = trading_calendar('2022-01-01', '2022-03-31', 'daily')
+    aligned = align_series(monthly_macro(), dates)['v']
+    # the value of December (1) until January ends, the value of January (2) from February on
+    assert aligned.loc['2022-01-03'] == 1
+    assert aligned.loc['2022-01-31'] == 1
+    assert aligned.loc['2022-02-01'] == 2
+    assert aligned.loc['2022-03-01'] == 3
+
+
+def test_release_lag_counts_from_the_end_of_the_period():
+    dates = trading_calendar('2022-01-01', '2022-03-31', 'daily')
+    aligned = align_series(monthly_macro(), dates, release_lag='15D')['v']
+    assert aligned.loc['2022-02-15'] == 1
+    assert aligned.loc['2022-02-16'] == 2
+
+
+def test_series_interval():
+    macro = monthly_macro()
+    assert series_interval(macro) == 'monthly'
+    assert series_interval(macro.drop(columns='interval')) == 'monthly'
+    assert series_interval(macro.assign(interval='weekly, ending friday')) == 'weekly'
+    assert series_interval(daily_bars().drop(columns='interval')) == 'daily'
+
+
+def test_align_frames_forward_fills_point_in_time():
+    frames = {'spx': daily_bars(), 'cpi': monthly_macro()}
+    df = align_frames(frames, '2022-01-03', '2022-02-04', interval='daily',
+                      settings={'cpi': {'release_lag': '2D'}}).set_index('Date')
+    assert list(df.columns) == ['v_spx', 'v_cpi']
+    assert df.loc['2022-02-02', 'v_cpi'] == 1
+    assert df.loc['2022-02-03', 'v_cpi'] == 2
+    # the daily series is carried forward after its last bar
+    assert df.loc['2022-02-04', 'v_spx'] == df.loc['2022-01-14', 'v_spx']
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.utils.breadth import ConstituentIndex, BreadthEngine, compute_breadth
+from app.utils.store import TimeSeriesStore
+
+WINDOWS = (5, 20)
+
+
+@pytest.fixture
+def index():
+    # 'DEAD' is a member without any price, e.g. a delisted ticker
+    return ConstituentIndex({
+        'AAA': [(None, None)],
+        'BBB': [(None, pd.Timestamp('2021-03-01'))],
+        'CCC': [(pd.Timestamp('2021-02-01'), None)],
+        'DEAD': [(None, pd.Timestamp('2021-04-01'))],
+    })
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range('2021-01-01', periods=120)
+    frames = []
+    for symbol in ['AAA', 'BBB', 'CCC', 'XYZ']:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        frames.append(pd.DataFrame({'Date': dates, 'symbol': symbol, 'Close': close}))
+    df = pd.concat(frames, ignore_index=True)
+    # a gap in one history, and a symbol listed later
+    df = df.drop(df.index[(df['symbol'] == 'AAA') & (df['Date'] == dates[30])])
+    return df.drop(df.index[(df['symbol'] == 'CCC') & (df['Date'] < dates[10])]).reset_index(drop=True)
+
+
+def test_engine_matches_batch(index, prices):
+    expected = compute_breadth(prices, index, windows=WINDOWS)
+    result = BreadthEngine(index, windows=WINDOWS).warm_up(prices)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_n_members_counts_members_without_prices(index, prices):
+    breadth = compute_breadth(prices, index, windows=WINDOWS).set_index('Date')
+    assert breadth.loc['2021-01-04', 'n_members'] == 3
+    assert breadth.loc['2021-02-01', 'n_members'] == 4
+    assert breadth.loc['2021-04-01', 'n_members'] == 2
+
+
+def test_compute_breadth_on_tz_aware_dates(index, prices):
+    expected = compute_breadth(prices, index, windows=WINDOWS)
+    aware = prices.assign(Date=prices['Date'].dt.tz_localize('America/New_York'))
+    pd.testing.assert_frame_equal(compute_breadth(aware, index, windows=WINDOWS), expected)
+
+
+def stored(df):
+    df = df.copy()
+    df['Date'] = df['Date'].dt.tz_localize('America/New_York')
+    df['p_key'] = df['Date'].dt.strftime('%Y_%m_%d') + '_' + df['symbol']
+    return df
+
+
+def test_restore_and_catch_up_from_store(tmp_path, index, prices):
+    store = TimeSeriesStore(root=tmp_path / 'history')
+    split = prices['Date'].sort_values().unique()[60]
+    for symbol, df in stored(prices.loc[prices['Date'] < split]).groupby('symbol'):
+        store.upsert('yf', symbol, 'daily', df)
+
+    engine = BreadthEngine(index, windows=WINDOWS)
+    first = engine.catch_up(store)
+    engine.snapshot(tmp_path / 'breadth.pkl')
+
+    for symbol, df in stored(prices.loc[prices['Date'] >= split]).groupby('symbol'):
+        store.upsert('yf', symbol, 'daily', df)
+    restored = BreadthEngine.restore(index, path=tmp_path / 'breadth.pkl', windows=WINDOWS)
+    second = restored.catch_up(store)
+
+    expected = compute_breadth(prices.loc[prices['symbol'] != 'XYZ'], index, windows=WINDOWS)
+    result = pd.concat([first, second], ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert second.shape[0] == 60
+
+    with pytest.raises(AssertionError):
+        BreadthEngine.restore(index, path=tmp_path / 'breadth.pkl', windows=(50, 200))
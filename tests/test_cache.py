@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import pandas as pd
+import pytest
+from app.utils import cache as cache_module
+from app.utils.cache import ResponseCache, cached
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return tmp_path / 'cache'
+
+
+def index_on_disk(cache_dir):
+    with open(str(cache_dir / 'index.json')) as f:
+        return json.load(f)
+
+
+def test_set_and_get(cache_dir):
+    cache = ResponseCache(cache_dir)
+    key = cache.make_key('yf', symbol='MSFT')
+    df = pd.DataFrame({'Close': [1.0, 2.0]})
+    cache.set('yf', key, df)
+    pd.testing.assert_frame_equal(cache.get('yf', key), df)
+    assert cache.get('yf', cache.make_key('yf', symbol='AAPL')) is None
+
+
+def test_hits_do_not_rewrite_the_index(cache_dir, monkeypatch):
+    cache = ResponseCache(cache_dir)
+    key = cache.make_key('yf', symbol='MSFT')
+    cache.set('yf', key, 1)
+    written = os.stat(str(cache_dir / 'index.json')).st_mtime_ns
+    created = index_on_disk(cache_dir)[key]['accessed']
+
+    time.sleep(0.01)
+    for _ in range(100):
+        assert cache.get('yf', key) == 1
+    assert os.stat(str(cache_dir / 'index.json')).st_mtime_ns == written
+
+    cache.flush()
+    assert index_on_disk(cache_dir)[key]['accessed'] > created
+
+
+def test_processes_keep_each_other_entries(cache_dir):
+    # two caches on the same directory stand for two processes, each with its own copy of the index
+    first, second = ResponseCache(cache_dir), ResponseCache(cache_dir)
+    first.get('yf', 'missing')
+    second.get('yf', 'missing')
+
+    first.set('yf', 'a', 'from first')
+    second.set('yf', 'b', 'from second')
+    assert set(index_on_disk(cache_dir)) == {'a', 'b'}
+
+    # an entry stored by the other process is found without restarting
+    assert first.get('yf', 'b') == 'from second'
+
+    second.clear()
+    assert index_on_disk(cache_dir) == dict()
+    assert list(cache_dir.glob('*.pkl')) == []
+
+
+def test_expired_and_evicted_entries(cache_dir, monkeypatch):
+    cache = ResponseCache(cache_dir, ttl={'yf': 1}, max_bytes=10 ** 9)
+    cache.set('yf', 'old', 1)
+    cache._index['old']['created'] -= 10
+    assert cache.get('yf', 'old') is None
+    assert not (cache_dir / 'old.pkl').exists()
+
+    small = ResponseCache(cache_dir, max_bytes=1)
+    small.set('fred', 'x', 'value')
+    assert 'x' not in index_on_disk(cache_dir)
+
+
+def test_orphan_files_are_removed(cache_dir, monkeypatch):
+    cache_dir.mkdir()
+    orphan = cache_dir / 'orphan.pkl'
+    orphan.write_bytes(b'0' * 100)
+    old = time.time() - 2 * cache_module._ORPHAN_SECONDS
+    os.utime(str(orphan), (old, old))
+
+    ResponseCache(cache_dir).set('yf', 'a', 1)
+    assert not orphan.exists()
+    assert (cache_dir / 'a.pkl').exists()
+
+
+def test_keys_depend_on_the_cache_version(monkeypatch):
+    key = ResponseCache.make_key('alpha_vantage_financial_statements', symbol='IBM')
+    monkeypatch.setattr(cache_module, 'CACHE_VERSION', cache_module.CACHE_VERSION + 1)
+    assert ResponseCache.make_key('alpha_vantage_financial_statements', symbol='IBM') != key
+
+
+def test_cached_decorator(cache_dir, monkeypatch):
+    monkeypatch.setattr(cache_module, '_default_cache', ResponseCache(cache_dir))
+    calls = []
+
+    @cached('yf')
+    def fetch(symbol, key=None):
+        calls.append(symbol)
+        return symbol * 2
+
+    assert fetch('MSFT', key='secret') == 'MSFTMSFT'
+    assert fetch('MSFT', key='other') == 'MSFTMSFT'
+    assert fetch('MSFT', refresh=True) == 'MSFTMSFT'
+    assert fetch('MSFT', use_cache=False) == 'MSFTMSFT'
+    assert calls == ['MSFT', 'MSFT', 'MSFT']
@@ -0,0 +1,58 @@
+import time
+import pytest
+from app.utils import concurrency
+from app.utils.concurrency import run_tasks, retry_call, RateLimiter
+
+
+@pytest.fixture
+def single_slot_source(monkeypatch):
+    monkeypatch.setitem(concurrency.SOURCE_LIMITS, 'test_source', {'concurrency': 1, 'calls': None, 'period': None})
+    concurrency._semaphores.pop('test_source', None)
+    yield 'test_source'
+    concurrency._semaphores.pop('test_source', None)
+
+
+def test_run_tasks_collects_results_and_errors(single_slot_source):
+    def fail():
+        raise ValueError('no data')
+
+    tasks = [('ok', single_slot_source, lambda: 1, dict()), ('bad', single_slot_source, fail, dict())]
+    results, errors = run_tasks(tasks, max_workers=2, retries=1, backoff=0.01)
+    assert results == {'ok': 1}
+    assert isinstance(errors['bad'], ValueError)
+
+
+def test_backoff_does_not_hold_the_source_slot(single_slot_source):
+    finished = dict()
+    started = time.monotonic()
+
+    def fail():
+        raise ValueError('temporary')
+
+    def succeed():
+        finished['ok'] = time.monotonic() - started
+        return 1
+
+    # the failing task takes the only slot first, then sleeps at least 0.3 + 0.6 sec between its attempts
+    tasks = [('bad', single_slot_source, fail, dict())] + [('ok', single_slot_source, succeed, dict())]
+    results, errors = run_tasks(tasks, max_workers=2, retries=2, backoff=0.3)
+    assert results == {'ok': 1} and 'bad' in errors
+    assert finished['ok'] < 0.3
+
+
+def test_retry_call_raises_assertions_immediately():
+    calls = []
+
+    def unsupported():
+        calls.append(1)
+        assert False, "unsupported"
+
+    with pytest.raises(AssertionError):
+        retry_call(unsupported, retries=3, backoff=0.01)
+    assert len(calls) == 1
+
+
+def test_rate_limiter_allows_a_burst_then_waits():
+    limiter = RateLimiter(calls=2, period=0.2)
+    assert limiter.acquire() == 0 and limiter.acquire() == 0
+    assert limiter.acquire() > 0
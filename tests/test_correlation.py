@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.utils.correlation import corr_matrix, rolling_corr, rolling_corr_with, regime_corr, lagged_corr
+
+
+def random_walks(n_rows, n_columns, level=100.0, scale=1.0, seed=0, missing=0.0):
+    rng = np.random.default_rng(seed)
+    values = level + np.cumsum(rng.normal(0, scale, (n_rows, n_columns)), axis=0)
+    values[rng.random(values.shape) < missing] = np.nan
+    index = pd.date_range('1990-01-01', periods=n_rows, freq='B')
+    return pd.DataFrame(values, index=index, columns=['s{}'.format(i) for i in range(n_columns)])
+
+
+@pytest.fixture
+def returns():
+    return random_walks(600, 5, missing=0.05).diff()
+
+
+def test_corr_matrix_matches_pandas(returns):
+    pd.testing.assert_frame_equal(corr_matrix(returns), returns.corr(), atol=1e-12)
+
+
+def test_corr_matrix_with_other(returns):
+    other = returns[['s0', 's1']] * 3 + 1
+    expected = pd.DataFrame({c: returns.corrwith(other[c]) for c in other.columns})
+    pd.testing.assert_frame_equal(corr_matrix(returns, other), expected, atol=1e-12)
+
+
+def test_corr_matrix_large_levels():
+    df = random_walks(7500, 3, level=2e6, scale=0.5)
+    pd.testing.assert_frame_equal(corr_matrix(df), df.corr(), atol=1e-9)
+
+
+def test_rolling_corr_matches_pandas(returns):
+    expected = returns.rolling(60).corr()
+    result = rolling_corr(returns, 60, step=7)
+    assert list(result) == list(returns.index[6::7]) + [returns.index[-1]]
+    for date, corr in result.items():
+        pd.testing.assert_frame_equal(corr, expected.loc[date], atol=1e-10, check_names=False)
+
+
+# at price levels, rolling().corr() itself loses precision, so these windows are checked against DataFrame.corr()
+def test_rolling_corr_large_levels():
+    df = random_walks(7500, 3, level=2e6, scale=0.5, missing=0.02)
+    for date, corr in rolling_corr(df, 20, step=37, min_periods=10).items():
+        end = df.index.get_loc(date) + 1
+        expected = df.iloc[max(end - 20, 0):end].corr(min_periods=10)
+        pd.testing.assert_frame_equal(corr, expected, atol=1e-9)
+
+
+def test_expanding_corr_matches_pandas(returns):
+    expected = returns.expanding(min_periods=2).corr()
+    for date, corr in rolling_corr(returns, None, step=50, expanding=True).items():
+        pd.testing.assert_frame_equal(corr, expected.loc[date], atol=1e-10, check_names=False)
+
+
+def test_expanding_corr_large_levels():
+    df = random_walks(2000, 4, level=2e6, scale=0.5, missing=0.05)
+    for date, corr in rolling_corr(df, None, step=250, expanding=True).items():
+        pd.testing.assert_frame_equal(corr, df.loc[:date].corr(), atol=1e-9)
+
+
+def test_rolling_corr_with_matches_pandas(returns):
+    expected = returns.rolling(30, min_periods=20).corr(returns['s0'])
+    pd.testing.assert_frame_equal(rolling_corr_with(returns, 's0', 30, min_periods=20), expected, atol=1e-10)
+
+
+def test_rolling_corr_with_large_levels():
+    df = random_walks(7500, 2, level=2e6, scale=0.5)
+    result = rolling_corr_with(df, 's0', 20)
+    assert result.iloc[:19].isna().all().all()
+    for end in range(20, 7501, 97):
+        expected = df.iloc[end - 20:end].corr()['s0']
+        np.testing.assert_allclose(result.iloc[end - 1].to_numpy(), expected.to_numpy(), atol=1e-9)
+
+
+def test_regime_and_lagged_corr(returns):
+    regimes = regime_corr(returns, returns.index.year)
+    year = returns.index.year[0]
+    pd.testing.assert_frame_equal(regimes[year], returns.loc[returns.index.year == year].corr(), atol=1e-12)
+
+    lagged = lagged_corr(returns[['s0']], returns[['s1']], lags=[0, 1])
+    assert lagged.loc[(1, 's0'), 's1'] == pytest.approx(returns['s0'].corr(returns['s1'].shift(-1)), abs=1e-12)
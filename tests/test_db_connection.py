@@ -0,0 +1,152 @@
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+
+mysql_connector = pytest.importorskip('mysql.connector')
+
+from app.utils import db_connection  # noqa: E402
+from app.utils.db_connection import (ConnectionPool, write_frame, read_query_frame, stream_query_frames,  # noqa: E402
+                                     read_query)
+
+
+def prices(n=2500):
+    dates = pd.date_range('2015-01-01', periods=n, freq='D')
+    return pd.DataFrame({
+        'p_key': dates.strftime('%Y_%m_%d') + '_MSFT',
+        'Date': dates,
+        'Close': np.linspace(100, 200, n),
+        'Volume': np.arange(n),
+        'symbol': 'MSFT',
+    })
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(':memory:', check_same_thread=False)
+    connection.execute("CREATE TABLE prices (p_key TEXT PRIMARY KEY, Date TEXT, Close REAL NOT NULL, "
+                       "Volume INTEGER, symbol TEXT)")
+    yield connection
+    connection.close()
+
+
+@pytest.mark.parametrize('method', ['multi_row', 'executemany'])
+def test_write_frame_upserts(connection, method):
+    df = prices()
+    assert write_frame(connection, df, 'prices', batch_size=1000, method=method) == 2500
+
+    updated = df.iloc[-10:].assign(Close=0.0)
+    write_frame(connection, updated, 'prices', method=method)
+    stored = read_query_frame(connection, "SELECT * FROM prices ORDER BY p_key")
+    assert stored.shape[0] == 2500
+    assert (stored['Close'].iloc[-10:] == 0).all()
+    assert stored['Date'].iloc[0] == '2015-01-01 00:00:00'
+
+
+def test_write_frame_caps_placeholders_per_statement(connection):
+    statements = []
+    connection.set_trace_callback(statements.append)
+    write_frame(connection, prices(1000), 'prices', batch_size=1000, max_placeholders=999)
+    inserts = [s for s in statements if s.startswith('INSERT')]
+    # 5 columns per row: 199 rows per statement
+    assert len(inserts) == 6
+    assert read_query(connection, "SELECT COUNT(*) FROM prices")[0][0] == 1000
+
+
+def test_write_frame_raises_after_rollback(connection):
+    df = prices(300)
+    df.loc[250, 'Close'] = np.nan
+    with pytest.raises(sqlite3.IntegrityError):
+        write_frame(connection, df, 'prices', batch_size=100)
+    # the first two batches are committed, the failed one is rolled back
+    assert read_query(connection, "SELECT COUNT(*) FROM prices")[0][0] == 200
+
+
+def test_read_query_frame_types_columns(connection):
+    write_frame(connection, prices(), 'prices')
+    df = read_query_frame(connection, "SELECT Date, Close, Volume FROM prices ORDER BY Date", chunk_size=700,
+                          dtypes={'Date': 'datetime64[ns]', 'Close': 'float32'})
+    assert df.shape == (2500, 3)
+    assert df['Date'].dtype == 'datetime64[ns]' and df['Close'].dtype == 'float32'
+    assert df['Date'].iloc[-1] == pd.Timestamp('2021-11-04')
+
+
+def test_stream_query_frames_chunks(connection):
+    write_frame(connection, prices(), 'prices')
+    frames = list(stream_query_frames(connection, "SELECT * FROM prices WHERE Volume >= ?", chunk_size=1000,
+                                      params=(500,)))
+    assert [f.shape[0] for f in frames] == [1000, 1000]
+    assert read_query_frame(connection, "SELECT * FROM prices WHERE Volume < 0").empty
+
+
+class FakeMySQLPool:
+    """
+    Stands in for mysql.connector.pooling.MySQLConnectionPool, handing out sqlite connections.
+    """
+
+    def __init__(self, pool_size, **kwargs):
+        self.pinged = 0
+        self.returned = 0
+        self.connections = [self._connection() for _ in range(pool_size)]
+
+    def _connection(self):
+        pool = self
+        connection = sqlite3.connect(':memory:', check_same_thread=False)
+
+        class Pooled:
+            def cursor(self, **kwargs):
+                return connection.cursor()
+
+            def commit(self):
+                connection.commit()
+
+            def rollback(self):
+                connection.rollback()
+
+            def ping(self, reconnect=False, attempts=1, delay=0):
+                pool.pinged += 1
+
+            def close(self):
+                pool.returned += 1
+                pool.connections.append(self)
+
+        return Pooled()
+
+    def get_connection(self):
+        return self.connections.pop()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(db_connection.mysql.connector.pooling, 'MySQLConnectionPool', FakeMySQLPool)
+    return ConnectionPool('localhost', 'user', 'password', pool_size=2, timeout=0.2)
+
+
+def test_pool_borrows_pings_and_returns(pool):
+    assert read_query(pool, "SELECT 1") == [(1,)]
+    assert pool._pool.pinged == 1 and pool._pool.returned == 1
+
+
+def test_pool_blocks_when_every_connection_is_borrowed(pool):
+    with pool.connection(), pool.connection():
+        with pytest.raises(mysql_connector.errors.PoolError):
+            with pool.connection():
+                pass
+    with pool.connection() as connection:
+        assert connection is not None
+
+
+def test_pool_is_shared_between_threads(pool):
+    results = []
+
+    def work():
+        results.append(read_query(pool, "SELECT 1"))
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [[(1,)]] * 8
+    assert pool._pool.returned == 8
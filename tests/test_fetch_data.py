@@ -0,0 +1,85 @@
+import os
+import sys
+import subprocess
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+from app.utils import fetch_data
+from app.utils.fetch_data import standardize_data, derive_p_key, parse_finviz_snapshot
+
+DATA_DIR = Path(__file__).parent / 'data'
+
+
+def yf_history(n=5):
+    # yf returns a tz-aware Date column
+    dates = pd.date_range('2022-01-03', periods=n, freq='B', tz='America/New_York', name='Date')
+    close = np.linspace(100, 104, n)
+    return pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1000},
+                        index=dates).reset_index()
+
+
+@pytest.mark.parametrize('source, make', [
+    ('yf', yf_history),
+    ('investing', lambda: yf_history().assign(Date=lambda df: df['Date'].dt.tz_localize(None))),
+    ('fred', lambda: pd.DataFrame({'index': pd.date_range('2022-01-03', periods=5), 0: np.arange(5.0)})),
+])
+def test_p_key_is_the_same_in_every_mode(source, make):
+    default = standardize_data(source, make(), 'MSFT', call_type='stock', interval='daily', currency='USD')
+    compact = derive_p_key(standardize_data(source, make(), 'MSFT', call_type='stock', interval='daily',
+                                            currency='USD', compact=True))
+    assert default['p_key'].iloc[0] == '2022_01_03_MSFT'
+    assert default['p_key'].tolist() == compact['p_key'].tolist()
+
+
+def test_compact_date_key():
+    df = standardize_data('yf', yf_history(), 'MSFT', call_type='stock', interval='daily', currency='USD',
+                          compact=True)
+    assert df['date_key'].iloc[0] == 20220103
+    assert 'p_key' not in df.columns
+    assert isinstance(df['symbol'].dtype, pd.CategoricalDtype)
+
+
+def test_unknown_source_is_returned_unchanged():
+    df = yf_history()
+    out = standardize_data('unknown', df.copy(), 'MSFT')
+    pd.testing.assert_frame_equal(out, df)
+
+
+def test_parse_finviz_snapshot():
+    html = (DATA_DIR / 'finviz_quote.html').read_text()
+    assert parse_finviz_snapshot(html) == {'Index': 'DJIA, NDX, S&P 500', 'P/E': '22.45', 'Market Cap': '2372.54B',
+                                           'EPS (ttm)': '6.15', 'Dividend %': '0.67%', 'Perf Week': '-2.09%'}
+
+
+def test_parse_finviz_snapshot_across_chunks(monkeypatch):
+    html = (DATA_DIR / 'finviz_quote.html').read_text()
+    monkeypatch.setattr(fetch_data, '_SNAPSHOT_CHUNK', 7)
+    assert parse_finviz_snapshot(html)['Perf Week'] == '-2.09%'
+
+
+def test_parse_finviz_page_without_snapshot():
+    assert parse_finviz_snapshot('<style>.snapshot-table2 {}</style><table><tr><td>a</td></tr></table>') == dict()
+
+
+def test_import_does_not_read_keys_or_build_clients():
+    # a fresh interpreter, where reading the keys file fails
+    code = "\n".join([
+        "import sys, json",
+        "def fail(*args, **kwargs):",
+        "    raise AssertionError('keys read on import')",
+        "json.load = fail",
+        "from app.utils import fetch_data, data_prep, incremental",
+        "assert fetch_data._keys is None and fetch_data._fred is None",
+        "print(sorted(m for m in ['fredapi', 'investpy', 'yfinance'] if m in sys.modules))",
+    ])
+    root = Path(__file__).parent.parent
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=str(root), env=dict(os.environ), text=True)
+    assert output.strip() == '[]'
+
+
+def test_keys_are_read_on_first_use(monkeypatch):
+    monkeypatch.setattr(fetch_data, '_keys', {'alpha_vantage': 'av-key', 'fred': 'fred-key'})
+    assert fetch_data.alpha_vantage == 'av-key'
+    with pytest.raises(AttributeError):
+        fetch_data.not_a_client
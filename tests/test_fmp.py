@@ -0,0 +1,70 @@
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+import pytest
+from app.utils import fetch_data, transport
+from app.utils.fetch_data import FMP
+
+
+class PagedTransport:
+    """
+    Serves `n_pages` pages of insider trades of 2 records each, then empty pages, and records the pages requested.
+    """
+
+    def __init__(self, n_pages):
+        self.n_pages = n_pages
+        self.pages = []
+
+    def get_json(self, url, source=None, symbol=None, headers=None):
+        query = {k: v[0] for k, v in parse_qs(urlparse(url).query).items()}
+        page = int(query['page'])
+        self.pages.append(page)
+        if page >= self.n_pages:
+            return []
+        return [{'symbol': query['symbol'], 'transactionDate': '2022-06-{:02d}'.format(28 - page),
+                 'filingDate': '2022-06-{:02d} 18:00:00'.format(29 - page), 'transactionType': 'S-Sale',
+                 'securitiesTransacted': 100.0 * page + i, 'price': '150.25'} for i in range(2)]
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    def install(n_pages):
+        stub = PagedTransport(n_pages)
+        previous = transport.set_transport(stub)
+        monkeypatch.setattr(fetch_data, '_keys', {'financial_modeling_prep': 'test'})
+        installed.append(previous)
+        return stub
+
+    installed = []
+    yield install
+    for previous in installed:
+        transport.set_transport(previous)
+
+
+def test_paging_stops_at_the_first_empty_page(stub):
+    pages = stub(5)
+    result = list(FMP().insider_trade_pages('AAPL', num_pages=None, max_workers=2))
+    assert [number for number, _ in result] == [0, 1, 2, 3, 4]
+    # waves of 2 pages: the wave of pages 4 and 5 finds the empty page
+    assert sorted(pages.pages) == [0, 1, 2, 3, 4, 5]
+
+
+@pytest.mark.parametrize('num_pages, expected', [(0, []), (1, [0]), (3, [0, 1, 2])])
+def test_number_of_pages(stub, num_pages, expected):
+    pages = stub(10)
+    result = list(FMP().insider_trade_pages('AAPL', num_pages=num_pages, max_workers=2))
+    assert [number for number, _ in result] == expected
+    assert sorted(pages.pages) == expected
+
+
+def test_insider_trade_frame_keeps_the_page_order(stub):
+    stub(3)
+    df = FMP().get_historical_insider_trade_ticker('AAPL', num_pages=None, max_workers=3, use_cache=False)
+    assert df['securitiesTransacted'].tolist() == [0.0, 1.0, 100.0, 101.0, 200.0, 201.0]
+    assert pd.api.types.is_datetime64_dtype(df['transactionDate'])
+    assert df['price'].dtype == 'float64' and df['transactionType'].dtype == 'category'
+    assert df['transactionDate'].iloc[0] == pd.Timestamp('2022-06-28')
+
+
+def test_no_trades():
+    df = fetch_data.insider_trade_frame([])
+    assert df.shape[0] == 0 and 'transactionDate' in df.columns
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+from app.utils.fundamentals import FundamentalsPanel
+
+
+def statement(symbol, years, **figures):
+    # a statement standardized by alpha_vantage_api_financial_statements, one row per fiscal year
+    df = pd.DataFrame({'fiscalDateEnding': pd.to_datetime(['{}-12-31'.format(y) for y in years]), 'symbol': symbol})
+    for name, values in figures.items():
+        df[name] = values
+    df['p_key'] = df['fiscalDateEnding'].dt.strftime('%Y_%m_%d') + '_' + symbol
+    return df
+
+
+@pytest.fixture
+def panel():
+    income = [statement('AAA', [2020, 2021], totalRevenue=[10.0, 12.0], netIncome=[1.0, 2.0]),
+              statement('BBB', [2021], totalRevenue=[5.0], netIncome=[0.5])]
+    cash_flow = [statement('AAA', [2020, 2021], netIncome=[1.0, 2.0], operatingCashflow=[3.0, 4.0])]
+    return FundamentalsPanel.from_statements({'income statement': income, 'cash flow': cash_flow})
+
+
+def test_from_statements_joins_figures_once(panel):
+    assert sorted(panel.df.columns) == ['netIncome', 'operatingCashflow', 'totalRevenue']
+    assert panel.df.shape[0] == 3
+
+
+def test_restated_filings_keep_the_last_one():
+    income = [statement('AAA', [2020, 2021], totalRevenue=[10.0, 12.0]),
+              statement('AAA', [2021], totalRevenue=[11.5])]
+    cash_flow = [statement('AAA', [2020, 2021], operatingCashflow=[3.0, 4.0])]
+    panel = FundamentalsPanel.from_statements({'income statement': income, 'cash flow': cash_flow})
+    assert panel.df.loc[(pd.Timestamp('2021-12-31'), 'AAA'), 'totalRevenue'] == 11.5
+    assert panel.df.shape[0] == 2
+
+
+def test_as_of_waits_for_the_release_lag(panel):
+    # the figures of 2021 are published 90 days after 2021-12-31
+    before = panel.as_of('2022-03-30')
+    assert before.loc['AAA', 'fiscalDateEnding'] == pd.Timestamp('2020-12-31')
+    assert 'BBB' not in before.index
+
+    after = panel.as_of('2022-03-31', columns=['totalRevenue'])
+    assert after.loc['AAA', 'totalRevenue'] == 12.0
+    assert after.loc['BBB', 'totalRevenue'] == 5.0
+
+
+def test_update_replaces_the_same_fiscal_year(panel):
+    newer = FundamentalsPanel.from_statements({'income statement': [
+        statement('AAA', [2021, 2022], totalRevenue=[12.5, 14.0], netIncome=[2.1, 3.0])]})
+    panel.update(newer)
+    assert panel.df.shape[0] == 4
+    assert panel.history('totalRevenue')['AAA'].tolist() == [10.0, 12.5, 14.0]
+    # figures only the older panel has are kept on the other rows
+    assert panel.df.loc[(pd.Timestamp('2020-12-31'), 'AAA'), 'operatingCashflow'] == 3.0
+
+
+def test_save_and_load(tmp_path, panel):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'fundamentals.parquet'
+    panel.save(path)
+    loaded = FundamentalsPanel.load(path)
+    pd.testing.assert_frame_equal(loaded.df, panel.df)
+    assert loaded.release_lag == pd.Timedelta('90D')
@@ -0,0 +1,80 @@
+from datetime import date
+import pandas as pd
+import pytest
+from app.utils import incremental
+from app.utils.fetch_data import standardize_data
+
+pytest.importorskip('pyarrow')
+from app.utils.store import TimeSeriesStore  # noqa: E402
+
+TODAY = date(2022, 6, 30)
+
+
+def bars(symbol, start, end):
+    dates = pd.bdate_range(start, end)
+    df = pd.DataFrame({'Date': dates.strftime('%Y-%m-%d'), 'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': 1.0,
+                       'Volume': 100})
+    return standardize_data('yf', df, symbol, call_type='stock', interval='daily', currency='USD')
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """
+    Arguments of every call to the stubbed fetchers, which return the business days of the requested range.
+    """
+    calls = []
+
+    def fetcher(name):
+        def fetch(call_type, symbol, from_date=None, to_date=None, **kwargs):
+            calls.append(dict(kwargs, fetcher=name, symbol=symbol, from_date=from_date, to_date=to_date))
+            df = bars(symbol, from_date or '2022-01-03', to_date or TODAY)
+            if from_date is not None:
+                # the fetchers keep the dates strictly inside the range
+                df = df.loc[(df['Date'] > from_date) & (df['Date'] < to_date)]
+            return df
+        return fetch
+
+    monkeypatch.setattr(incremental, 'yf_api', fetcher('yf'))
+    monkeypatch.setattr(incremental, 'alpha_vantage_api', fetcher('alpha_vantage'))
+    return calls
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(root=tmp_path / 'history')
+
+
+def test_empty_store_fetches_the_full_history(calls, store):
+    df = incremental.update_history('yf', 'stock', 'AAA', store=store, today=TODAY)
+    assert calls == [{'fetcher': 'yf', 'symbol': 'AAA', 'from_date': None, 'to_date': None, 'interval': 'daily',
+                      'currency': 'USD', 'use_cache': False}]
+    assert store.read('yf', 'AAA', 'daily').shape[0] == df.shape[0]
+    assert store.last_date('yf', 'AAA', 'daily') == pd.Timestamp('2022-06-30')
+
+
+def test_tail_range_covers_the_last_stored_bar(calls, store):
+    store.upsert('yf', 'AAA', 'daily', bars('AAA', '2022-01-03', '2022-06-15'))
+    n_rows = store.read('yf', 'AAA', 'daily').shape[0]
+
+    incremental.update_history('yf', 'stock', 'AAA', store=store, today=TODAY)
+    # one day before the last stored bar, and one day after today, since the fetchers filter strictly
+    assert (calls[0]['from_date'], calls[0]['to_date']) == ('2022-06-14', '2022-07-01')
+    assert calls[0]['use_cache'] is False
+    assert store.read('yf', 'AAA', 'daily').shape[0] == n_rows + 11
+
+
+@pytest.mark.parametrize('last_date, outputsize', [
+    (None, 'full'),
+    ('2022-06-01', 'compact'),
+    ('2022-03-23', 'compact'),
+    ('2022-03-22', 'full'),
+])
+def test_alpha_vantage_output_size(calls, last_date, outputsize):
+    incremental.fetch_tail('alpha_vantage', 'stock', 'AAA', last_date=last_date, today=TODAY)
+    assert calls[0]['outputsize'] == outputsize
+    assert calls[0]['use_cache'] is False
+
+
+def test_unsupported_source():
+    with pytest.raises(AssertionError):
+        incremental.fetch_tail('finviz', 'stock', 'AAA', today=TODAY)
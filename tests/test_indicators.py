@@ -0,0 +1,98 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from app.utils.features import compute_features
+from app.utils.indicators import (RollingMean, RollingStd, RollingExtreme, PctChange, IndicatorState,
+                                  IndicatorBook)
+
+SETTINGS = dict(ma_windows=(5, 20), return_periods=(1, 5), vol_window=10)
+COMPARED = ['ma_5', 'ma_20', 'dma_5', 'dma_20', 'return_1', 'return_5', 'volatility_10']
+
+
+def closes(n=3000, level=100.0, seed=0):
+    rng = np.random.default_rng(seed)
+    close = level * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    close[[50, 51, 400]] = np.nan
+    return close
+
+
+def stream(close, **settings):
+    state = IndicatorState(**settings)
+    rows = [state.update(value) for value in close]
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize('level', [100.0, 2e6])
+def test_state_matches_compute_features_exactly(level):
+    close = closes(level=level)
+    arrays = {c: close[:, np.newaxis] for c in ['Open', 'High', 'Low', 'Close']}
+    batch = compute_features(arrays, **SETTINGS)
+    streamed = stream(close, **SETTINGS)
+    for name in COMPARED:
+        np.testing.assert_array_equal(streamed[name].to_numpy(), batch[name][:, 0], err_msg=name)
+
+
+def test_state_matches_pandas():
+    close = pd.Series(closes())
+    returns = close.pct_change(fill_method=None)
+    expected = {
+        'ma_20': close.rolling(20).mean(),
+        'dma_20': close / close.rolling(20).mean() - 1,
+        'return_5': close.pct_change(5, fill_method=None),
+        'volatility_10': returns.rolling(10).std(),
+        'max_20': close.rolling(20).max(),
+        'min_252': close.rolling(252).min(),
+        'ema_12': close.ewm(span=12, adjust=False, ignore_na=True).mean(),
+    }
+    streamed = stream(close, **dict(SETTINGS, extreme_windows=(20, 252)))
+    for name, values in expected.items():
+        np.testing.assert_allclose(streamed[name].to_numpy(), values.to_numpy(), rtol=1e-10, err_msg=name)
+
+
+def test_rolling_mean_and_std_skip_nan_windows():
+    mean, std = RollingMean(3), RollingStd(3)
+    values = [1.0, 2.0, 3.0, math.nan, 4.0, 5.0, 6.0, 7.0]
+    means = [mean.update(v) for v in values]
+    stds = [std.update(v) for v in values]
+    np.testing.assert_array_equal(means, pd.Series(values).rolling(3).mean().to_numpy())
+    np.testing.assert_allclose(stds, pd.Series(values).rolling(3).std().to_numpy(), rtol=1e-12)
+
+
+def test_rolling_extreme_is_nan_with_nan_in_window():
+    maximum = RollingExtreme(3, 'max')
+    values = [1.0, 5.0, 2.0, math.nan, 3.0, 1.0, 0.5, 0.2]
+    result = [maximum.update(v) for v in values]
+    np.testing.assert_array_equal(result, pd.Series(values).rolling(3).max().to_numpy())
+
+
+def test_pct_change_from_zero_is_infinite():
+    change = PctChange(1)
+    change.update(0.0)
+    assert change.update(2.0) == math.inf
+    change = PctChange(1)
+    change.update(0.0)
+    assert math.isnan(change.update(0.0))
+
+
+def test_update_without_date_keeps_the_replay_guard():
+    state = IndicatorState(**SETTINGS)
+    assert state.update(100.0, date=pd.Timestamp('2022-01-03')) is not None
+    assert state.update(101.0) is not None
+    assert state.last_date == pd.Timestamp('2022-01-03')
+    assert state.update(99.0, date=pd.Timestamp('2022-01-03')) is None
+
+
+def test_snapshot_and_restore(tmp_path):
+    path = tmp_path / 'indicators.pkl'
+    book = IndicatorBook(**SETTINGS)
+    for i, close in enumerate(closes()[:100]):
+        book.update('MSFT', close, date=i)
+    book.snapshot(path)
+
+    restored = IndicatorBook.restore(path, **SETTINGS)
+    assert restored.update('MSFT', 100.0, date=99) is None
+    assert restored.update('MSFT', 100.0, date=100) == book.update('MSFT', 100.0, date=100)
+
+    with pytest.raises(AssertionError):
+        IndicatorBook.restore(path, ma_windows=(10,))
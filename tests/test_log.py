@@ -0,0 +1,84 @@
+import os
+import sys
+import logging
+import subprocess
+from pathlib import Path
+import pytest
+from app.utils import log
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def capture(monkeypatch):
+    """
+    Output handler of the loggers created during a test, in place of the file and console.
+    """
+    handler = ListHandler()
+    monkeypatch.setattr(log, '_HANDLERS', [handler])
+    loggers = dict(log._LOGGERS)
+    yield handler
+    log.disable_queue_logging()
+    for logger in log._LOGGERS.values():
+        logger.removeHandler(handler)
+    log._LOGGERS.clear()
+    log._LOGGERS.update(loggers)
+
+
+def test_get_logger_adds_handlers_once(capture):
+    logger = log.get_logger('tests.log.once')
+    handlers = list(logger.handlers)
+    assert log.get_logger('tests.log.once') is logger
+    log.get_logger('tests.log.once', level='INFO')
+    assert logger.handlers == handlers == [capture]
+    assert logger.level == logging.INFO
+
+    logger.info('one record')
+    assert capture.messages == ['one record']
+
+
+def test_set_level_applies_to_existing_loggers(capture, monkeypatch):
+    monkeypatch.setattr(log, '_LEVEL', log._LEVEL)
+    before = log.get_logger('tests.log.before')
+    log.set_level('WARNING')
+    after = log.get_logger('tests.log.after')
+    try:
+        assert before.level == after.level == logging.WARNING
+        before.info('hidden')
+        before.warning('shown')
+        assert capture.messages == ['shown']
+    finally:
+        log.set_level('DEBUG')
+    with pytest.raises(ValueError):
+        log.set_level('VERBOSE')
+
+
+def test_log_level_env_variable():
+    root = Path(__file__).parent.parent
+    code = "from app.utils import fetch_data, log; print(fetch_data.logger.level, log.get_logger('new').level)"
+    env = dict(os.environ, PLATFORM_LOG_LEVEL='WARNING')
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=str(root), env=env, text=True)
+    assert output.split() == [str(logging.WARNING)] * 2
+
+
+def test_queue_logging_keeps_every_record(capture):
+    logger = log.get_logger('tests.log.queue')
+    logger.info('direct 0')
+
+    log.enable_queue_logging()
+    log.enable_queue_logging()
+    assert [type(h) for h in logger.handlers] == [log.QueueHandler]
+    for i in range(200):
+        logger.info('queued {}'.format(i))
+    log.disable_queue_logging()
+
+    assert logger.handlers == [capture]
+    logger.info('direct 1')
+    assert capture.messages == ['direct 0'] + ['queued {}'.format(i) for i in range(200)] + ['direct 1']
@@ -0,0 +1,53 @@
+import pytest
+from app.utils import concurrency, metrics
+from app.utils.concurrency import throttle
+from app.utils.metrics import instrument
+
+
+@pytest.fixture
+def registry():
+    metrics.get_registry().reset()
+    yield metrics.get_registry()
+    metrics.get_registry().reset()
+
+
+@pytest.fixture
+def limited_source(monkeypatch):
+    # one call every 0.3 sec
+    monkeypatch.setitem(concurrency.SOURCE_LIMITS, 'test_source', {'concurrency': 1, 'calls': 1, 'period': 0.3})
+    concurrency._limiters.pop('test_source', None)
+    yield 'test_source'
+    concurrency._limiters.pop('test_source', None)
+
+
+def histogram(registry, name, source):
+    return [h for h in registry.to_dict()['histograms'] if h['name'] == name and h['labels']['source'] == source]
+
+
+def test_latency_leaves_out_the_throttle_wait(registry, limited_source):
+    @instrument(limited_source)
+    def fetch(symbol):
+        throttle(limited_source)
+        return symbol
+
+    fetch('A')
+    fetch('B')
+
+    latency = histogram(registry, 'fetch_latency_seconds', limited_source)
+    assert sum(h['count'] for h in latency) == 2
+    assert sum(h['sum'] for h in latency) < 0.1
+
+    waits = histogram(registry, 'throttle_wait_seconds', limited_source)
+    assert waits[0]['count'] == 2
+    assert waits[0]['sum'] >= 0.25
+
+
+def test_failures_are_counted(registry):
+    @instrument('test_source')
+    def fetch(symbol):
+        raise ValueError('no data')
+
+    with pytest.raises(ValueError):
+        fetch('A')
+    errors = [c for c in registry.to_dict()['counters'] if c['name'] == 'errors_total']
+    assert errors == [{'name': 'errors_total', 'labels': {'source': 'test_source', 'symbol': 'A'}, 'value': 1}]
@@ -0,0 +1,95 @@
+import time
+import threading
+import pandas as pd
+import pytest
+
+pytest.importorskip('apscheduler')
+pytest.importorskip('pandas_market_calendars')
+from app.utils import scheduler  # noqa: E402
+from app.utils.scheduler import MarketHours, RefreshService  # noqa: E402
+
+WATCHLIST = [
+    {'source': 'yf', 'config': [{'symbol': 'SPY', 'call_type': 'etf', 'interval': 'daily'},
+                                {'symbol': 'DEAD', 'call_type': 'stock', 'interval': 'daily'}]},
+    {'source': 'fred', 'config': [{'symbol': 'DGS10', 'call_type': 'index', 'interval': 'daily'}]},
+]
+
+
+class Hours:
+    def __init__(self, open_):
+        self.open = open_
+
+    def is_open(self, calendar, now=None):
+        return self.open
+
+
+@pytest.fixture
+def updates(monkeypatch):
+    """
+    Symbols passed to update_history. 'DEAD' always fails.
+    """
+    symbols = []
+
+    def update_history(source, call_type, symbol, **kwargs):
+        symbols.append(symbol)
+        if symbol == 'DEAD':
+            raise ValueError('No data for {}'.format(symbol))
+
+    monkeypatch.setattr(scheduler, 'update_history', update_history)
+    return symbols
+
+
+def test_market_hours():
+    hours = MarketHours()
+    # 2022-06-30 is a Thursday, the NYSE is open from 13:30 to 20:00 UTC
+    assert not hours.is_open('NYSE', pd.Timestamp('2022-06-30 13:00', tz='UTC'))
+    assert hours.is_open('NYSE', pd.Timestamp('2022-06-30 15:00', tz='UTC'))
+    assert hours.is_open('NYSE', pd.Timestamp('2022-06-30 20:20', tz='UTC'))
+    assert not hours.is_open('NYSE', pd.Timestamp('2022-06-30 20:40', tz='UTC'))
+    # a Saturday, and Independence Day
+    assert not hours.is_open('NYSE', pd.Timestamp('2022-07-02 15:00', tz='UTC'))
+    assert not hours.is_open('NYSE', pd.Timestamp('2022-07-04 15:00', tz='UTC'))
+
+
+def test_runs_are_skipped_outside_market_hours(updates):
+    service = RefreshService(WATCHLIST, blocking=False, hours=Hours(False))
+    for source, config in [('yf', WATCHLIST[0]['config'][0]), ('fred', WATCHLIST[1]['config'][0])]:
+        service.refresh(source, config)
+    # FRED is not tied to the opening hours of a market
+    assert updates == ['DGS10']
+
+
+def test_a_failing_symbol_does_not_stop_its_job(updates):
+    service = RefreshService(WATCHLIST, blocking=False, hours=Hours(True))
+    dead = ('yf', WATCHLIST[0]['config'][1])
+    service.refresh(*dead)
+    service.refresh(*dead)
+    service.refresh('yf', WATCHLIST[0]['config'][0])
+    assert updates == ['DEAD', 'DEAD', 'SPY']
+
+
+def test_runs_of_a_job_do_not_overlap(monkeypatch):
+    running = {'now': 0, 'max': 0, 'runs': 0}
+    lock = threading.Lock()
+
+    def update_history(source, call_type, symbol, **kwargs):
+        with lock:
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+        time.sleep(1.3)
+        with lock:
+            running['now'] -= 1
+            running['runs'] += 1
+
+    monkeypatch.setattr(scheduler, 'update_history', update_history)
+    watchlist = [{'source': 'fred', 'config': [{'symbol': 'DGS10', 'call_type': 'index', 'interval': 'daily'}]}]
+    service = RefreshService(watchlist, seconds=1, blocking=False, hours=Hours(True))
+
+    service.start()
+    job = service.scheduler.get_jobs()[0]
+    assert job.coalesce and job.max_instances == 1
+    time.sleep(3.2)
+    service.shutdown(wait=True)
+    # a run takes longer than the interval: the next run waits for it instead of starting alongside
+    assert running['max'] == 1
+    assert 2 <= running['runs'] <= 3
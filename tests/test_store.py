@@ -0,0 +1,75 @@
+import time
+import pandas as pd
+import pytest
+from app.utils.fetch_data import standardize_data
+
+pytest.importorskip('pyarrow')
+from app.utils.store import TimeSeriesStore  # noqa: E402
+
+
+def bars(symbol, start, periods, close=1.0, compact=False):
+    dates = pd.bdate_range(start, periods=periods)
+    df = pd.DataFrame({'Date': dates.strftime('%Y-%m-%d'), 'Open': close, 'High': close, 'Low': close,
+                       'Close': [close + i for i in range(periods)], 'Volume': 100})
+    return standardize_data('yf', df, symbol, call_type='stock', interval='daily', currency='USD', compact=compact)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(root=tmp_path / 'history')
+
+
+def test_read_filters_dates_symbols_and_columns(store):
+    store.upsert('yf', 'AAA', 'daily', bars('AAA', '2020-12-28', 10))
+    store.upsert('yf', 'BBB', 'daily', bars('BBB', '2020-12-28', 10))
+
+    df = store.read('yf', ['AAA', 'BBB'], 'daily', start='2020-12-31', end='2021-01-05', columns=['Date', 'symbol'])
+    assert list(df.columns) == ['Date', 'symbol']
+    assert df['symbol'].tolist() == ['AAA'] * 4 + ['BBB'] * 4
+    assert df['Date'].min() == pd.Timestamp('2020-12-31') and df['Date'].max() == pd.Timestamp('2021-01-05')
+
+    assert store.read('yf', 'CCC', 'daily').shape[0] == 0
+    assert store.symbols('yf', 'daily') == ['AAA', 'BBB']
+    assert store.last_date('yf', 'AAA', 'daily') == pd.Timestamp('2021-01-08')
+
+
+def test_upsert_deduplicates_on_p_key(store):
+    assert store.upsert('yf', 'AAA', 'daily', bars('AAA', '2021-01-04', 5)) == 5
+    # two new days, and three stored days with new values
+    assert store.upsert('yf', 'AAA', 'daily', bars('AAA', '2021-01-06', 5, close=10.0)) == 2
+
+    df = store.read('yf', 'AAA', 'daily')
+    assert df.shape[0] == 7 and df['p_key'].is_unique
+    assert df['Close'].tolist() == [1.0, 2.0, 10.0, 11.0, 12.0, 13.0, 14.0]
+
+
+def test_upsert_compact_frames(store):
+    assert store.upsert('yf', 'AAA', 'daily', bars('AAA', '2021-01-04', 5, compact=True)) == 5
+    assert store.upsert('yf', 'AAA', 'daily', bars('AAA', '2021-01-06', 5, compact=True)) == 2
+    df = store.read('yf', 'AAA', 'daily')
+    assert df.shape[0] == 7
+    assert df['p_key'].tolist()[:2] == ['2021_01_04_AAA', '2021_01_05_AAA']
+
+
+def test_only_changed_years_are_rewritten(store):
+    store.upsert('yf', 'AAA', 'daily', bars('AAA', '2020-12-21', 15))
+    series_dir = store._series_dir('yf', 'AAA', 'daily')
+    assert sorted(p.name for p in series_dir.glob('*.parquet')) == ['2020.parquet', '2021.parquet']
+    mtimes = {p.name: p.stat().st_mtime_ns for p in series_dir.glob('*.parquet')}
+    version = store.version('yf', 'AAA', 'daily')
+
+    time.sleep(0.01)
+    # the same rows again change nothing
+    assert store.upsert('yf', 'AAA', 'daily', bars('AAA', '2020-12-21', 15)) == 0
+    assert store.version('yf', 'AAA', 'daily') == version
+
+    # new rows of 2021 rewrite only 2021
+    store.upsert('yf', 'AAA', 'daily', bars('AAA', '2021-01-11', 3))
+    assert (series_dir / '2020.parquet').stat().st_mtime_ns == mtimes['2020.parquet']
+    assert (series_dir / '2021.parquet').stat().st_mtime_ns != mtimes['2021.parquet']
+    assert store.version('yf', 'AAA', 'daily') != version
+
+
+def test_version_of_missing_series(store):
+    assert store.version('yf', 'AAA', 'daily') is None
+    assert store.last_date('yf', 'AAA', 'daily') is None
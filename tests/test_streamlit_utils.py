@@ -0,0 +1,132 @@
+import pytest
+from app.utils import streamlit_utils
+from app.utils.streamlit_utils import DashboardCache
+
+CONFIG = {'interval': 'daily', 'start_date': '2020-01-01',
+          'data_fetch_config': [{'source': 'yf', 'config': [
+              {'symbol': 'SPY', 'call_type': 'etf', 'interval': 'daily', 'alias': 'spy'}]}]}
+
+
+class FakeStore:
+    """
+    Store whose series are always stored, with a version bumped by the test.
+    """
+
+    def __init__(self):
+        self.data_version = 0
+
+    def last_date(self, source, symbol, interval):
+        return '2020-01-02'
+
+    def version(self, source, symbol, interval):
+        return self.data_version
+
+
+@pytest.fixture(autouse=True)
+def fetched(monkeypatch):
+    """
+    Symbols passed to update_history. The refreshes only read the versions of the fake store,
+        and the symbols starting with 'DEAD' fail.
+    """
+    symbols = []
+
+    def update_history(symbol, **kwargs):
+        symbols.append(symbol)
+        # an AssertionError is not retried by run_tasks
+        assert not symbol.startswith('DEAD'), "No data for {}".format(symbol)
+
+    monkeypatch.setattr(streamlit_utils, 'update_history', update_history)
+    return symbols
+
+
+def config(*symbols, start_date='2020-01-01'):
+    return {'interval': 'daily', 'start_date': start_date,
+            'data_fetch_config': [{'source': 'yf', 'config': [
+                {'symbol': symbol, 'call_type': 'stock', 'interval': 'daily', 'alias': symbol} for symbol in symbols]}]}
+
+
+def test_values_are_computed_once_per_version():
+    store = FakeStore()
+    cache = DashboardCache(store=store)
+    key = cache.register(CONFIG)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.cached_value(key, 'value', build) == 1
+    assert cache.cached_value(key, 'value', build) == 1
+
+    store.data_version += 1
+    assert cache.refresh(key)
+    assert cache.cached_value(key, 'value', build) == 2
+
+
+def test_refresh_drops_the_locks_of_older_versions():
+    store = FakeStore()
+    cache = DashboardCache(store=store)
+    key = cache.register(CONFIG)
+
+    for _ in range(5):
+        for name in ['a', 'b', 'c']:
+            cache.cached_value(key, name, lambda: name)
+        store.data_version += 1
+        cache.refresh(key)
+
+    assert [k for k in cache._key_locks if isinstance(k, tuple)] == []
+    assert len(cache.values) == 0
+
+
+def test_evicted_values_drop_their_locks():
+    cache = DashboardCache(store=FakeStore(), max_values=2)
+    key = cache.register(CONFIG)
+    for name in ['a', 'b', 'c', 'd']:
+        cache.cached_value(key, name, lambda: name)
+    assert len(cache.values) == 2
+    assert sorted(k[1] for k in cache._key_locks if isinstance(k, tuple)) == ['c', 'd']
+
+
+def test_shared_series_are_fetched_once_per_cycle(fetched):
+    cache = DashboardCache(store=FakeStore())
+    cache.register(config('SPY', 'QQQ'))
+    cache.register(config('SPY', start_date='2010-01-01'))
+    cache.register(config('SPY', start_date='2000-01-01'))
+    assert fetched == []
+
+    cache.refresh_all()
+    assert sorted(fetched) == ['QQQ', 'SPY']
+
+
+def test_failing_series_are_skipped_until_their_retry(fetched):
+    cache = DashboardCache(store=FakeStore(), retry_seconds=60)
+    cache.register(config('SPY', 'DEAD1'))
+
+    cache.refresh_all()
+    assert sorted(fetched) == ['DEAD1', 'SPY']
+    assert cache.failures[('yf', 'DEAD1', 'daily')][0] == 1
+
+    fetched.clear()
+    cache.refresh_all()
+    assert fetched == ['SPY']
+
+    # once the retry is due, the series is fetched again, and waits twice as long after a new failure
+    cache.failures[('yf', 'DEAD1', 'daily')] = (1, 0)
+    fetched.clear()
+    cache.refresh_all()
+    assert sorted(fetched) == ['DEAD1', 'SPY']
+    n_failures, retry_at = cache.failures[('yf', 'DEAD1', 'daily')]
+    assert n_failures == 2 and retry_at - streamlit_utils.time.monotonic() > 100
+
+
+def test_least_recently_registered_configs_are_dropped():
+    cache = DashboardCache(store=FakeStore(), max_configs=2)
+    first = cache.register(config('SPY'))
+    cache.cached_value(first, 'value', lambda: 1)
+    second = cache.register(config('QQQ'))
+    cache.register(config('SPY'))
+    third = cache.register(config('IWM'))
+
+    assert list(cache.configs) == [first, third]
+    assert second not in cache.versions
+    assert [k[0] for k in cache.values] == [first]
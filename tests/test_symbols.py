@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+from app.utils import symbols, fetch_data
+from app.utils.symbols import SymbolIndex, DEFAULT_MAX_AGE
+
+DAY = 24 * 60 * 60
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(symbols.time, 'time', clock.time)
+    return clock
+
+
+class Listing:
+    """
+    Listing loader that counts its calls.
+    """
+
+    def __init__(self, values):
+        self.values = values
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return dict(self.values)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SymbolIndex(path=tmp_path / 'symbols.pkl')
+
+
+def test_listing_is_reloaded_after_max_age(index, clock):
+    loader = Listing({'SPY': 'SPDR S&P 500'})
+    namespace = ('etf', 'united states')
+    assert index.lookup(namespace, 'SPY', loader) == 'SPDR S&P 500'
+
+    clock.now += DEFAULT_MAX_AGE - 1
+    index.lookup(namespace, 'SPY', loader)
+    assert loader.calls == 1
+
+    clock.now += 2
+    index.lookup(namespace, 'SPY', loader)
+    assert loader.calls == 2
+    assert DEFAULT_MAX_AGE == 7 * DAY
+
+
+def test_index_is_persisted(index, clock, tmp_path):
+    loader = Listing({'SPY': 'SPDR S&P 500'})
+    index.lookup(('etf', 'united states'), 'SPY', loader)
+    reloaded = SymbolIndex(path=tmp_path / 'symbols.pkl')
+    assert reloaded.lookup(('etf', 'united states'), 'SPY', loader) == 'SPDR S&P 500'
+    assert loader.calls == 1
+
+
+def test_a_miss_refreshes_the_listing_once(index, clock):
+    loader = Listing({'SPY': 'SPDR S&P 500'})
+    namespace = ('etf', 'united states')
+    index.lookup(namespace, 'SPY', loader)
+
+    # a fresh listing is not reloaded for a missing symbol
+    with pytest.raises(KeyError):
+        index.lookup(namespace, 'NEW', loader)
+    assert loader.calls == 1
+
+    # an older one is reloaded once, and not again for the next misses
+    clock.now += 2 * 60 * 60
+    loader.values['NEW'] = 'New ETF'
+    assert index.lookup(namespace, 'NEW', loader) == 'New ETF'
+    assert loader.calls == 2
+    with pytest.raises(KeyError):
+        index.lookup(namespace, 'MISSING', loader)
+    with pytest.raises(KeyError):
+        index.lookup(namespace, 'MISSING', loader)
+    assert loader.calls == 2
+
+
+class StubFred:
+    def __init__(self):
+        self.searches = []
+
+    def search(self, symbol):
+        self.searches.append(symbol)
+        return pd.DataFrame({'frequency': ['Monthly'], 'units': ['Percent']}, index=pd.Index([symbol], name='series id'))
+
+
+def test_lookup_one_memoizes_fred_series_info(index, clock, monkeypatch):
+    fred = StubFred()
+    monkeypatch.setattr(fetch_data, '_fred', fred)
+    monkeypatch.setattr(fetch_data, '_keys', {'fred': 'test'})
+
+    for _ in range(3):
+        assert index.lookup_one('fred', 'FEDFUNDS', fetch_data._fred_series_info) == ('monthly', 'percent')
+    assert fred.searches == ['FEDFUNDS']
+
+    clock.now += DEFAULT_MAX_AGE + 1
+    index.lookup_one('fred', 'FEDFUNDS', fetch_data._fred_series_info)
+    assert fred.searches == ['FEDFUNDS', 'FEDFUNDS']
@@ -0,0 +1,77 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app.utils import metrics
+from app.utils.transport import HttpTransport
+
+pytest.importorskip('requests')
+
+BODY = json.dumps({'data': [{'date': '2021-01-04', 'close': 100.0}] * 500}).encode('utf-8')
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Serves BODY gzip compressed with an ETag, and answers 304 when the ETag matches.
+    """
+
+    def do_GET(self):
+        etag = '"{}"'.format(self.path)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = gzip.compress(BODY)
+        self.send_response(200)
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    server.shutdown()
+
+
+@pytest.fixture
+def registry():
+    metrics.get_registry().reset()
+    yield metrics.get_registry()
+    metrics.get_registry().reset()
+
+
+def bytes_fetched(registry, source):
+    return sum(c['value'] for c in registry.to_dict()['counters']
+               if c['name'] == 'bytes_fetched_total' and c['labels'].get('source') == source)
+
+
+def test_bytes_are_counted_as_received(server_url, registry):
+    transport = HttpTransport()
+    assert transport.get_bytes(server_url + '/a', source='test') == BODY
+    assert bytes_fetched(registry, 'test') == len(gzip.compress(BODY))
+
+    # the 304 reuses the kept body and transfers no body
+    assert transport.get_bytes(server_url + '/a', source='test') == BODY
+    assert bytes_fetched(registry, 'test') == len(gzip.compress(BODY))
+
+
+def test_kept_bodies_are_bounded_in_bytes(server_url, registry):
+    transport = HttpTransport(max_validator_bytes=2 * len(BODY), max_body_bytes=len(BODY))
+    for name in ['a', 'b', 'c']:
+        transport.get_bytes('{}/{}'.format(server_url, name))
+    assert list(transport._validators) == [server_url + '/b', server_url + '/c']
+    assert transport._validator_bytes == 2 * len(BODY)
+
+    small = HttpTransport(max_body_bytes=len(BODY) - 1)
+    assert small.get_bytes(server_url + '/a') == BODY
+    assert len(small._validators) == 0 and small._validator_bytes == 0
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from app.utils.visualization import lttb, downsample, plot_data, plot_data_range
+
+
+def price_frame(n, tz=None):
+    dates = pd.date_range('2000-01-03', periods=n, freq='D', tz=tz)
+    close = 100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.01, n)))
+    return pd.DataFrame({'Date': dates, 'Close': close})
+
+
+def test_lttb_keeps_ends_and_size():
+    df = price_frame(5000)
+    index = lttb(df['Date'], df['Close'].to_numpy(), 500)
+    assert len(index) == 500
+    assert index[0] == 0 and index[-1] == 4999
+    assert np.all(np.diff(index) > 0)
+
+
+def test_lttb_tz_aware_dates_match_naive_dates():
+    # yf returns a tz-aware Date column
+    naive = price_frame(5000)
+    aware = naive.copy()
+    aware['Date'] = naive['Date'].dt.tz_localize('UTC').dt.tz_convert('America/New_York')
+
+    expected = lttb(naive['Date'], naive['Close'].to_numpy(), 500)
+    np.testing.assert_array_equal(lttb(aware['Date'], aware['Close'].to_numpy(), 500), expected)
+    np.testing.assert_array_equal(lttb(aware['Date'].to_numpy(), aware['Close'].to_numpy(), 500), expected)
+
+
+def test_plot_data_downsamples_tz_aware_series():
+    df = price_frame(5000, tz='America/New_York')
+    fig = plot_data([['line', df, 'Date', 'Close', 'close', False],
+                     ['bar', df, 'Date', 'Close', 'close', True]], max_points=1000)
+    assert len(fig.data[0].x) == 1000
+    assert len(fig.data[1].x) <= 1000
+    assert fig.data[0].type == 'scatter'
+
+
+def test_plot_data_small_series_unchanged():
+    df = price_frame(100)
+    fig = plot_data([['line', df, 'Date', 'Close', 'close', False]])
+    assert len(fig.data[0].x) == 100
+
+
+def test_downsample_drops_missing_values():
+    df = price_frame(3000)
+    df.loc[10:19, 'Close'] = np.nan
+    out = downsample(df, 'Date', 'Close', max_points=500)
+    assert out.shape[0] == 500
+    assert out['Close'].notna().all()
+
+
+def test_plot_data_range_tz_aware():
+    df = price_frame(5000, tz='America/New_York')
+    fig = plot_data_range([['line', df, 'Date', 'Close', 'close', False]], '2001-01-01', '2001-12-31')
+    assert len(fig.data[0].x) == 365